@@ -16,9 +16,13 @@ Please direct correspondence to mgolub@cs.washington.edu
 
 import numpy as np
 import time
+import multiprocessing
 from copy import deepcopy
+from concurrent.futures import ProcessPoolExecutor
 
-from FixedPoints import FixedPoints
+from scipy.spatial import cKDTree
+
+from FixedPoints import FixedPoints, FixedPointsBuilder
 
 class FixedPointFinderBase(object):
 
@@ -27,6 +31,8 @@ class FixedPointFinderBase(object):
         'tol_dq': 1e-20,
         'max_iters': 5000,
         'method': 'joint',
+        'n_workers': 1,
+        'per_condition': False,
         'do_rerun_q_outliers': False,
         'outlier_q_scale': 10.0,
         'do_exclude_distance_outliers': True,
@@ -65,6 +71,8 @@ class FixedPointFinderBase(object):
         tol_dq=_default_hps['tol_dq'],
         max_iters=_default_hps['max_iters'],
         method=_default_hps['method'],
+        n_workers=_default_hps['n_workers'],
+        per_condition=_default_hps['per_condition'],
         do_rerun_q_outliers=_default_hps['do_rerun_q_outliers'],
         outlier_q_scale=_default_hps['outlier_q_scale'],
         do_exclude_distance_outliers=\
@@ -101,12 +109,32 @@ class FixedPointFinderBase(object):
             Optimization terminates upon reaching this iteration count, even
             if 'tol' has not been reached. Default: 5000.
 
-            method (optional): Either 'joint' or 'sequential' indicating
-            whether to find each fixed point individually, or to optimize
-            them all jointly. Further testing is required to understand pros
-            and cons. Empirically, 'joint' runs faster (potentially making
-            better use of GPUs, fewer python for loops), but may be
-            susceptible to pathological conditions. Default: 'joint'.
+            method (optional): Either 'joint', 'sequential' or 'newton'
+            indicating whether to find each fixed point individually, or to
+            optimize them all jointly. Further testing is required to
+            understand pros and cons. Empirically, 'joint' runs faster
+            (potentially making better use of GPUs, fewer python for loops),
+            but may be susceptible to pathological conditions. 'newton' solves
+            for all fixed points jointly using damped Newton steps built from
+            the batched Jacobians, falling back to 'joint' for any that do
+            not converge. Default: 'joint'.
+
+            n_workers (optional): Number of worker processes over which
+            sequential optimizations (method='sequential', and the outlier
+            reruns of do_rerun_q_outliers) are distributed. Each worker holds
+            its own copy of the RNN. Workers are started with the 'spawn'
+            method (forking a process whose framework, e.g., torch, has
+            already started its thread pools can deadlock), so they import
+            the RNN's module afresh, and a script that runs as __main__ must
+            guard its entry point with if __name__ == '__main__'. Default: 1,
+            which runs them in this process.
+
+            per_condition (optional): A bool indicating whether the
+            conditions given by find_fixed_points' cond_ids are treated as
+            separate problems solved in one batch. Duplicates are then only
+            identified among fixed points of the same condition, and
+            FixedPointFinderTorch's joint optimization adapts a separate
+            learning rate for each condition. Default: False.
 
             do_rerun_q_outliers (optional): A bool indicating whether or not
             to run additional optimization iterations on putative outlier
@@ -182,6 +210,8 @@ class FixedPointFinderBase(object):
         self.tol_q = tol_q
         self.tol_dq = tol_dq
         self.method = method
+        self.n_workers = n_workers
+        self.per_condition = per_condition
         self.max_iters = max_iters
         self.do_rerun_q_outliers = do_rerun_q_outliers
         self.outlier_q_scale = outlier_q_scale
@@ -201,7 +231,10 @@ class FixedPointFinderBase(object):
 
     def sample_inputs_and_states(self, inputs, state_traj, n_inits,
         valid_bxt=None,
-        noise_scale=0.0):
+        noise_scale=0.0,
+        cond_ids=None,
+        sampling='uniform',
+        return_indices=False):
         '''Draws random paired samples from the RNN's inputs and hidden-state
         trajectories. Sampled states (but not inputs) can optionally be
         corrupted by independent and identically distributed (IID) Gaussian
@@ -209,11 +242,11 @@ class FixedPointFinderBase(object):
         fixed point optimizations.
 
         Args:
-            inputs: [n_batch x n_time x n_inputs] numpy array containing input
-            sequences to the RNN.
+            inputs: [n_batch x n_time x n_inputs] numpy array (or, for the
+            Pytorch backend, tensor) containing input sequences to the RNN.
 
-            state_traj: [n_batch x n_time x n_states] numpy array containing
-            trajectories of the RNN hidden state, given inputs.
+            state_traj: [n_batch x n_time x n_states] numpy array (or tensor)
+            containing trajectories of the RNN hidden state, given inputs.
 
             n_inits: int specifying the number of sampled states to return.
 
@@ -225,56 +258,78 @@ class FixedPointFinderBase(object):
             deviation of IID Gaussian noise samples added to the sampled
             states. Default: 0.0.
 
+            cond_ids (optional): [n_batch,] numpy array of the condition of
+            each trial. If provided, samples are stratified by condition, with
+            n_inits split as evenly as possible across conditions. Default:
+            None.
+
+            sampling (optional): 'uniform' to draw samples uniformly at random
+            from the valid timesteps, or 'farthest' to pick them by greedy
+            farthest-point sampling of the states (within each condition),
+            so that fewer samples cover the visited state space.
+            Default: 'uniform'.
+
+            return_indices (optional): bool indicating whether to also return
+            the trial and time indices of the samples. Default: False.
+
         Returns:
 
-            inputs: Sampled RNN inputs as a [n_inits x n_inputs] numpy array.
-            These are paired with the states in initial_states (below).
+            inputs: Sampled RNN inputs as a [n_inits x n_inputs] numpy array
+            (or tensor, if inputs was a tensor). These are paired with the
+            states in initial_states (below).
 
             initial_states: Sampled RNN states as an [n_inits x n_states] numpy
-            array.
+            array (or tensor, if state_traj was a tensor).
+
+            (trial_indices, time_indices) (optional): [n_inits,] numpy arrays
+            of the indices of the samples. Only returned if return_indices is
+            True.
 
         Raises:
             ValueError if noise_scale is negative.
         '''
-        [n_batch, n_time, n_states] = state_traj_bxtxd.shape
-        n_inputs = inputs.shape[2]
+        [n_batch, n_time, n_states] = state_traj.shape
 
         valid_bxt = self._get_valid_mask(n_batch, n_time, valid_bxt=valid_bxt)
-        trial_indices, time_indices = \
-            self._sample_trial_and_time_indices(valid_bxt, n_inits)
+        trial_indices, time_indices = self._sample_trial_and_time_indices(
+            valid_bxt, n_inits,
+            cond_ids=cond_ids, sampling=sampling, state_traj=state_traj)
 
         # Draw random samples from inputs and state trajectories
-        input_samples = np.zeros([n_inits, n_inputs])
-        state_samples = np.zeros([n_inits, n_states])
-        for init_idx in range(n_inits):
-            trial_idx = trial_indices[init_idx]
-            time_idx = time_indices[init_idx]
-            input_samples[init_idx,:] = inputs[trial_idx,time_idx,:]
-            state_samples[init_idx,:] = state_traj_bxtxd[trial_idx,time_idx,:]
+        input_samples = self._gather_samples(inputs, trial_indices, time_indices)
+        state_samples = self._gather_samples(
+            state_traj, trial_indices, time_indices)
 
         # Add IID Gaussian noise to the sampled states
         state_samples = self._add_gaussian_noise(
             state_samples, noise_scale)
 
-        assert not np.any(np.isnan(state_samples)),\
+        assert not (state_samples != state_samples).any(),\
             'Detected NaNs in sampled states. Check state_traj and valid_bxt.'
 
-        assert not np.any(np.isnan(input_samples)),\
+        assert not (input_samples != input_samples).any(),\
             'Detected NaNs in sampled inputs. Check inputs and valid_bxt.'
 
+        if return_indices:
+            return input_samples, state_samples, (trial_indices, time_indices)
+
         return input_samples, state_samples
 
     def sample_states(self, state_traj, n_inits,
         valid_bxt=None,
-        noise_scale=0.0):
+        noise_scale=0.0,
+        cond_ids=None,
+        sampling='uniform',
+        return_indices=False):
         '''Draws random samples from trajectories of the RNN state. Samples
         can optionally be corrupted by independent and identically distributed
         (IID) Gaussian noise. These samples are intended to be used as initial
         states for fixed point optimizations.
 
         Args:
-            state_traj: [n_batch x n_time x n_states] numpy array containing
-            example trajectories of the RNN state.
+            state_traj: [n_batch x n_time x n_states] numpy array (or, for the
+            Pytorch backend, tensor) containing example trajectories of the
+            RNN state.
 
             n_inits: int specifying the number of sampled states to return.
 
@@ -286,35 +341,39 @@ class FixedPointFinderBase(object):
             deviation of IID Gaussian noise samples added to the sampled
             states.
 
+            cond_ids, sampling, return_indices (optional): See
+            sample_inputs_and_states().
+
         Returns:
             initial_states: Sampled RNN states as a [n_inits x n_states] numpy
-            array.
+            array (or tensor, if state_traj was a tensor).
+
+            (trial_indices, time_indices) (optional): See
+            sample_inputs_and_states().
 
         Raises:
             ValueError if noise_scale is negative.
         '''
 
-        state_traj_bxtxd = state_traj
-
-        [n_batch, n_time, n_states] = state_traj_bxtxd.shape
+        [n_batch, n_time, n_states] = state_traj.shape
 
         valid_bxt = self._get_valid_mask(n_batch, n_time, valid_bxt=valid_bxt)
         trial_indices, time_indices = self._sample_trial_and_time_indices(
-            valid_bxt, n_inits)
+            valid_bxt, n_inits,
+            cond_ids=cond_ids, sampling=sampling, state_traj=state_traj)
 
         # Draw random samples from state trajectories
-        states = np.zeros([n_inits, n_states])
-        for init_idx in range(n_inits):
-            trial_idx = trial_indices[init_idx]
-            time_idx = time_indices[init_idx]
-            states[init_idx,:] = state_traj_bxtxd[trial_idx, time_idx]
+        states = self._gather_samples(state_traj, trial_indices, time_indices)
 
         # Add IID Gaussian noise to the sampled states
         states = self._add_gaussian_noise(states, noise_scale)
 
-        assert not np.any(np.isnan(states)),\
+        assert not (states != states).any(),\
             'Detected NaNs in sampled states. Check state_traj and valid_bxt.'
 
+        if return_indices:
+            return states, (trial_indices, time_indices)
+
         return states
 
     def find_fixed_points(self, initial_states, inputs, cond_ids=None):
@@ -363,12 +422,15 @@ class FixedPointFinderBase(object):
         elif self.method == 'joint':
             all_fps = self._run_joint_optimization(
                 initial_states, inputs_nxd, cond_ids=cond_ids)
+        elif self.method == 'newton':
+            all_fps = self._run_newton_optimization(
+                initial_states, inputs_nxd, cond_ids=cond_ids)
         else:
-            raise ValueError('Unsupported optimization method. Must be either \
-                \'joint\' or \'sequential\', but was  \'%s\'' % self.method)
+            raise ValueError('Unsupported optimization method. Must be \
+                \'joint\', \'sequential\' or \'newton\', but was  \'%s\'' % self.method)
 
         # Filter out duplicates after from the first optimization round
-        unique_fps = all_fps.get_unique()
+        unique_fps = all_fps.get_unique(by_cond_id=self.per_condition)
 
         self._print_if_verbose('\tIdentified %d unique fixed points.' %
             unique_fps.n)
@@ -384,7 +446,7 @@ class FixedPointFinderBase(object):
                 self._run_additional_iterations_on_outliers(unique_fps)
 
             # Filter out duplicates after from the second optimization round
-            unique_fps = unique_fps.get_unique()
+            unique_fps = unique_fps.get_unique(by_cond_id=self.per_condition)
 
         # Optionally subselect from the unique fixed points (e.g., for
         # computational savings when not all are needed.)
@@ -399,14 +461,10 @@ class FixedPointFinderBase(object):
         if self.do_compute_jacobians:
             if unique_fps.n > 0:
 
-                self._print_if_verbose('\tComputing recurrent Jacobian at %d '
-                    'unique fixed points.' % unique_fps.n)
-                dFdx = self._compute_recurrent_jacobians(unique_fps)
+                self._print_if_verbose('\tComputing recurrent and input '
+                    'Jacobians at %d unique fixed points.' % unique_fps.n)
+                dFdx, dFdu = self._compute_jacobians(unique_fps)
                 unique_fps.J_xstar = dFdx
-
-                self._print_if_verbose('\tComputing input Jacobian at %d '
-                    'unique fixed points.' % unique_fps.n)
-                dFdu = self._compute_input_jacobians(unique_fps)
                 unique_fps.dFdu = dFdu
 
             else:
@@ -428,6 +486,145 @@ class FixedPointFinderBase(object):
 
         return unique_fps, all_fps
 
+    def find_fixed_points_continuation(self, initial_states, inputs,
+        reseed_states=None, q_thresh=None):
+        '''Tracks fixed points as the (constant) inputs to the RNN are
+        varied along a path, e.g., a ramp on one input.
+
+        The fixed points for inputs[0] are found from initial_states. Each
+        subsequent search, for inputs[i], is warm-started from the unique
+        fixed points found for inputs[i-1], which typically converges in far
+        fewer iterations than starting from sampled states. Each fixed point
+        is assigned a track id, which it keeps for as long as its warm-started
+        successor converges back to a unique fixed point. A track ends when
+        its fixed point disappears (e.g., merges with another), and new tracks
+        begin for fixed points found from reseed_states. A pair of tracks
+        ending together typically indicates a saddle-node bifurcation.
+
+        Since warm starts are already close to a solution, method='newton'
+        is recommended here. Adam (method='joint') takes steps of roughly
+        the learning rate regardless of the gradient magnitude, and can carry
+        a warm start away to a different fixed point.
+
+        Args:
+            initial_states: An [n x n_states] numpy array of initial states
+            for the search at inputs[0].
+
+            inputs: An [n_steps x n_inputs] numpy array, the sequence of
+            constant inputs along the continuation path.
+
+            reseed_states (optional): An [m x n_states] numpy array of
+            additional initial states to include in every search after the
+            first, so that fixed points created along the path can be found.
+            Default: None.
+
+            q_thresh (optional): Fixed points with qstar above q_thresh are
+            considered not to have converged (e.g., a warm start whose fixed
+            point has disappeared), and are discarded. Default: None, which
+            uses 0.5*tol_unique**2, i.e., residuals smaller than tol_unique.
+
+        Returns:
+            fps: A FixedPoints object containing the unique fixed points
+            found at every step, in order of step. fps.cond_id holds the
+            index into inputs of each fixed point's step.
+
+            track_ids: An [fps.n,] int numpy array of the track id of each
+            fixed point.
+
+            is_bifurcation: An [fps.n,] bool numpy array, True where the
+            leading eigenvalue of a fixed point has crossed the unit circle
+            (i.e., its stability has changed) since the previous step of its
+            track.
+        '''
+
+        if q_thresh is None:
+            q_thresh = 0.5 * self.tol_unique**2
+
+        n_steps = inputs.shape[0]
+        builder = FixedPointsBuilder()
+        track_ids = []
+        is_bifurcation = []
+
+        # States, track ids and stability of the fixed points found at the
+        # previous step.
+        prev_xstar = initial_states
+        prev_track_ids = np.zeros(0, dtype=int)
+        prev_is_stable = np.zeros(0, dtype=bool)
+        n_tracks = 0
+
+        for step in range(n_steps):
+
+            self._print_if_verbose('Continuation step %d of %d.' %
+                (step + 1, n_steps))
+
+            if step > 0 and reseed_states is not None:
+                # Warm starts first, so that they are indexed by track below.
+                step_states = np.concatenate((prev_xstar, reseed_states))
+            else:
+                step_states = prev_xstar
+
+            if step_states.shape[0] == 0:
+                self._print_if_verbose('\tNo fixed points to continue.')
+                break
+
+            unique_fps, all_fps = self.find_fixed_points(
+                step_states, inputs[step:(step+1)],
+                cond_ids=np.full(step_states.shape[0], step))
+            unique_fps = unique_fps[np.where(unique_fps.qstar <= q_thresh)[0]]
+
+            if unique_fps.n > 0 and not unique_fps.has_decomposed_jacobians:
+                if unique_fps.J_xstar is None:
+                    unique_fps.J_xstar = \
+                        self._compute_recurrent_jacobians(unique_fps)
+                unique_fps.decompose_jacobians(
+                    mode='eigvals', str_prefix='\t')
+
+            # Each track continues to the unique fixed point that its warm
+            # start converged to. If several tracks converged to the same
+            # fixed point, the oldest track continues and the others end.
+            step_track_ids = np.full(unique_fps.n, -1, dtype=int)
+            step_is_bifurcation = np.zeros(unique_fps.n, dtype=bool)
+            n_prev = prev_track_ids.size
+
+            if unique_fps.n > 0 and n_prev > 0:
+                tree = cKDTree(unique_fps.xstar)
+                dist, idx_unique = tree.query(all_fps.xstar[:n_prev])
+
+                for idx_prev in np.argsort(prev_track_ids):
+                    idx = idx_unique[idx_prev]
+                    if dist[idx_prev] <= self.tol_unique and \
+                        step_track_ids[idx] < 0:
+
+                        step_track_ids[idx] = prev_track_ids[idx_prev]
+                        step_is_bifurcation[idx] = \
+                            unique_fps.is_stable[idx] != \
+                            prev_is_stable[idx_prev]
+
+            # All other fixed points begin new tracks.
+            is_new = step_track_ids < 0
+            step_track_ids[is_new] = n_tracks + np.arange(np.sum(is_new))
+            n_tracks += np.sum(is_new)
+
+            self._print_if_verbose('\tContinued %d tracks, started %d, '
+                'flagged %d bifurcations.' % (np.sum(~is_new), np.sum(is_new),
+                np.sum(step_is_bifurcation)))
+
+            builder.append(unique_fps)
+            track_ids.append(step_track_ids)
+            is_bifurcation.append(step_is_bifurcation)
+
+            prev_xstar = unique_fps.xstar
+            prev_track_ids = step_track_ids
+            prev_is_stable = unique_fps.is_stable
+
+        fps = builder.freeze()
+        track_ids = np.concatenate(track_ids) \
+            if track_ids else np.zeros(0, dtype=int)
+        is_bifurcation = np.concatenate(is_bifurcation) \
+            if is_bifurcation else np.zeros(0, dtype=bool)
+
+        return fps, track_ids, is_bifurcation
+
     # *************************************************************************
     # API functions, implemented by Pytorch and TF subclasses *****************
     # *************************************************************************
@@ -469,6 +666,26 @@ class FixedPointFinderBase(object):
 
         raise NotImplementedError
 
+    def _run_newton_optimization(self, initial_states, inputs, cond_ids=None):
+        '''Finds multiple fixed points jointly via damped Newton iterations on
+        the residual x - F(x), falling back to _run_joint_optimization for
+        any that do not converge.
+
+        Args:
+            initial_states: An [n x n_states] numpy array specifying the initial
+            states of the RNN, from which the optimization will search for
+            fixed points.
+
+            inputs: A [n x n_inputs] numpy array specifying a set of constant
+            inputs into the RNN.
+
+        Returns:
+            fps: A FixedPoints object containing the optimized fixed points
+            and associated metadata.
+        '''
+
+        raise NotImplementedError
+
     def _compute_recurrent_jacobians(self, fps):
         '''Computes the Jacobian of the RNN state transition function () 
         at the specified fixed points (i.e., dF/dx, partial derivatives with 
@@ -502,6 +719,28 @@ class FixedPointFinderBase(object):
 
         raise NotImplementedError
 
+    def _compute_jacobians(self, fps):
+        ''' Computes both the recurrent Jacobians (dF/dx) and the input
+        Jacobians (dF/du) at the specified fixed points. Subclasses that can
+        compute both in a single pass should override this.
+
+        Args:
+            fps: A FixedPoints object containing the RNN states (fps.xstar)
+            and inputs (fps.inputs) at which to compute the Jacobians.
+
+        Returns:
+            dFdx: An [n x n_states x n_states] numpy array, as returned by
+            _compute_recurrent_jacobians().
+
+            dFdu: An [n x n_states x n_inputs] numpy array, as returned by
+            _compute_input_jacobians().
+        '''
+
+        dFdx = self._compute_recurrent_jacobians(fps)
+        dFdu = self._compute_input_jacobians(fps)
+
+        return dFdx, dFdu
+
     # *************************************************************************
     # Helper functions ********************************************************
     # *************************************************************************
@@ -537,58 +776,192 @@ class FixedPointFinderBase(object):
             self._print_if_verbose('\tFinding fixed points via '
                                    'sequential optimizations...')
 
-        n_inits, n_states = initial_states.shape
-        n_inputs = inputs.shape[1]
+        n_inits = initial_states.shape[0]
 
-        # Allocate memory for storing results
-        fps = FixedPoints(do_alloc_nan=True,
-                          n=n_inits,
-                          n_states=n_states,
-                          n_inputs=n_inputs,
-                          dtype=self.np_dtype)
+        # Results are collected in order. Only the attributes that the
+        # optimizations return are kept (e.g., not the eigendecomposition,
+        # which would otherwise be NaN-filled and mistaken for having already
+        # been computed), each with the dtype the optimizations use.
+        builder = FixedPointsBuilder(capacity=n_inits)
+
+        if cond_ids is None:
+            cond_ids = [None] * n_inits
+
+        # One (initial_state, inputs, cond_id) per optimization, each with a
+        # leading singleton batch dimension.
+        jobs = [(initial_states[init_idx:(init_idx+1)],
+                 inputs[init_idx:(init_idx+1)],
+                 cond_ids[init_idx:(init_idx+1)]
+                    if cond_ids[init_idx] is not None else None)
+                for init_idx in range(n_inits)]
+
+        if self.n_workers > 1 and n_inits > 1:
+            n_workers = min(self.n_workers, n_inits)
+            self._print_if_verbose('\tDistributing %d optimizations over %d '
+                                   'worker processes.' % (n_inits, n_workers))
+
+            with ProcessPoolExecutor(max_workers=n_workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_sequential_worker,
+                initargs=(self._worker_copy(),)) as executor:
+
+                # map returns results in order, so each is appended as soon
+                # as it and its predecessors finish.
+                results = executor.map(_run_sequential_worker, jobs,
+                    chunksize=max(1, n_inits // (4 * n_workers)))
+
+                for fps_i in results:
+                    builder.append(fps_i)
 
-        for init_idx in range(n_inits):
+        else:
+            for init_idx, job in enumerate(jobs):
 
-            initial_states_i = initial_states[init_idx:(init_idx+1)]
-            inputs_i = inputs[index]
+                if is_fresh_start:
+                    self._print_if_verbose('\n\tInitialization %d of %d:' %
+                        (init_idx+1, n_inits))
+                else:
+                    self._print_if_verbose('\n\tOutlier %d of %d (q=%.2e):' %
+                        (init_idx+1, n_inits, q_prior[init_idx]))
 
-            if cond_ids is None:
-                colors_i = None
-            else:
-                colors_i = cond_ids[index]
+                builder.append(self._run_single_optimization(*job))
 
-            if is_fresh_start:
-                self._print_if_verbose('\n\tInitialization %d of %d:' %
-                    (init_idx+1, n_inits))
-            else:
-                self._print_if_verbose('\n\tOutlier %d of %d (q=%.2e):' %
-                    (init_idx+1, n_inits, q_prior[init_idx]))
+        return builder.freeze()
 
-            fps[init_idx] = self._run_single_optimization(
-                initial_states_i, inputs_i, cond_id=colors_i)
+    def _worker_copy(self):
+        ''' Returns the copy of this object that each worker process uses
+        for sequential optimizations. Subclasses override this to, e.g., move
+        the RNN to the CPU.
+        '''
 
-        return fps
+        worker = deepcopy(self)
+        worker.verbose = False
+        worker.super_verbose = False
+
+        return worker
+
+    def _init_worker(self):
+        ''' Called once in each worker process before it runs any
+        optimizations. Subclasses override this to, e.g., limit the number of
+        threads each worker uses.
+        '''
+
+        pass
 
-    def _sample_trial_and_time_indices(self, valid_bxt, n):
+    def _sample_trial_and_time_indices(self, valid_bxt, n,
+        cond_ids=None,
+        sampling='uniform',
+        state_traj=None):
         ''' Generate n random indices corresponding to True entries in
-        valid_bxt. Sampling is performed without replacement.
+        valid_bxt. Sampling is performed with replacement when uniform.
 
         Args:
             valid_bxt: [n_batch x n_time] bool numpy array.
 
             n: integer specifying the number of samples to draw.
 
+            cond_ids (optional): [n_batch,] numpy array of trial conditions.
+            If provided, n is split as evenly as possible across conditions,
+            and each condition's share is sampled from its own trials.
+
+            sampling (optional): 'uniform' or 'farthest'. See
+            sample_inputs_and_states(). Default: 'uniform'.
+
+            state_traj (optional): [n_batch x n_time x n_states] states.
+            Required if sampling is 'farthest'.
+
         returns:
             (trial_indices, time_indices): tuple containing random indices
             into valid_bxt such that valid_bxt[i, j] is True for every
             (i=trial_indices[k], j=time_indices[k])
         '''
 
-        (trial_idx, time_idx) = np.nonzero(valid_bxt)
-        max_sample_index = len(trial_idx) # same as len(time_idx)
-        sample_indices = self.rng.randint(max_sample_index, size=n)
+        if sampling not in ['uniform', 'farthest']:
+            raise ValueError('Unsupported sampling: %s.' % sampling)
+
+        if cond_ids is None:
+            valid_list = [valid_bxt]
+            n_list = [n]
+        else:
+            cond_ids = np.asarray(cond_ids)
+            conditions = np.unique(cond_ids)
+            valid_list = [valid_bxt & (cond_ids == c)[:, np.newaxis]
+                for c in conditions]
+            n_list = [n // len(conditions) + (c_idx < n % len(conditions))
+                for c_idx in range(len(conditions))]
+
+        trial_indices = []
+        time_indices = []
+        for valid_bxt_c, n_c in zip(valid_list, n_list):
+
+            (trial_idx, time_idx) = np.nonzero(valid_bxt_c)
+            max_sample_index = len(trial_idx) # same as len(time_idx)
+
+            if sampling == 'farthest' and n_c < max_sample_index:
+                sample_indices = self._farthest_point_indices(
+                    state_traj, trial_idx, time_idx, n_c)
+            else:
+                sample_indices = self.rng.randint(max_sample_index, size=n_c)
+
+            trial_indices.append(trial_idx[sample_indices])
+            time_indices.append(time_idx[sample_indices])
+
+        return np.concatenate(trial_indices), np.concatenate(time_indices)
+
+    def _farthest_point_indices(self, state_traj, trial_idx, time_idx, n,
+        n_candidates_per_sample=10):
+        ''' Greedy farthest-point sampling. Starting from a random state,
+        repeatedly picks the state farthest (in euclidean distance) from all
+        states picked so far. To bound the cost, the search runs over a
+        uniformly drawn pool of at most max(10000, n_candidates_per_sample *
+        n) candidate states.
+
+        Args:
+            state_traj: [n_batch x n_time x n_states] numpy array (or tensor).
+
+            trial_idx, time_idx: [n_valid,] numpy arrays of the candidate
+            (trial, time) indices.
+
+            n: integer specifying the number of samples to draw.
+
+            n_candidates_per_sample (optional): pool size per sample.
+            Default: 10.
+
+        Returns:
+            [n,] numpy array of indices into trial_idx and time_idx.
+        '''
+
+        n_valid = len(trial_idx)
+        n_pool = min(n_valid, max(10000, n_candidates_per_sample * n))
+        pool = self.rng.choice(n_valid, n_pool, replace=False)
+        states = self._gather_samples(
+            state_traj, trial_idx[pool], time_idx[pool])
+
+        picked = np.zeros(n, dtype=int)
+        picked[0] = self.rng.randint(n_pool)
+        min_sq_dist = ((states - states[picked[0]])**2).sum(1)
+        for k in range(1, n):
+            picked[k] = int(min_sq_dist.argmax())
+            sq_dist = ((states - states[picked[k]])**2).sum(1)
+            is_closer = sq_dist < min_sq_dist
+            min_sq_dist[is_closer] = sq_dist[is_closer]
 
-        return trial_idx[sample_indices], time_idx[sample_indices]
+        return pool[picked]
+
+    def _gather_samples(self, data_bxtxd, trial_indices, time_indices):
+        ''' Gathers data_bxtxd[trial_indices[k], time_indices[k]] for all k
+        with a single fancy-indexing operation.
+
+        Args:
+            data_bxtxd: [n_batch x n_time x n_dims] numpy array.
+
+            trial_indices, time_indices: [n,] integer numpy arrays.
+
+        Returns:
+            [n x n_dims] float64 numpy array.
+        '''
+
+        return np.asarray(
+            data_bxtxd[trial_indices, time_indices], dtype=np.float64)
 
     @staticmethod
     def _get_valid_mask(n_batch, n_time, valid_bxt=None):
@@ -903,3 +1276,18 @@ class FixedPointFinderBase(object):
             print('') # Just for the endline
         else:
             print('.')
+
+# Worker process state and entry points for parallel sequential
+# optimizations. These are module level so that they can be pickled.
+
+_worker_finder = None
+
+def _init_sequential_worker(finder):
+    global _worker_finder
+    _worker_finder = finder
+    _worker_finder._init_worker()
+
+def _run_sequential_worker(job):
+    initial_state, inputs, cond_id = job
+    return _worker_finder._run_single_optimization(
+        initial_state, inputs, cond_id=cond_id)
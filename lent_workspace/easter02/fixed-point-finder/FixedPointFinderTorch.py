@@ -22,18 +22,26 @@ import time
 from copy import deepcopy
 
 import torch
-from torch.autograd.functional import jacobian
+from torch.func import jacrev, vmap
 
 from FixedPointFinderBase import FixedPointFinderBase
 from FixedPoints import FixedPoints
 
 class FixedPointFinderTorch(FixedPointFinderBase):
 
+    # Upper bound on the number of Jacobian entries computed per vmap chunk
+    # when jacobian_chunk_size is None.
+    _max_jacobian_elements = 2**24
+
     def __init__(self, rnn, 
         lr_init=1.0,
         lr_patience=5,
         lr_factor=0.95,
         lr_cooldown=0,
+        jacobian_chunk_size=None,
+        active_set=False,
+        newton_max_iters=50,
+        newton_damping=1e-3,
         **kwargs):
         '''Creates a FixedPointFinder object.
 
@@ -53,6 +61,25 @@ class FixedPointFinderTorch(FixedPointFinderBase):
             lr_cooldown: The 'cooldown' arg provided to ReduceLROnPlateau().
             Default: 0.
 
+            jacobian_chunk_size: Number of fixed points whose Jacobians are
+            computed together in one vmapped call. Default: None, which picks
+            the largest chunk holding at most 2^24 Jacobian entries.
+
+            active_set: Bool indicating whether joint optimization should
+            retire each fixed point as soon as it meets the convergence
+            criteria, rather than waiting for all of them. Retired points are
+            frozen and removed from the batch, so later iterations only run
+            the RNN on the points still being optimized, and each point's
+            n_iters records when it converged. Default: False.
+
+            newton_max_iters: Maximum number of iterations for method='newton'
+            before handing unconverged points to joint optimization.
+            Default: 50.
+
+            newton_damping: Initial Levenberg-Marquardt damping for
+            method='newton'. Damping is adapted per point, shrinking after
+            each accepted step. Default: 1e-3.
+
             See FixedPointFinderBase.py for additional keyword arguments.
         '''
         self.rnn = rnn
@@ -62,6 +89,10 @@ class FixedPointFinderTorch(FixedPointFinderBase):
         self.lr_patience = lr_patience
         self.lr_factor = lr_factor
         self.lr_cooldown = lr_cooldown
+        self.jacobian_chunk_size = jacobian_chunk_size
+        self.active_set = active_set
+        self.newton_max_iters = newton_max_iters
+        self.newton_damping = newton_damping
 
         super().__init__(rnn, **kwargs)
         self.torch_dtype = getattr(torch, self.dtype)
@@ -90,7 +121,7 @@ class FixedPointFinderTorch(FixedPointFinderBase):
         TIME_DIM = self._time_dim
 
         # Ensure that fixed point optimization does not alter RNN parameters.
-        print('\tFreezing model parameters so model is not affected by fixed point optimization.')
+        self._print_if_verbose('\tFreezing model parameters so model is not affected by fixed point optimization.')
         for p in self.rnn.parameters():
             p.requires_grad = False
 
@@ -101,8 +132,9 @@ class FixedPointFinderTorch(FixedPointFinderBase):
         inputs_bx1xd = inputs_bx1xd.to(self.torch_dtype)
         inputs_bx1xd = inputs_bx1xd.to(self.device)
 
-        # Unsqueeze to promote appropriate broadcasting
-        x_1xbxd = torch.from_numpy(initial_states).unsqueeze(0)
+        # Unsqueeze to promote appropriate broadcasting. Copy so the optimizer
+        # does not update initial_states (and hence fps.x_init) in place.
+        x_1xbxd = torch.tensor(initial_states).unsqueeze(0)
         x_1xbxd = x_1xbxd.to(self.torch_dtype)
         x_1xbxd = x_1xbxd.to(self.device)
 
@@ -110,7 +142,8 @@ class FixedPointFinderTorch(FixedPointFinderBase):
         x_1xbxd.requires_grad = True
 
         init_lr = 0.05
-        optimizer = torch.optim.Adam([x_1xbxd], lr=self.lr_init)
+        optimizer = torch.optim.Adam([x_1xbxd],
+            lr=1.0 if self.per_condition else self.lr_init)
 
         # scheduler = torch.optim.lr_scheduler.StepLR(optimizer, 
         #     step_size=500, 
@@ -132,40 +165,85 @@ class FixedPointFinderTorch(FixedPointFinderBase):
         t_start = time.time()
         q_prev_b = torch.full((n_batch,), float('nan'), device=self.device)
 
+        # Results for each fixed point, filled in as points are retired (in
+        # active set mode) or when the optimization terminates.
+        n_states = initial_states.shape[1]
+        xstar = np.zeros((n_batch, n_states), dtype=self.np_dtype)
+        F_xstar = np.zeros((n_batch, n_states), dtype=self.np_dtype)
+        ev_q_b = np.zeros(n_batch, dtype=self.np_dtype)
+        ev_dq_b = np.zeros(n_batch, dtype=self.np_dtype)
+        n_iters = np.zeros(n_batch, dtype=int)
+
+        # Indices (into the full batch) of the points still being optimized.
+        idx_active = np.arange(n_batch)
+        q_retired_sum = 0.
+
+        if self.per_condition:
+            # Group index of each point, each condition (or each point, if
+            # there are no conditions) having its own learning rate.
+            if cond_ids is None:
+                group_b = np.arange(n_batch)
+            else:
+                _, group_b = np.unique(cond_ids, return_inverse=True)
+            group_lr = self._init_group_learning_rates(group_b.max() + 1)
+
         while True:
             
             F_x_bx1xd, F_x_1xbxd = self.rnn(inputs_bx1xd, x_1xbxd)
+            # Some wrappers return the final state as [n x n_states]
+            F_x_1xbxd = F_x_1xbxd.reshape(x_1xbxd.shape)
 
-            dx_bxd = torch.squeeze(x_1xbxd - F_x_1xbxd)
+            dx_bxd = (x_1xbxd - F_x_1xbxd).squeeze(0)
             q_b = 0.5 * torch.sum(torch.square(dx_bxd), axis=1)
-            q_scalar = torch.mean(q_b)
             dq_b = torch.abs(q_b - q_prev_b)
+
+            # Normalizing by the full batch size (including retired points)
+            # keeps the per-point gradients and the scheduler's objective the
+            # same as when optimizing all points jointly.
+            q_scalar = torch.mean(q_b) * (idx_active.size / n_batch) + \
+                q_retired_sum / n_batch
             
             optimizer.zero_grad()
             q_scalar.backward()
-            
-            optimizer.step()
-            scheduler.step(metrics=q_scalar)
 
-            iter_learning_rate = scheduler.state_dict()['_last_lr'][0]
+            ev_q_b[idx_active] = q_b.detach().cpu().numpy()
+            ev_dq_b[idx_active] = dq_b.detach().cpu().numpy()
+
+            if self.per_condition:
+                # Adam's update is linear in the learning rate, so taking a
+                # unit-rate step and rescaling it applies each point's rate.
+                lr_b = self._update_group_learning_rates(
+                    group_lr, group_b[idx_active], ev_q_b[idx_active])
+                x_prev = x_1xbxd.detach().clone()
+                optimizer.step()
+                with torch.no_grad():
+                    lr_1xbx1 = torch.from_numpy(lr_b).to(x_1xbxd)[None, :, None]
+                    x_1xbxd.copy_(x_prev + lr_1xbx1 * (x_1xbxd - x_prev))
+
+                iter_learning_rate = lr_b
+            else:
+                optimizer.step()
+                scheduler.step(metrics=q_scalar)
 
-            ev_q_scalar = q_scalar.detach().cpu().numpy()
-            ev_q_b = q_b.detach().cpu().numpy()
-            ev_dq_b = dq_b.detach().cpu().numpy()
+                iter_learning_rate = scheduler.state_dict()['_last_lr'][0]
 
             if self.super_verbose and \
                 np.mod(iter_count, self.n_iters_per_print_update)==0:
-                self._print_iter_update(
-                    iter_count, t_start, ev_q_b, ev_dq_b, iter_learning_rate)
+                self._print_iter_update(iter_count, t_start, ev_q_b, ev_dq_b,
+                    np.median(iter_learning_rate))
 
-            if iter_count > 1 and \
-                np.all(np.logical_or(
-                    ev_dq_b < self.tol_dq*iter_learning_rate,
-                    ev_q_b < self.tol_q)):
+            if iter_count > 1:
                 '''Here dq is scaled by the learning rate. Otherwise very
                 small steps due to very small learning rates would spuriously
                 indicate convergence. This scaling is roughly equivalent to
                 measuring the gradient norm.'''
+                is_converged = np.logical_or(
+                    ev_dq_b[idx_active] < self.tol_dq*iter_learning_rate,
+                    ev_q_b[idx_active] < self.tol_q)
+            else:
+                is_converged = np.zeros(idx_active.size, dtype=bool)
+
+            if np.all(is_converged):
                 self._print_if_verbose('\tOptimization complete '
                                        'to desired tolerance.')
                 break
@@ -175,23 +253,35 @@ class FixedPointFinderTorch(FixedPointFinderBase):
                                        'Terminating.')
                 break
 
+            if self.active_set and np.any(is_converged):
+                self._retire_points(is_converged, idx_active, iter_count,
+                    x_1xbxd, F_x_1xbxd, xstar, F_xstar, n_iters)
+                q_retired_sum += np.sum(ev_q_b[idx_active[is_converged]])
+
+                # Compact the batch, including Adam's per-element state, to
+                # the points that have not yet converged.
+                keep = torch.from_numpy(np.where(~is_converged)[0]).to(self.device)
+                x_state = optimizer.state.pop(x_1xbxd)
+                x_1xbxd = x_1xbxd.detach()[:, keep].requires_grad_()
+                optimizer.param_groups[0]['params'] = [x_1xbxd]
+                optimizer.state[x_1xbxd] = {key: value[:, keep]
+                    if torch.is_tensor(value) and value.dim() > 0 else value
+                    for key, value in x_state.items()}
+                inputs_bx1xd = inputs_bx1xd.index_select(1 - TIME_DIM, keep)
+                q_b = q_b[keep]
+                idx_active = idx_active[~is_converged]
+
             q_prev_b = q_b
             iter_count += 1
 
         if self.verbose:
             self._print_iter_update(
-                iter_count, t_start, ev_q_b, ev_dq_b, iter_learning_rate, 
-                is_final=True)
+                iter_count, t_start, ev_q_b, ev_dq_b,
+                np.median(iter_learning_rate), is_final=True)
 
-        # remove extra dims
-        xstar = x_1xbxd.squeeze(0)
-        xstar = xstar.detach().cpu().numpy()
-        
-        F_xstar = F_x_1xbxd.squeeze(0)
-        F_xstar = F_xstar.detach().cpu().numpy()
-
-        # Indicate same n_iters for each initialization (i.e., joint optimization)        
-        n_iters = np.tile(iter_count, reps=F_xstar.shape[0])
+        # Record the points still active at termination
+        self._retire_points(np.ones(idx_active.size, dtype=bool), idx_active,
+            iter_count, x_1xbxd, F_x_1xbxd, xstar, F_xstar, n_iters)
 
         fps = FixedPoints(
             xstar=xstar,
@@ -207,6 +297,94 @@ class FixedPointFinderTorch(FixedPointFinderBase):
 
         return fps
 
+    def _init_group_learning_rates(self, n_groups):
+        '''Initializes the per-condition adaptive learning rates used by
+        joint optimization when per_condition is True.
+
+        Args:
+            n_groups: Number of conditions.
+
+        Returns:
+            dict of [n_groups,] numpy arrays holding each condition's
+            learning rate, its previous mean q, and its count of consecutive
+            iterations in which that q decreased.
+        '''
+        return {
+            'lr': np.full(n_groups, self.lr_init),
+            'q_prev': np.full(n_groups, np.inf),
+            'n_decreasing': np.zeros(n_groups, dtype=int)}
+
+    def _update_group_learning_rates(self, group_lr, group_b, q_b):
+        '''Adapts each condition's learning rate given the latest q values,
+        in the manner of the TF AdaptiveLearningRate: the rate is scaled
+        by lr_factor whenever the condition's mean q increases, and by
+        1/lr_factor after lr_patience consecutive decreases.
+
+        Args:
+            group_lr: dict returned by _init_group_learning_rates(), updated
+            in place.
+
+            group_b: [n,] numpy array of the condition index of each point
+            being optimized.
+
+            q_b: [n,] numpy array of the q value of each point.
+
+        Returns:
+            [n,] numpy array of the learning rate of each point.
+        '''
+        n_groups = group_lr['lr'].size
+        count_g = np.bincount(group_b, minlength=n_groups)
+        q_g = np.bincount(group_b, weights=q_b, minlength=n_groups) / \
+            np.maximum(count_g, 1)
+
+        # Only conditions with points still being optimized are updated.
+        is_active = count_g > 0
+        is_decreasing = is_active & (q_g < group_lr['q_prev'])
+        is_increasing = is_active & ~is_decreasing
+
+        group_lr['n_decreasing'][is_decreasing] += 1
+        group_lr['n_decreasing'][is_increasing] = 0
+        group_lr['lr'][is_increasing] *= self.lr_factor
+
+        do_increase = group_lr['n_decreasing'] >= self.lr_patience
+        group_lr['lr'][do_increase] /= self.lr_factor
+        group_lr['n_decreasing'][do_increase] = 0
+
+        group_lr['q_prev'][is_active] = q_g[is_active]
+
+        return group_lr['lr'][group_b]
+
+    def _retire_points(self, is_retired, idx_active, iter_count,
+        x_1xbxd, F_x_1xbxd, xstar, F_xstar, n_iters):
+        ''' Copies the current states of a subset of the points in a joint
+        optimization into the (full batch) result arrays.
+
+        Args:
+            is_retired: [n_active] bool numpy array selecting the points to
+            record, among those currently in the optimization batch.
+
+            idx_active: [n_active] numpy array of the indices of the current
+            batch into the full batch.
+
+            iter_count: Number of iterations run so far.
+
+            x_1xbxd, F_x_1xbxd: [1 x n_active x n_states] tensors of the
+            states being optimized and their one-step updates.
+
+            xstar, F_xstar, n_iters: Result numpy arrays over the full batch,
+            updated in place.
+
+        Returns:
+            None.
+        '''
+
+        idx = idx_active[is_retired]
+        is_retired = torch.from_numpy(is_retired).to(self.device)
+
+        xstar[idx] = x_1xbxd[0, is_retired].detach().cpu().numpy()
+        F_xstar[idx] = F_x_1xbxd[0, is_retired].detach().cpu().numpy()
+        n_iters[idx] = iter_count
+
     def _run_single_optimization(self, initial_state, inputs, cond_id=None):
         '''Finds a single fixed point from a single initial state.
 
@@ -223,7 +401,226 @@ class FixedPointFinderTorch(FixedPointFinderBase):
             associated metadata.
         '''
         
-        return self._run_joint_optimization(initial_state, inputs, cond_id=None)
+        return self._run_joint_optimization(initial_state, inputs, cond_ids=cond_id)
+
+    def _worker_copy(self):
+        ''' Returns a copy of this object, with a CPU copy of the RNN, for use
+        by the worker processes of parallel sequential optimizations.
+        '''
+
+        rnn = self.rnn
+        try:
+            # Avoid deep copying the RNN on its current device
+            self.rnn = None
+            worker = super()._worker_copy()
+        finally:
+            self.rnn = rnn
+
+        # Wrappers may hold on to state tensors from their last forward pass
+        # (e.g., cell.v_t), which are part of an autograd graph and cannot be
+        # deep copied. Every forward pass sets them before use, so they are
+        # dropped from the copy. Parameters, buffers and constant tensor
+        # attributes (e.g., masks) are graph leaves and are copied.
+        memo = {id(value): None
+            for module, name, value in self._get_rnn_state()
+            if value.grad_fn is not None}
+        worker.rnn = deepcopy(rnn, memo).cpu()
+        worker.device = torch.device('cpu')
+
+        return worker
+
+    def _init_worker(self):
+        ''' Uses one thread per worker process, so that workers do not compete
+        for cores. '''
+
+        torch.set_num_threads(1)
+
+    def _run_newton_optimization(self, initial_states, inputs, cond_ids=None):
+        '''Finds multiple fixed points jointly via damped Gauss-Newton
+        (Levenberg-Marquardt) iterations on the residual r(x) = x - F(x).
+
+        Each iteration computes F and dF/dx at every point still being
+        optimized in one vmapped pass, and solves the batched linear systems
+
+            (A^T A + lambda I) dx = -A^T r,    A = I - dF/dx,
+
+        for the steps. lambda is adapted per point: it shrinks after steps
+        that reduce q and grows after steps that do not. Near a fixed point
+        lambda goes to 0, dx approaches the Newton step -(I - dF/dx)^-1 r, and
+        convergence is quadratic. A point stops when q < tol_q, when an
+        accepted step improves q by less than tol_dq, or when no step reduces
+        q even under heavy damping (a local minimum of q). Points that have
+        not stopped after newton_max_iters iterations, or whose states become
+        non-finite, are handed to _run_joint_optimization (Adam).
+
+        Args:
+            initial_states: An [n x n_states] numpy array specifying the initial
+            states of the RNN, from which the optimization will search for
+            fixed points.
+
+            inputs: A [n x n_inputs] numpy array specifying a set of constant
+            inputs into the RNN.
+
+        Returns:
+            fps: A FixedPoints object containing the optimized fixed points
+            and associated metadata.
+        '''
+
+        MAX_DAMPING = 1e10
+        MIN_DAMPING = 1e-12
+
+        n_batch, n_states = initial_states.shape
+
+        self._print_if_verbose('\tFinding fixed points via Newton iterations.')
+
+        x_bxd = torch.tensor(initial_states).to(self.torch_dtype).to(self.device)
+        inputs_bxd = torch.from_numpy(inputs).to(self.torch_dtype).to(self.device)
+
+        step = self._step_function()
+        step_with_aux = lambda x_d, u_d: (step(x_d, u_d),) * 2
+        batch_jacobians = vmap(jacrev(step_with_aux, has_aux=True),
+            chunk_size=self._jacobian_chunk_size(n_states, n_states))
+
+        def batch_step(x_bxd, inputs_bxd):
+            _, F_x_1xbxd = self.rnn(
+                inputs_bxd.unsqueeze(self._time_dim), x_bxd.unsqueeze(0))
+            return F_x_1xbxd.reshape(x_bxd.shape)
+
+        I_dxd = torch.eye(n_states, dtype=torch.float64, device=self.device)
+
+        damping_b = torch.full(
+            (n_batch,), self.newton_damping, dtype=torch.float64,
+            device=self.device)
+        q_b = torch.zeros(n_batch, dtype=self.torch_dtype, device=self.device)
+        dq_b = torch.zeros_like(q_b)
+        F_x_bxd = torch.zeros_like(x_bxd)
+        n_iters = np.zeros(n_batch, dtype=int)
+        is_active = np.ones(n_batch, dtype=bool)
+
+        iter_count = 1
+
+        with torch.no_grad():
+            while iter_count <= self.newton_max_iters and np.any(is_active):
+
+                idx = torch.from_numpy(np.where(is_active)[0]).to(self.device)
+                x_axd = x_bxd[idx]
+                u_axd = inputs_bxd[idx]
+
+                J_axdxd, F_axd = batch_jacobians(x_axd, u_axd)
+                r_axd = x_axd - F_axd
+                q_a = 0.5 * torch.sum(torch.square(r_axd), axis=1)
+
+                # Solve in double precision: I - J is near-singular at the
+                # slow directions of line and plane attractors.
+                A_axdxd = I_dxd - J_axdxd.to(torch.float64)
+                At_axdxd = A_axdxd.transpose(1, 2)
+                lhs_axdxd = torch.matmul(At_axdxd, A_axdxd) + \
+                    damping_b[idx].view(-1, 1, 1) * I_dxd
+                rhs_axd = -torch.matmul(
+                    At_axdxd, r_axd.to(torch.float64).unsqueeze(-1))
+                dx_axd = torch.linalg.solve(lhs_axdxd, rhs_axd).squeeze(-1)
+
+                x_new_axd = x_axd + dx_axd.to(self.torch_dtype)
+                F_new_axd = batch_step(x_new_axd, u_axd)
+                q_new_a = 0.5 * torch.sum(
+                    torch.square(x_new_axd - F_new_axd), axis=1)
+
+                is_accepted = q_new_a < q_a
+                accepted = is_accepted.unsqueeze(-1)
+
+                x_bxd[idx] = torch.where(accepted, x_new_axd, x_axd)
+                F_x_bxd[idx] = torch.where(accepted, F_new_axd, F_axd)
+                q_b[idx] = torch.where(is_accepted, q_new_a, q_a)
+                dq_b[idx] = torch.where(
+                    is_accepted, q_a - q_new_a, torch.zeros_like(q_a))
+                damping_b[idx] = torch.where(is_accepted,
+                    torch.clamp(damping_b[idx] / 10, min=MIN_DAMPING),
+                    damping_b[idx] * 10)
+
+                ev_q_a = q_b[idx].cpu().numpy()
+                ev_dq_a = dq_b[idx].cpu().numpy()
+                is_accepted = is_accepted.cpu().numpy()
+                is_stalled = damping_b[idx].cpu().numpy() > MAX_DAMPING
+                is_finite = np.isfinite(ev_q_a)
+
+                is_done = is_finite & (
+                    (ev_q_a < self.tol_q) |
+                    (is_accepted & (ev_dq_a < self.tol_dq)) |
+                    is_stalled)
+
+                # Steps are only accepted if q decreases, so q can only be
+                # non-finite if it was at the initial state. Such points are
+                # left to the fallback.
+                idx_active = np.where(is_active)[0]
+                n_iters[idx_active] = iter_count
+                is_active[idx_active[is_done | ~is_finite]] = False
+
+                iter_count += 1
+
+        ev_q_b = q_b.cpu().numpy()
+        idx_fallback = np.where(is_active | ~np.isfinite(ev_q_b))[0]
+
+        self._print_if_verbose('\tNewton iterations converged for %d of %d '
+            'states.' % (n_batch - idx_fallback.size, n_batch))
+
+        fps = FixedPoints(
+            xstar=x_bxd.cpu().numpy(),
+            x_init=initial_states,
+            inputs=inputs,
+            cond_id=cond_ids,
+            F_xstar=F_x_bxd.cpu().numpy(),
+            qstar=ev_q_b,
+            dq=dq_b.cpu().numpy(),
+            n_iters=n_iters,
+            tol_unique=self.tol_unique,
+            dtype=self.np_dtype)
+
+        if idx_fallback.size > 0:
+            self._print_if_verbose('\tFalling back to joint optimization '
+                'for the remaining %d states.' % idx_fallback.size)
+
+            fallback_cond_ids = None if cond_ids is None else cond_ids[idx_fallback]
+            fallback_fps = self._run_joint_optimization(
+                fps.xstar[idx_fallback], inputs[idx_fallback],
+                cond_ids=fallback_cond_ids)
+            fallback_fps.x_init = initial_states[idx_fallback]
+            fallback_fps.n_iters += n_iters[idx_fallback]
+            fps[idx_fallback] = fallback_fps
+
+        return fps
+
+    def _gather_samples(self, data_bxtxd, trial_indices, time_indices):
+        ''' As FixedPointFinderBase._gather_samples, but also accepts torch
+        tensors, which are indexed on their own device and returned as
+        tensors. '''
+
+        if not torch.is_tensor(data_bxtxd):
+            return super()._gather_samples(
+                data_bxtxd, trial_indices, time_indices)
+
+        device = data_bxtxd.device
+        return data_bxtxd[torch.from_numpy(trial_indices).to(device),
+                          torch.from_numpy(time_indices).to(device)]
+
+    def _add_gaussian_noise(self, data, noise_scale=0.0):
+        ''' As FixedPointFinderBase._add_gaussian_noise, but also accepts
+        torch tensors. The noise for a tensor is generated on its device, by a
+        generator seeded from self.rng so that results remain reproducible.
+        '''
+
+        if not torch.is_tensor(data) or noise_scale == 0.0:
+            return super()._add_gaussian_noise(data, noise_scale)
+
+        if noise_scale < 0.0:
+            raise ValueError('noise_scale must be non-negative,'
+                             ' but was %f' % noise_scale)
+
+        generator = torch.Generator(device=data.device)
+        generator.manual_seed(int(self.rng.randint(2**31)))
+        noise = torch.randn(data.shape, generator=generator,
+            dtype=data.dtype, device=data.device)
+
+        return data + noise_scale * noise
 
     def _compute_recurrent_jacobians(self, fps):
         '''Computes the Jacobian of the RNN state transition function at the
@@ -241,145 +638,143 @@ class FixedPointFinderTorch(FixedPointFinderBase):
             specified in fps, given the inputs in fps.
         '''
 
-        TIME_DIM = self._time_dim
-        inputs_np = fps.inputs
-        states_np = fps.xstar
-
-        n_batch, n_states = states_np.shape
-        n_batch, n_inputs = inputs_np.shape
+        J_np, = self._batch_jacobians(fps.xstar, fps.inputs, argnums=(0,))
 
-        # For debugging and timing.
-        #
-        # n_batch = 128
-        # inputs_np = np.random.randn(n_batch,n_inputs)
-        # states_np = np.random.randn(n_batch, n_states)
-
-        # Unsqueeze to build in time dimension (a single timestep)
-        inputs_bxd = torch.from_numpy(inputs_np).to(self.torch_dtype).to(self.device)
-        
-        x_bxd = torch.from_numpy(states_np)
-        x_bxd = x_bxd.to(self.torch_dtype)
-        x_bxd = x_bxd.to(self.device)
-
-        def efficient_jacobian(x_bxd, inputs_bxd):
-            '''' 
-            This numerically matches excessive_jacobian() for all i:
-            J_bxdxd[i] <--> J_bxdxbxd[i, :, i, :]
-            https://discuss.pytorch.org/t/jacobian-functional-api-batch-respecting-jacobian/84571/6
-            
-            Empirically, computation time is nearly constant wrt batch size! 
-    
-            i) This function.
-            ii) Computing all bxbxdxd elements where all off-dig elements are 0 (excessive_jacobian).
-            iii) Sequential computation using for loop along batch dim (sequential_jacobian).
-
-            b=128, d=4:
-            i) Total time: 7.37ms. 
-            ii) Total time: 254ms. 
-            iii) Total time: 324ms. 
-
-            Same for b=27, d=4:
-            i) Total time: 7.12ms. 
-            ii) Total time: 66.4ms. 
-            iii) Total time: 84.2ms.
-
-            Same for b=1, d=4 (EDGE CASE):
-            i) Total time: 22.6ms. 
-            ii) Total time: 3.19ms. 
-            iii) Total time: 5.57ms.
-            '''
-            
-            inputs_bx1xd = inputs_bxd.unsqueeze(TIME_DIM) # Used locally--ugly but necessary.
-
-            def forward_fn(x_bxd):
-                ''' Computes x(t+1) as a function of x(t) under fixed inputs. 
-                Both x(t) and x(t+1) have shape (n, n_states).
-                '''
-
-                # Unsqueeze to promote appropriate broadcasting
-                x_1xbxd = x_bxd.unsqueeze(0)
+        return J_np
 
-                _, F_x_1xbxd = self.rnn(inputs_bx1xd, x_1xbxd)
+    def _compute_jacobians(self, fps):
+        ''' Computes the recurrent Jacobians (dF/dx) and the input Jacobians
+        (dF/du) at the specified fixed points in a single vectorized pass.
 
-                F_x_bxd = F_x_1xbxd.squeeze(0)
-                return F_x_bxd
+        Args:
+            fps: A FixedPoints object containing the RNN states (fps.xstar)
+            and inputs (fps.inputs) at which to compute the Jacobians.
 
-            def batch_jacobian(f, x):
-                ''' Computes dF/dx.
+        Returns:
+            dFdx: An [n x n_states x n_states] numpy array containing the
+            recurrent Jacobians.
 
-                Args:
-                    x: shape (n, n_states).
-                    f: Torch function that computes x(t+1) from x(t).
+            dFdu: An [n x n_states x n_inputs] numpy array containing the
+            input Jacobians.
+        '''
 
-                Returns dF/dx, shape (n, n_states, n_states).
-                '''
+        return self._batch_jacobians(fps.xstar, fps.inputs, argnums=(0, 1))
 
-                # This works because dF[i,:]/dx[j,:] is 0 for i!=j. 
-                # Here x and F have shape [n, n_states].
-                # I'm not sure why this is so much faster in practice, but something in the backend
-                # is smarter for this implementation than for excessive_jacobian.
+    def _step_function(self):
+        ''' Returns the pure function (x(t), u) -> x(t+1) of a single state
+        under a fixed input, which the Jacobians are computed from; vmap
+        supplies the batch dimension.
 
-                f_sum = lambda x: torch.sum(f(x), axis=0)
-                J_dxbxd = jacobian(f_sum, x)
-                J_bxdxd = J_dxbxd.permute(1,0,2)
-                return J_bxdxd
+        RNNs with a functional_step() method (returning a stateless
+        step(params, x, u) and its parameters) are stepped through that, so
+        the transforms never touch the module. Others are stepped through
+        their forward, via _module_step.
+        '''
 
-            J_bxdxd = batch_jacobian(forward_fn, x_bxd)
-            return J_bxdxd
+        if not hasattr(self.rnn, 'functional_step'):
+            return self._module_step
 
-        def excessive_jacobian(x_bxd, inputs_bxd):
-            # This uses excess computation to compute derivatives across the batch,
-            # which are always 0.
-            # To confirm this, see that J_bxbxdxd[i, j, :, :]==0 for all i != j.
+        step, params = self.rnn.functional_step()
+        return lambda x_d, u_d: step(params, x_d, u_d)
 
-            inputs_bx1xd = inputs_bxd.unsqueeze(TIME_DIM) # Used locally--ugly but necessary.
+    def _module_step(self, x_d, u_d):
+        ''' Computes x(t+1) from x(t) for a single state under a fixed input,
+        by calling the RNN's forward on a single point at a single timestep.
 
-            def forward_fn(x_bxd):
-                # Unsqueeze to promote appropriate broadcasting
-                x_1xbxd = x_bxd.unsqueeze(0)
+        Args:
+            x_d: [n_states] tensor, the state x(t).
 
-                _, F_x_1xbxd = self.rnn(inputs_bx1xd, x_1xbxd)
+            u_d: [n_inputs] tensor, the input u.
 
-                F_x_bxd = F_x_1xbxd.squeeze(0)
-                return F_x_bxd
+        Returns:
+            [n_states] tensor, the state x(t+1).
+        '''
 
-            J_bxdxbxd = jacobian(forward_fn, x_bxd, create_graph=False)
-            J_bxbxdxd = J_bxdxbxd.permute(0,2,1,3)
+        # A single point at a single timestep has the same [1 x 1 x d] shape
+        # whether or not the RNN is batch_first.
+        inputs_1x1xd = u_d.view(1, 1, -1)
+        x_1x1xd = x_d.view(1, 1, -1)
+
+        # The RNN wrappers keep their running state as module attributes
+        # (e.g., cell.v_t). Under vmap/jacrev those would be left holding
+        # transformed tensors that cannot be used outside of the transform,
+        # so restore them once the step has been taken.
+        rnn_state = self._get_rnn_state()
+        try:
+            _, F_x_1x1xd = self.rnn(inputs_1x1xd, x_1x1xd)
+        finally:
+            self._set_rnn_state(rnn_state)
+
+        return F_x_1x1xd.view(-1)
+
+    def _get_rnn_state(self):
+        ''' Returns the plain tensor attributes (i.e., not parameters or
+        buffers) of every module of the RNN, as [(module, name, tensor)]. '''
+
+        return [(module, name, value)
+            for module in self.rnn.modules()
+            for name, value in vars(module).items()
+            if torch.is_tensor(value)]
+
+    def _set_rnn_state(self, rnn_state):
+        ''' Restores the tensor attributes saved by _get_rnn_state, and
+        removes any that have been added since. '''
+
+        saved = {(id(module), name) for module, name, _ in rnn_state}
+        for module, name, _ in self._get_rnn_state():
+            if (id(module), name) not in saved:
+                delattr(module, name)
+
+        for module, name, value in rnn_state:
+            setattr(module, name, value)
+
+    def _batch_jacobians(self, states_np, inputs_np, argnums=(0, 1)):
+        ''' Computes Jacobians of the RNN state transition function at a set
+        of (state, input) pairs using torch.func.jacrev, vmapped over the
+        pairs. Points are processed in chunks of self.jacobian_chunk_size so
+        that the per-chunk Jacobians stay bounded in size.
 
-            return J_bxbxdxd
+        Args:
+            states_np: An [n x n_states] numpy array of RNN states.
 
-        def sequential_jacobian(x_bxd, inputs_bxd):
+            inputs_np: An [n x n_inputs] numpy array of RNN inputs.
 
-            def forward_fn(x_d):
-                # Unsqueeze to promote appropriate broadcasting
-                x_1xbxd = x_d.unsqueeze(0).unsqueeze(1)
-                inputs_bx1xd = inputs_d.unsqueeze(0).unsqueeze(1)
+            argnums: Tuple selecting what to differentiate with respect to: 0
+            for the states, 1 for the inputs. Default: (0, 1).
 
-                _, F_x_1xbxd = self.rnn(inputs_bx1xd, x_1xbxd)
+        Returns:
+            Tuple with one numpy array per entry of argnums: [n x n_states x
+            n_states] for the states and [n x n_states x n_inputs] for the
+            inputs.
+        '''
 
-                F_x_d = F_x_1xbxd.squeeze()
-                return F_x_d
+        n_states = states_np.shape[1]
+        n_inputs = inputs_np.shape[1]
 
-            J_list = []
+        x_bxd = torch.from_numpy(states_np).to(self.torch_dtype).to(self.device)
+        inputs_bxd = torch.from_numpy(inputs_np).to(self.torch_dtype).to(self.device)
 
-            for i in range(n_batch):
-                x_d = x_bxd[i]
-                inputs_d = inputs_bxd[i]
-                J_i = jacobian(forward_fn, x_d)
-                J_list.append(J_i)
+        n_cols = sum([(n_states, n_inputs)[a] for a in argnums])
+        batch_jacobians = vmap(jacrev(self._step_function(), argnums=argnums),
+            chunk_size=self._jacobian_chunk_size(n_states, n_cols))
 
-            return J_list
+        with torch.no_grad():
+            J_list = batch_jacobians(x_bxd, inputs_bxd)
 
-        J_bxdxd = efficient_jacobian(x_bxd, inputs_bxd)
+        return tuple(J.detach().cpu().numpy() for J in J_list)
 
+    def _jacobian_chunk_size(self, n_rows, n_cols):
+        ''' Returns the number of points per vmapped Jacobian computation:
+        self.jacobian_chunk_size if set, or else the largest chunk whose
+        [chunk x n_rows x n_cols] Jacobians hold at most
+        _max_jacobian_elements entries.
+        '''
 
-        # J_bxbxdxd = excessive_jacobian(x_bxd, inputs_bxd)
-        J_list = sequential_jacobian(x_bxd, inputs_bxd)
+        if self.jacobian_chunk_size is not None:
+            return self.jacobian_chunk_size
 
-        J_np = J_bxdxd.detach().cpu().numpy()
+        return max(1, self._max_jacobian_elements // (n_rows * n_cols))
 
-        return J_np
-        
     def _compute_input_jacobians(self, fps):
         ''' Computes the partial derivatives of the RNN state transition
         function with respect to the RNN's inputs, assuming fixed hidden states.
@@ -394,4 +789,112 @@ class FixedPointFinderTorch(FixedPointFinderBase):
             inputs specified in fps, given the states in fps.
         '''
 
-        return None
\ No newline at end of file
+        J_np, = self._batch_jacobians(fps.xstar, fps.inputs, argnums=(1,))
+
+        return J_np
+
+    def approximate_updates(self, states, inputs, fps,
+        do_compute_exact_update=True):
+        ''' Computes approximate one-step updates based on linearized dynamics
+        around fixed points. See _compute_approx_one_step_update() docstring
+        for the underlying math.
+
+        This function computes an approximate update for every pair
+        (states[i], inputs[i]) based on the linearized dynamics about every
+        fixed point fps[j], all in one batched computation.
+
+        Args:
+            states: numpy array with shape (n, n_states) of RNN states for
+            which approximate updates will be computed.
+
+            inputs: numpy array with shape (n, n_inputs) of RNN inputs, paired
+            with states. Alternatively, a shape (n_inputs,) or (1, n_inputs)
+            numpy array specifying a single set of inputs to apply to all
+            state updates.
+
+            fps: A FixedPoints object containing the (possibly many) fixed
+            points about which to compute linearized dynamics. fps.J_xstar and
+            fps.dFdu are used if present, and computed otherwise.
+
+            do_compute_exact_update (optional): Bool indicating whether to
+            compute the exact one-step updates via the RNN itself
+            (Default: True).
+
+        Returns:
+            approx_states: shape (k, n, n_states) numpy array containing the
+            approximate one-step updated states. Here, k is the number of fixed
+            points in fps, and n is the number of state-input pairs in states
+            and inputs.
+
+            exact_states (optional): shape (n, n_states) numpy array containing
+            the exact one-step updates (i.e., using the full RNN). Only
+            returned if do_compute_exact_update is True.
+        '''
+
+        dFdx = fps.J_xstar
+        dFdu = getattr(fps, 'dFdu', None)
+        if dFdx is None or dFdu is None:
+            self._print_if_verbose('Computing Jacobians...')
+            dFdx, dFdu = self._compute_jacobians(fps)
+
+        n = states.shape[0]
+        inputs = np.broadcast_to(inputs, (n, fps.n_inputs))
+
+        to_torch = lambda a: torch.from_numpy(
+            np.ascontiguousarray(a)).to(self.torch_dtype).to(self.device)
+
+        states_bxd = to_torch(states)
+        inputs_bxd = to_torch(inputs)
+
+        approx_states = self._compute_approx_one_step_update(
+            states_bxd, inputs_bxd,
+            to_torch(dFdx), to_torch(fps.xstar), to_torch(dFdu),
+            to_torch(fps.inputs))
+        approx_states = approx_states.cpu().numpy()
+
+        if not do_compute_exact_update:
+            return approx_states
+        else:
+            with torch.no_grad():
+                _, F_x_1xbxd = self.rnn(
+                    inputs_bxd.unsqueeze(self._time_dim), states_bxd.unsqueeze(0))
+            exact_states = F_x_1xbxd.reshape(states_bxd.shape).cpu().numpy()
+            return approx_states, exact_states
+
+    def _compute_approx_one_step_update(self, states, inputs, dFdx, xstar, dFdu, u):
+        ''' Approximate one-step updates based on linearized dynamics around
+        a batch of fixed points.
+
+        Near a fixed point x* with input u, the RNN update x(t+1) = F(x(t),
+        u(t+1)) is well-approximated by the first-order Taylor expansion:
+
+            x(t+1) ~ x* + A (x(t) - x*) + B (u(t+1) - u)
+
+        where A is dF/dx and B is dF/du evaluated at (x*, u). This function
+        computes this approximate update for every state-input pair based on
+        the linearized dynamics about each of k fixed points.
+
+        Args:
+            states: [n x n_states] tensor of states x(t).
+
+            inputs: [n x n_inputs] tensor of inputs u(t+1), paired with states.
+
+            dFdx: [k x n_states x n_states] tensor of recurrent Jacobians.
+
+            xstar: [k x n_states] tensor of fixed points.
+
+            dFdu: [k x n_states x n_inputs] tensor of input Jacobians.
+
+            u: [k x n_inputs] tensor of the inputs for which xstar are fixed
+            points.
+
+        Returns:
+            [k x n x n_states] tensor of approximate one-step updated states.
+        '''
+
+        dx_kxnxd = states.unsqueeze(0) - xstar.unsqueeze(1)
+        du_kxnxd = inputs.unsqueeze(0) - u.unsqueeze(1)
+
+        return xstar.unsqueeze(1) + \
+            torch.matmul(dx_kxnxd, dFdx.transpose(1, 2)) + \
+            torch.matmul(du_kxnxd, dFdu.transpose(1, 2))
\ No newline at end of file
@@ -17,8 +17,11 @@ Please direct correspondence to mgolub@cs.washington.edu
 '''
 
 import pdb
+import os
 import numpy as np
 import pickle
+from scipy.spatial import cKDTree
+from scipy.sparse.linalg import eigs, ArpackNoConvergence
 
 class FixedPoints(object):
     '''
@@ -43,6 +46,10 @@ class FixedPoints(object):
             'is_stable',
             'cond_id']
 
+    ''' Name of the file holding the non-array attributes in the 'npy' save
+    format. '''
+    _npy_meta_filename = 'meta.pkl'
+
     ''' List of class attributes that apply to all fixed points
     (i.e., these are not indexed per fixed point). '''
     _nonspecific_attrs = [
@@ -307,7 +314,8 @@ class FixedPoints(object):
         # change and testing for a rainy day.
         if self.has_decomposed_jacobians:
             self.eigval_J_xstar[index] = fps.eigval_J_xstar
-            self.eigvec_J_xstar[index] = fps.eigvec_J_xstar
+            if self.eigvec_J_xstar is not None:
+                self.eigvec_J_xstar[index] = fps.eigvec_J_xstar
             self.is_stable[index] = fps.is_stable
 
     def __getitem__(self, index):
@@ -369,12 +377,14 @@ class FixedPoints(object):
 
         return idx.size > 0
 
-    def get_unique(self):
+    def get_unique(self, by_cond_id=False):
         '''Identifies unique fixed points. Among duplicates identified,
         this keeps the one with smallest qstar.
 
         Args:
-            None.
+            by_cond_id (optional): A bool indicating whether to identify
+            duplicates only among fixed points with the same cond_id.
+            Default: False.
 
         Returns:
             A FixedPoints object containing only the unique fixed points and
@@ -383,14 +393,39 @@ class FixedPoints(object):
         assert (self.xstar is not None),\
             ('Cannot find unique fixed points because self.xstar is None.')
 
+        if by_cond_id and self.cond_id is not None:
+            idx_keep = [np.zeros(0, dtype=int)]
+            for cond_id in np.unique(self.cond_id):
+                idx_cond = np.where(self.cond_id == cond_id)[0]
+                idx_keep.append(self._get_unique_indices(idx_cond))
+
+            return self[np.sort(np.concatenate(idx_keep))]
+
+        return self[self._get_unique_indices(np.arange(self.n))]
+
+    def _get_unique_indices(self, idx_subset):
+        ''' Returns the indices of the fixed points kept by get_unique(),
+        when identifying duplicates only within idx_subset. '''
+
         if self.inputs is None:
-            data_nxd = self.xstar
+            data_nxd = self.xstar[idx_subset]
         else:
-            data_nxd = np.concatenate((self.xstar, self.inputs), axis=1)
+            data_nxd = np.concatenate(
+                (self.xstar[idx_subset], self.inputs[idx_subset]), axis=1)
+        qstar = self.qstar[idx_subset]
+        n = len(idx_subset)
+
+        # Radius queries on a KD-tree over the concatenated (xstar, inputs)
+        # give the candidate matches for each fixed point in O(log n), rather
+        # than comparing against every fixed point. The radius is padded
+        # slightly, and candidates are then confirmed using the same norm as
+        # find(), so that matches are identical to an exhaustive search.
+        tree = cKDTree(data_nxd)
+        radius = self.tol_unique * (1. + 1e-3)
 
         idx_keep = []
-        idx_checked = np.zeros(self.n, dtype=bool)
-        for idx in range(self.n):
+        idx_checked = np.zeros(n, dtype=bool)
+        for idx in range(n):
 
             if idx_checked[idx]:
                 # If this FP matched others, we've already determined which
@@ -399,21 +434,23 @@ class FixedPoints(object):
                 continue
 
             # Don't compare against FPs we've already checked
-            idx_check = np.where(~idx_checked)[0]
-            fps_check = self[idx_check] # only check against these FPs
-            idx_idx_check = fps_check.find(self[idx]) # indexes into fps_check
-            idx_match = idx_check[idx_idx_check] # indexes into self
+            idx_candidate = np.array(
+                tree.query_ball_point(data_nxd[idx], radius), dtype=int)
+            idx_candidate = np.sort(idx_candidate[~idx_checked[idx_candidate]])
+            norm_diffs = np.linalg.norm(
+                data_nxd[idx_candidate] - data_nxd[idx], axis=1)
+            idx_match = idx_candidate[norm_diffs <= self.tol_unique]
 
             if len(idx_match)==1:
                 # Only matches with itself
                 idx_keep.append(idx)
             else:
-                qstars_match = self.qstar[idx_match]
+                qstars_match = qstar[idx_match]
                 idx_candidate = idx_match[np.argmin(qstars_match)]
                 idx_keep.append(idx_candidate)
                 idx_checked[idx_match] = True
 
-        return self[idx_keep]
+        return idx_subset[np.array(idx_keep, dtype=int)]
 
     def transform(self, U, offset=0.):
         ''' Apply an affine transformation to the state-space representation.
@@ -437,8 +474,9 @@ class FixedPoints(object):
 
         if self.has_decomposed_jacobians:
             kwargs['eigval_J_xstar'] = self.eigval_J_xstar
-            kwargs['eigvec_J_xstar'] = \
-                np.matmul(U.T, self.eigvec_J_xstar) + offset
+            if self.eigvec_J_xstar is not None:
+                kwargs['eigvec_J_xstar'] = \
+                    np.matmul(U.T, self.eigvec_J_xstar) + offset
 
         transformed_fps = FixedPoints(**kwargs)
 
@@ -502,7 +540,7 @@ class FixedPoints(object):
             AssertionError if the updated object has inconsistent data shapes.
         '''
 
-        self._assert_matching_nonspecific_attrs(self, new_fps)
+        self._assert_matching_nonspecific_attrs([self, new_fps])
 
         for attr_name in self._data_attrs:
 
@@ -514,7 +552,8 @@ class FixedPoints(object):
                  'FixedPoints.update does not currently support this '
                  'configuration.' % attr_name)
 
-            if this_has and that_has:
+            if this_has and that_has and \
+                getattr(self, attr_name) is not None:
                 cat_attr = np.concatenate(
                     (getattr(self, attr_name),
                     getattr(new_fps, attr_name)),
@@ -524,7 +563,8 @@ class FixedPoints(object):
         self.n = self.n + new_fps.n
         self.assert_valid_shapes()
 
-    def decompose_jacobians(self, do_batch=True, str_prefix=''):
+    def decompose_jacobians(self, do_batch=True, str_prefix='',
+        mode='full', k=None, backend='numpy', device=None):
         '''Adds the following fields to the FixedPoints object:
 
         eigval_J_xstar: [n x n_states] numpy array with eigval_J_xstar[i, :]
@@ -534,6 +574,11 @@ class FixedPoints(object):
         eigvec_J_xstar[i, :, :] containing the eigenvectors of
         J_xstar[i, :, :].
 
+        is_stable: [n,] bool numpy array indicating whether each fixed point
+        is stable (all eigenvalues within the unit circle).
+
+        Eigenpairs are sorted by decreasing eigenvalue magnitude.
+
         Args:
             do_batch (optional): bool indicating whether to perform a batch
             decomposition. This is typically faster as long as sufficient
@@ -543,6 +588,31 @@ class FixedPoints(object):
 
             str_prefix (optional): String to be pre-pended to print statements.
 
+            mode (optional): 'full' to compute all eigenvalues and
+            eigenvectors, or 'eigvals' to compute eigenvalues only (leaving
+            eigvec_J_xstar as None), which is considerably faster and
+            sufficient for is_stable. Default: 'full'.
+
+            k (optional): If provided, only the k leading eigenpairs (or
+            eigenvalues, with mode='eigvals') are kept: eigval_J_xstar is
+            [n x k] and eigvec_J_xstar is [n x n_states x k]. This is enough
+            for is_stable, which depends only on the leading eigenvalue. With
+            backend='numpy', they are computed by ARPACK's implicitly
+            restarted Arnoldi method (scipy.sparse.linalg.eigs), one Jacobian
+            at a time, which for k << n_states is much cheaper than a full
+            decomposition. torch has no such solver for nonsymmetric
+            matrices, so with backend='torch' all eigenvalues are still
+            computed (and then trimmed to k), and only the eigenvectors are
+            restricted to the k leading ones, which are found by batched
+            inverse iteration. Default: None.
+
+            backend (optional): 'numpy', or 'torch' to run the
+            decompositions with torch.linalg, batched on device.
+            Default: 'numpy'.
+
+            device (optional): torch device for backend='torch'.
+            Default: None (CPU).
+
         Returns:
             None.
         '''
@@ -552,81 +622,242 @@ class FixedPoints(object):
                 'not repeating.' % str_prefix)
             return
 
+        if mode not in ['full', 'eigvals']:
+            raise ValueError('Unsupported mode: %s.' % mode)
+
         n = self.n # number of FPs represented in this object
         n_states = self.n_states # dimensionality of each state
+        n_vecs = n_states if k is None else min(k, n_states)
+        n_vals = n_vecs
+        do_vecs = mode == 'full'
+
+        # Check for NaNs in Jacobians. Set eigen-data to NaN if there are any
+        # NaNs in the corresponding Jacobian.
+        valid_J_idx = ~np.any(np.isnan(self.J_xstar), axis=(1,2))
+
+        self.eigval_J_xstar = \
+            self._alloc_nan((n, n_vals), dtype=self.dtype_complex)
+        if do_vecs:
+            self.eigvec_J_xstar = self._alloc_nan(
+                (n, n_states, n_vecs), dtype=self.dtype_complex)
+        else:
+            self.eigvec_J_xstar = None
 
         if do_batch:
             # Batch eigendecomposition
             print('%sDecomposing Jacobians in a single batch.' % str_prefix)
+            batches = [np.where(valid_J_idx)[0]]
+        else:
+            print('%sDecomposing Jacobians one-at-a-time.' % str_prefix)
+            batches = [[idx] for idx in np.where(valid_J_idx)[0]]
 
-            # Check for NaNs in Jacobians
-            valid_J_idx = ~np.any(np.isnan(self.J_xstar), axis=(1,2))
+        for idx in batches:
+            e_vals, e_vecs = self._decompose(
+                self.J_xstar[idx], do_vecs, k, backend, device)
+            self.eigval_J_xstar[idx] = e_vals
+            if do_vecs:
+                self.eigvec_J_xstar[idx] = e_vecs
 
-            if np.all(valid_J_idx):
-                # No NaNs, nothing to worry about.
-                e_vals_unsrt, e_vecs_unsrt = np.linalg.eig(self.J_xstar)
-            else:
-                # Set eigen-data to NaN if there are any NaNs in the
-                # corresponding Jacobian.
-                e_vals_unsrt = self._alloc_nan(
-                    (n, n_states), dtype=self.dtype_complex)
-                e_vecs_unsrt = self._alloc_nan(
-                    (n, n_states, n_states), dtype=dtype_complex)
+        # For stability, need only to look at the leading eigenvalue
+        self.is_stable = np.abs(self.eigval_J_xstar[:, 0]) < 1.0
 
-                e_vals_unsrt[valid_J_idx], e_vecs_unsrt[valid_J_idx] = \
-                    np.linalg.eig(self.J_xstar[valid_J_idx])
+        self.assert_valid_shapes()
 
-        else:
-            print('%sDecomposing Jacobians one-at-a-time.' % str_prefix)
-            e_vals = []
-            e_vecs = []
-            for J in self.J_xstar:
+    @staticmethod
+    def _decompose(J_bxdxd, do_vecs=True, k=None, backend='numpy', device=None):
+        '''Batched eigendecomposition of Jacobians, with eigenpairs sorted
+        by decreasing eigenvalue magnitude. See decompose_jacobians().
 
-                if np.any(np.isnan(J)):
-                    e_vals_i = self._alloc_nan((n_states,))
-                    e_vecs_i = self._alloc_nan((n_states, n_states))
-                else:
-                    e_vals_i, e_vecs_i = np.linalg.eig(J)
+        Args:
+            J_bxdxd: [b x d x d] numpy array of Jacobians.
+
+            do_vecs: bool indicating whether to compute eigenvectors.
+
+            k: number of leading eigenvectors to compute, or None for all.
 
-                e_vals.append(np.expand_dims(e_vals_i, axis=0))
-                e_vecs.append(np.expand_dims(e_vecs_i, axis=0))
+            backend: 'numpy' or 'torch'.
 
-            e_vals_unsrt = np.concatenate(e_vals, axis=0)
-            e_vecs_unsrt = np.concatenate(e_vecs, axis=0)
+            device: torch device for backend='torch'.
+
+        Returns:
+            e_vals: [b x k] complex numpy array of sorted eigenvalues (with
+            k = d if k is None).
+
+            e_vecs: [b x d x k] complex numpy array with the corresponding
+            eigenvectors in its columns, or None if do_vecs is False.
+        '''
+
+        d = J_bxdxd.shape[-1]
+        if backend == 'numpy' and k is not None and k < d - 1:
+            # ARPACK needs k < d - 1; otherwise a full decomposition is used.
+            return FixedPoints._decompose_arnoldi(J_bxdxd, do_vecs, k)
+
+        if backend == 'torch':
+            import torch
+            J = torch.from_numpy(np.ascontiguousarray(J_bxdxd)).to(device)
+            linalg = torch.linalg
+            to_numpy = lambda x: x.cpu().numpy()
+            take_along_axis = torch.take_along_dim
+
+            def argsort_decreasing(x):
+                return torch.argsort(x.abs(), dim=-1, descending=True)
+
+        elif backend == 'numpy':
+            J = J_bxdxd
+            linalg = np.linalg
+            to_numpy = lambda x: x
+            take_along_axis = np.take_along_axis
+
+            def argsort_decreasing(x):
+                return np.argsort(np.abs(x), axis=-1)[..., ::-1]
+
+        else:
+            raise ValueError('Unsupported backend: %s.' % backend)
 
-        print('%sSorting by Eigenvalue magnitude.' % str_prefix)
-        # For each FP, sort eigenvectors by eigenvalue magnitude
+        if do_vecs and k is None:
+            e_vals_unsrt, e_vecs_unsrt = linalg.eig(J)
+        else:
+            e_vals_unsrt = linalg.eigvals(J)
+
+        # For each FP, sort eigenpairs by eigenvalue magnitude
         # (decreasing order).
-        mags_unsrt = np.abs(e_vals_unsrt) # shape (n,)
-        sort_idx = np.argsort(mags_unsrt)[:,::-1]
+        sort_idx = argsort_decreasing(e_vals_unsrt)
+        e_vals = take_along_axis(e_vals_unsrt, sort_idx, -1)
 
-        # Apply the sort
-        # There must be a faster way, but I'm too lazy to find it at the moment
-        self.eigval_J_xstar = \
-            self._alloc_nan((n, n_states), dtype=self.dtype_complex)
-        self.eigvec_J_xstar = \
-            self._alloc_nan((n, n_states, n_states), dtype=self.dtype_complex)
-        self.is_stable = np.zeros(n, dtype=bool)
+        if not do_vecs:
+            e_vecs = None
+        elif k is None:
+            e_vecs = take_along_axis(e_vecs_unsrt, sort_idx[:, None, :], -1)
+        else:
+            e_vecs = FixedPoints._inverse_iteration(
+                J, e_vals[:, :k], backend)
 
-        for k in range(n):
-            sort_idx_k = sort_idx[k]
-            e_vals_k = e_vals_unsrt[k][sort_idx_k]
-            e_vecs_k = e_vecs_unsrt[k][:, sort_idx_k]
-            self.eigval_J_xstar[k] = e_vals_k
-            self.eigvec_J_xstar[k] = e_vecs_k
+        if k is not None:
+            e_vals = e_vals[:, :k]
 
-            # For stability, need only to look at the leading eigenvalue
-            self.is_stable[k] = np.abs(e_vals_k[0]) < 1.0
+        return to_numpy(e_vals), None if e_vecs is None else to_numpy(e_vecs)
 
-        self.assert_valid_shapes()
+    @staticmethod
+    def _decompose_arnoldi(J_bxdxd, do_vecs, k):
+        '''Computes the k leading (largest magnitude) eigenpairs of each of a
+        batch of Jacobians using ARPACK, sorted by decreasing eigenvalue
+        magnitude. See _decompose().
+        '''
+
+        b, d, _ = J_bxdxd.shape
+
+        e_vals = np.zeros((b, k), dtype=np.complex128)
+        e_vecs = np.zeros((b, d, k), dtype=np.complex128) if do_vecs else None
+
+        # Fixed starting vector, so that results are reproducible
+        v0 = np.random.RandomState(0).rand(d)
+
+        # For real matrices, ARPACK may return only one of a complex
+        # conjugate pair that straddles the k-th eigenvalue, dropping a
+        # larger one instead. Asking for one more avoids this.
+        k_arpack = min(k + 1, d - 2)
+
+        # Krylov subspace dimension. ARPACK's default (2k+1) tends to miss
+        # eigenvalues when the leading ones are clustered.
+        ncv = min(d, max(2*k_arpack + 1, 32))
+
+        for i in range(b):
+            # In double precision, as the leading eigenvalues of trained RNNs
+            # tend to cluster near the unit circle.
+            J_dxd = J_bxdxd[i].astype(np.float64)
+            try:
+                result = eigs(J_dxd, k=k_arpack, which='LM', v0=v0, ncv=ncv,
+                    return_eigenvectors=do_vecs)
+            except ArpackNoConvergence:
+                # Fall back to the full decomposition for this Jacobian
+                result = np.linalg.eig(J_dxd) if do_vecs \
+                    else np.linalg.eigvals(J_dxd)
+
+            e_vals_i = result[0] if do_vecs else result
+            sort_idx = np.argsort(np.abs(e_vals_i))[::-1][:k]
+            e_vals[i] = e_vals_i[sort_idx]
+            if do_vecs:
+                e_vecs[i] = result[1][:, sort_idx]
+
+        return e_vals, e_vecs
+
+    @staticmethod
+    def _inverse_iteration(J_bxdxd, e_vals_bxk, backend='numpy', n_iters=2):
+        '''Computes unit-norm eigenvectors of a batch of matrices for known
+        eigenvalues by inverse iteration, i.e., by repeatedly solving
+
+            (J - lambda I) v_new = v
+
+        with lambda slightly perturbed from the eigenvalue, so that the
+        system is not exactly singular. Each of the b*k solves is O(d^3),
+        which is cheaper than a full eigendecomposition when k is small.
 
-    def save(self, save_path):
+        Args:
+            J_bxdxd: [b x d x d] numpy array or torch tensor.
+
+            e_vals_bxk: [b x k] complex eigenvalues of J_bxdxd.
+
+            backend: 'numpy' or 'torch', matching the types of the inputs.
+
+            n_iters (optional): number of inverse iterations. Default: 2.
+
+        Returns:
+            [b x d x k] complex eigenvectors, of the input type.
+        '''
+
+        b, d, _ = J_bxdxd.shape
+        k = e_vals_bxk.shape[1]
+
+        if backend == 'torch':
+            import torch
+            dtype = torch.complex128
+            J = J_bxdxd.to(dtype).unsqueeze(1)
+            shift = e_vals_bxk.to(dtype)
+            eye = torch.eye(d, dtype=dtype, device=J.device)
+            generator = torch.Generator(device=J.device).manual_seed(0)
+            v = torch.randn((b, k, d, 1), generator=generator,
+                dtype=torch.float64, device=J.device).to(dtype)
+            solve = torch.linalg.solve
+            norm = lambda x: torch.linalg.vector_norm(x, dim=-2, keepdim=True)
+        else:
+            dtype = np.complex128
+            J = J_bxdxd.astype(dtype)[:, np.newaxis]
+            shift = e_vals_bxk.astype(dtype)
+            eye = np.eye(d, dtype=dtype)
+            v = np.random.RandomState(0).randn(b, k, d, 1).astype(dtype)
+            solve = np.linalg.solve
+            norm = lambda x: np.linalg.norm(x, axis=-2, keepdims=True)
+
+        # Relative perturbation keeps (J - lambda I) invertible in floating
+        # point while leaving the eigenvector dominant after one solve.
+        shift = shift * (1 + 1e-10) + 1e-10
+        A = J - shift[:, :, None, None] * eye
+
+        for _ in range(n_iters):
+            v = solve(A, v)
+            v = v / norm(v)
+
+        # [b x k x d x 1] -> [b x d x k]
+        if backend == 'torch':
+            return v[..., 0].transpose(1, 2)
+        else:
+            return v[..., 0].transpose(0, 2, 1)
+
+    def save(self, save_path, file_format='pickle'):
         '''Saves all data contained in the FixedPoints object.
 
         Args:
             save_path: A string containing the path at which to save
             (including directory, filename, and arbitrary extension).
 
+            file_format (optional): 'pickle' to save everything into a single
+            pickle file, or 'npy' to save a directory at save_path with one
+            uncompressed .npy file per array attribute (plus a small pickle
+            of the remaining attributes). The 'npy' format can be memory
+            mapped by restore(), so that individual attributes or fixed
+            points can be read without loading the rest (e.g., without
+            touching the Jacobians). Default: 'pickle'.
+
         Returns:
             None.
         '''
@@ -635,27 +866,71 @@ class FixedPoints(object):
 
         self.assert_valid_shapes()
 
-        file = open(save_path,'wb')
-        file.write(pickle.dumps(self.__dict__))
-        file.close()
+        if file_format == 'pickle':
+            file = open(save_path,'wb')
+            file.write(pickle.dumps(self.__dict__))
+            file.close()
+
+        elif file_format == 'npy':
+            os.makedirs(save_path, exist_ok=True)
+
+            meta = {}
+            array_attrs = []
+            for attr_name, attr_val in self.__dict__.items():
+                if isinstance(attr_val, np.ndarray) and \
+                    attr_val.dtype != object:
+                    np.save(os.path.join(save_path, attr_name + '.npy'),
+                        attr_val, allow_pickle=False)
+                    array_attrs.append(attr_name)
+                else:
+                    meta[attr_name] = attr_val
 
-    def restore(self, restore_path):
+            file = open(os.path.join(save_path, self._npy_meta_filename), 'wb')
+            file.write(pickle.dumps({
+                'attrs': meta, 'array_attrs': array_attrs}))
+            file.close()
+
+        else:
+            raise ValueError('Unsupported file_format: %s.' % file_format)
+
+    def restore(self, restore_path, mmap_mode='r', attrs=None, index=None):
         '''Restores data from a previously saved FixedPoints object.
 
         Args:
             restore_path: A string containing the path at which to find a
             previously saved FixedPoints object (including directory, filename,
-            and extension).
+            and extension). Both the pickle and 'npy' formats of save() are
+            supported; the format is detected from the path.
+
+            The following apply to the 'npy' format only:
+
+            mmap_mode (optional): mmap_mode passed to np.load. With 'r'
+            (read-only) or 'c' (copy-on-write), arrays are memory mapped, so
+            nothing is read from disk until it is accessed. None reads arrays
+            into memory. Default: 'r'.
+
+            attrs (optional): List of the per-fixed-point data attributes
+            (see _data_attrs) to restore, e.g., ['xstar', 'is_stable']. All
+            others are set to None without being read. Default: None, which
+            restores all of them.
+
+            index (optional): Index (int, slice, list, or bool array) of the
+            fixed points to restore. Only those entries are read from disk.
+            Default: None, which restores all fixed points.
 
         Returns:
             None.
         '''
         if self.verbose:
             print('Restoring FixedPoints object.')
-        file = open(restore_path,'rb')
-        restore_data = file.read()
-        file.close()
-        self.__dict__ = pickle.loads(restore_data)
+
+        if os.path.isdir(restore_path):
+            self._restore_npy(restore_path, mmap_mode, attrs, index)
+        else:
+            file = open(restore_path,'rb')
+            restore_data = file.read()
+            file.close()
+            self.__dict__ = pickle.loads(restore_data)
 
         # Hacks to bridge between different versions of saved data
         if not hasattr(self, 'do_alloc_nan'):
@@ -676,6 +951,47 @@ class FixedPoints(object):
 
         self.assert_valid_shapes()
 
+    def _restore_npy(self, restore_path, mmap_mode='r', attrs=None, index=None):
+        '''Restores data saved by save(..., file_format='npy'). See
+        restore() for a description of the arguments.
+        '''
+
+        file = open(os.path.join(restore_path, self._npy_meta_filename), 'rb')
+        meta = pickle.loads(file.read())
+        file.close()
+
+        self.__dict__ = meta['attrs']
+
+        if isinstance(index, int):
+            # Force the indexing that follows to preserve numpy array ndim
+            index = list(range(index, index+1))
+
+        for attr_name in meta['array_attrs']:
+
+            # Other per-fixed-point arrays (e.g., dFdu) are indexed with the
+            # data attributes.
+            is_data_attr = attr_name in self._data_attrs
+            is_per_fp = is_data_attr or (self.n is not None and
+                np.load(os.path.join(restore_path, attr_name + '.npy'),
+                    mmap_mode='r').shape[:1] == (self.n,))
+
+            if is_data_attr and attrs is not None and attr_name not in attrs:
+                setattr(self, attr_name, None)
+                continue
+
+            attr_val = np.load(
+                os.path.join(restore_path, attr_name + '.npy'),
+                mmap_mode=mmap_mode, allow_pickle=False)
+
+            if is_per_fp and index is not None:
+                # Reads only the requested entries into memory
+                attr_val = attr_val[index]
+
+            setattr(self, attr_name, attr_val)
+
+        if index is not None and self.n is not None:
+            self.n = np.arange(self.n)[index].size
+
     def print_summary(self):
         '''Prints a summary of the fixed points.
 
@@ -864,3 +1180,146 @@ class FixedPoints(object):
             'dtype': self.dtype,
             'tol_unique': self.tol_unique
             }
+
+class FixedPointsBuilder(object):
+    '''
+    Accumulates FixedPoints objects, e.g., from many calls to
+    FixedPointFinder.find_fixed_points across input conditions, and joins
+    them into a single FixedPoints object.
+
+    FixedPoints.update reallocates every data array on each call, so
+    collecting fixed points one batch at a time is quadratic in the total
+    number of fixed points. Here, each data attribute is kept in a buffer
+    whose capacity doubles whenever it is exceeded, so appends run in
+    amortized constant time per fixed point.
+
+    Usage:
+        builder = FixedPointsBuilder()
+        for inputs in input_conditions:
+            unique_fps, _ = fpf.find_fixed_points(initial_states, inputs)
+            builder.append(unique_fps)
+        fps = builder.freeze()
+    '''
+
+    def __init__(self, capacity=16):
+        '''
+        Args:
+            capacity (optional): number of fixed points to allocate space for
+            before the first reallocation. Default: 16.
+        '''
+        self.capacity = capacity
+        self.n = 0
+
+        # Set from the first appended FixedPoints object.
+        self._nonspecific_kwargs = None
+
+        # Maps each of FixedPoints._data_attrs to its buffer, whose first
+        # self.n rows are valid, or to None if that attribute is missing from
+        # any of the appended FixedPoints objects.
+        self._buffers = None
+
+    def __len__(self):
+        return self.n
+
+    def append(self, fps):
+        ''' Appends the entries of a FixedPoints object. The data are copied,
+        so fps may be modified or discarded afterward.
+
+        Args:
+            fps: a FixedPoints object.
+
+        Returns:
+            None.
+
+        Raises:
+            AssertionError if the non-fixed-point specific attributes of fps
+            do not match those of the previously appended FixedPoints objects.
+        '''
+
+        if fps.n is None or fps.n == 0:
+            return
+
+        if self._buffers is None:
+            self._init_buffers(fps)
+        else:
+            for attr_name, item in self._nonspecific_kwargs.items():
+                assert getattr(fps, attr_name) == item,\
+                    ('Cannot concatenate FixedPoints because of mismatched %s '
+                     '(%s is not %s)' %
+                     (attr_name, str(item), str(getattr(fps, attr_name))))
+
+        n_new = self.n + fps.n
+        if n_new > self.capacity:
+            self._grow(n_new)
+
+        for attr_name, buffer in self._buffers.items():
+            if buffer is None:
+                continue
+
+            data = getattr(fps, attr_name, None)
+            if data is None or data.shape[1:] != buffer.shape[1:]:
+                # As in FixedPoints.concatenate, an attribute that is missing
+                # from any of the FixedPoints objects is dropped.
+                self._buffers[attr_name] = None
+            else:
+                dtype = np.result_type(buffer.dtype, data.dtype)
+                if dtype != buffer.dtype:
+                    # E.g., is_stable is NaN-filled (float) in FixedPoints
+                    # whose Jacobians were never decomposed, bool otherwise.
+                    buffer = buffer.astype(dtype)
+                    self._buffers[attr_name] = buffer
+                buffer[self.n:n_new] = data
+
+        self.n = n_new
+
+    def freeze(self):
+        ''' Returns a FixedPoints object containing all appended entries.
+
+        The builder can continue to be appended to afterward; the returned
+        object does not share memory with it.
+
+        Returns:
+            A FixedPoints object.
+        '''
+
+        if self._buffers is None:
+            return FixedPoints()
+
+        kwargs = dict(self._nonspecific_kwargs)
+        for attr_name, buffer in self._buffers.items():
+            if buffer is not None:
+                kwargs[attr_name] = buffer[:self.n].copy()
+
+        return FixedPoints(**kwargs)
+
+    def _init_buffers(self, fps):
+
+        self._nonspecific_kwargs = {
+            attr_name: getattr(fps, attr_name)
+            for attr_name in FixedPoints._nonspecific_attrs
+            if attr_name != 'do_alloc_nan'}
+
+        self.capacity = max(self.capacity, fps.n)
+        self._buffers = {}
+        for attr_name in FixedPoints._data_attrs:
+            data = getattr(fps, attr_name, None)
+            if data is None:
+                self._buffers[attr_name] = None
+            else:
+                self._buffers[attr_name] = np.empty(
+                    (self.capacity,) + data.shape[1:], dtype=data.dtype)
+
+    def _grow(self, n_min):
+
+        capacity = max(self.capacity, 1)
+        while capacity < n_min:
+            capacity *= 2
+
+        for attr_name, buffer in self._buffers.items():
+            if buffer is not None:
+                new_buffer = np.empty(
+                    (capacity,) + buffer.shape[1:], dtype=buffer.dtype)
+                new_buffer[:self.n] = buffer[:self.n]
+                self._buffers[attr_name] = new_buffer
+
+        self.capacity = capacity
@@ -31,17 +31,23 @@ class FlipFlopData(object):
 			pulse at each timestep. Non-zero inputs are set to either +1 or -1,
 			with equal probability.
 
+			random_seed: Seed for the random number generators (numpy, and
+			torch for backend='torch'). Default: 0.
+
 		Returns:
 			None.
 
 		'''
 
+		self.random_seed = random_seed
 		self.rng = npr.RandomState(random_seed)
+		self.torch_rng = None # Created on first use of backend='torch'
 		self.n_time = n_time
 		self.n_bits = n_bits
 		self.p = p
 
-	def generate_data(self, n_trials, dtype=np.float32):
+	def generate_data(self, n_trials, dtype=np.float32,
+		backend='numpy', device=None):
 		''' Generates trial data for training, testing, or validating a FlipFlop
 		memory device.
 
@@ -51,6 +57,14 @@ class FlipFlopData(object):
 
 			dtype: Numpy datatype for the generated data. Default: np.float32.
 
+			backend (optional): 'numpy', or 'torch' to generate the data as
+			torch tensors directly on device, using a torch random number
+			generator (so the trials differ from those of the numpy backend).
+			Default: 'numpy'.
+
+			device (optional): torch device for backend='torch'. Default: None
+			(CPU).
+
 		Returns:
 			Dict containing keys:
 				'inputs': A (n_trials, n_time, n_bits) Numpy array containing
@@ -63,6 +77,11 @@ class FlipFlopData(object):
 				will satisfy: F(inputs[i]) = targets[i], for all trials i.
 		'''
 
+		if backend == 'torch':
+			return self._generate_data_torch(n_trials, device)
+		elif backend != 'numpy':
+			raise ValueError('Unsupported backend: %s.' % backend)
+
 		n_time = self.n_time
 		n_bits = self.n_bits
 		p = self.p
@@ -81,29 +100,74 @@ class FlipFlopData(object):
 		# Apply random signs to input pulses
 		inputs = np.multiply(unsigned_inputs, random_signs)
 
-		# Allocate targets
-		targets = np.zeros([n_trials, n_time, n_bits])
-
-		# Update inputs (zero-out random start holds) & compute targets
-		for trial_idx in range(n_trials):
-			for bit_idx in range(n_bits):
-				input_ = np.squeeze(inputs[trial_idx, :, bit_idx])
-				t_flip = np.where(input_ != 0)
-				for flip_idx in range(np.size(t_flip)):
-					# Get the time of the next flip
-					t_flip_i = t_flip[0][flip_idx]
-
-					'''Set the targets to the sign of the flip for the
-					remainder of the trial. Future flips will overwrite future
-					targets'''
-					targets[trial_idx, t_flip_i:, bit_idx] = \
-						inputs[trial_idx, t_flip_i, bit_idx]
+		targets = self._hold_last_pulse(inputs)
 
 		return {
 			'inputs': inputs.astype(np.float32),
 			'targets': targets.astype(np.float32)
 			}
 
+	def _generate_data_torch(self, n_trials, device=None):
+		''' As generate_data, with backend='torch'. '''
+
+		import torch
+
+		if self.torch_rng is None or \
+			self.torch_rng.device != torch.device(device or 'cpu'):
+			self.torch_rng = torch.Generator(device=device)
+			self.torch_rng.manual_seed(self.random_seed)
+
+		shape = (n_trials, self.n_time, self.n_bits)
+
+		# Random input pulses, every trial starting with a pulse at time 0
+		unsigned_inputs = torch.bernoulli(
+			torch.full(shape, self.p, device=device), generator=self.torch_rng)
+		unsigned_inputs[:, 0, :] = 1
+
+		# Random signs {-1, +1}
+		random_signs = 2*torch.bernoulli(
+			torch.full(shape, 0.5, device=device),
+			generator=self.torch_rng) - 1
+
+		inputs = unsigned_inputs * random_signs
+		targets = self._hold_last_pulse(inputs)
+
+		return {
+			'inputs': inputs,
+			'targets': targets
+			}
+
+	@staticmethod
+	def _hold_last_pulse(inputs):
+		''' Computes the flip flop targets, i.e., for each trial and bit, the
+		sign of the most recent input pulse at or before each timestep.
+
+		Rather than writing targets[trial, t:, bit] once per pulse, this
+		forward-fills the time index of the last pulse, using a cumulative
+		max over time, and gathers the inputs at those indices.
+
+		Args:
+			inputs: A (n_trials, n_time, n_bits) Numpy array or torch tensor
+			of input pulses, with a pulse at time 0 in every trial and bit.
+
+		Returns:
+			A (n_trials, n_time, n_bits) array (or tensor) of targets.
+		'''
+
+		n_time = inputs.shape[1]
+
+		if isinstance(inputs, np.ndarray):
+			t_idx = np.arange(n_time)[np.newaxis, :, np.newaxis]
+			t_last = np.maximum.accumulate(
+				np.where(inputs != 0, t_idx, 0), axis=1)
+			return np.take_along_axis(inputs, t_last, axis=1)
+		else:
+			import torch
+			t_idx = torch.arange(n_time, device=inputs.device)[None, :, None]
+			t_last = torch.cummax(
+				torch.where(inputs != 0, t_idx, 0), dim=1).values
+			return torch.gather(inputs, 1, t_last)
+
 	@classmethod
 	def plot_trials(cls, data, pred, start_time=0, stop_time=None, 
 		n_trials_plot=1,
@@ -23,6 +23,8 @@ from FixedPointFinderTorch import FixedPointFinderTorch as FixedPointFinder
 from FixedPoints import FixedPoints
 
 from FlipFlopData import FlipFlopData
+from torch_utils import TrainingBatches
+from multiscale_engine import cached_params
 
 class FlipFlopDataset(Dataset):
 
@@ -140,36 +142,50 @@ class multiscale_RNN_cell(nn.Module):
 	def r_t(self):
 		return self.sigmoid(self.v_t)
 
-	def forward(self, x):        
-		if self.v_t.dim() == 3:           
-			self.v_t = self.v_t[0]
-		self.v_t = torch.transpose(self.v_t, 0, 1)
-		x = torch.transpose(x, 0, 1)
+	def get_params(self):
 		### Constraints###
 		e = self.softplus(self.e)
 		e_p = self.softplus(self.e_p)
 		K = e * self.softplus(self.W)
 		P_z = e_p * self.softplus(self.P)
 
+		### STP model ###
+		z_x = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_x)
+		z_u = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_u)
+		Ucap = 0.9 * self.sigmoid(self.c_U)
+
+		# mask p with second half of the neuron not receiving input
+		input_mask = torch.ones_like(self.P)
+		input_mask[self.hidden_size//2:,:] = 0
+		P = self.P * input_mask
+		return {'K': K, 'P_z': P_z, 'P': P, 'z_x': z_x, 'z_u': z_u, 'Ucap': Ucap}
+
+	def forward(self, x, params=None):
+		# params holds the constrained weights from get_params(); pass them in to avoid
+		# rebuilding them on every time step
+		if params is None:
+			params = self.get_params()
+		K, P_z, P = params['K'], params['P_z'], params['P']
+		if self.v_t.dim() == 3:           
+			self.v_t = self.v_t[0]
+		self.v_t = torch.transpose(self.v_t, 0, 1)
+		x = torch.transpose(x, 0, 1)
+
 		### STP model ###
 		device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 		# Short term Depression 
-		self.z_x = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_x)
+		self.z_x = params['z_x']
 		self.X = self.z_x + torch.mul((1 - self.z_x), self.X) - self.delta_t * self.U * self.X * self.r_t
 
 		# Short term Facilitation 
-		self.z_u = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_u)    
-		self.Ucap = 0.9 * self.sigmoid(self.c_U)
+		self.z_u = params['z_u']
+		self.Ucap = params['Ucap']
 		self.U = self.Ucap * self.z_u + torch.mul((1 - self.z_u), self.U) + self.delta_t * self.Ucap * (1 - self.U) * self.r_t
 		self.Ucapclone = self.Ucap.clone().detach()
 		self.U = torch.clamp(self.U, min=self.Ucapclone.repeat(1, x.size(1)).to(device), max=torch.ones_like(self.Ucapclone.repeat(1, x.size(1)).to(device)))
 
 		### Update Equations ###
-		input_mask = torch.ones_like(self.P)
-		input_mask[self.hidden_size//2:,:] = 0
-		P = self.P * input_mask
 		self.z_t = self.z_low + (self.z_high - self.z_low)*self.sigmoid(torch.matmul(K , self.r_t) + torch.matmul(P_z, x) + self.b_z)
-		# mask p with second half of the neuron not receiving input
 
 		self.v_t = (1 - self.z_t) * self.v_t + self.dt * (torch.matmul(self.W, self.U*self.X*self.r_t) + torch.matmul(P, x) + self.b_v)
 		self.v_t = torch.transpose(self.v_t, 0, 1)        
@@ -183,23 +199,31 @@ class multiscale_RNN_batch(nn.Module):
 		self.hidden_size = hidden_size
 
 	def forward(self, x, hidden):
-		# Initialize the output tensor to store the outputs for each time step
 		# x is expected to be of shape (batch_size, seq_len, input_size) if batch_first is True
-		outputs = torch.zeros(x.size(0), x.size(1), self.hidden_size)
+		# hidden is of shape (1, batch_size, hidden_size) or (batch_size, hidden_size)
+		if not self.batch_first:
+			x = torch.transpose(x, 0, 1)
+		if hidden.dim() == 3:
+			hidden = hidden[0]
 		self.rnncell.X = torch.ones(self.hidden_size, x.size(0), dtype=torch.float32).to(self.device)
 		self.rnncell.U = (self.rnncell.Ucapclone.repeat(1, x.size(0))).to(self.device)
-		self.rnncell.v_t = torch.zeros(1, x.size(0), self.hidden_size).to(self.device) 
 		self.rnncell.v_t = hidden
-		if self.batch_first:
-			# Process each time step across all batch elements
-			for n in range(x.size(1)):
-				x_slice = x[:, n, :]  # Get the nth time step for all elements in the batch
-				self.rnncell(x_slice)
-				#print('outputs', outputs.shape)
-				outputs[:, n, :] = self.rnncell.v_t[0]
-		# collect all sequences
-			
-		return outputs.to(self.device), self.rnncell.v_t[0].to(self.device)
+
+		# Collect the state at each time step and stack them on x's device, rather
+		# than writing into a CPU buffer that then has to be copied across
+		# the constrained weights do not change within a sequence, so build them once
+		params = cached_params(self.rnncell)
+		outputs = []
+		for n in range(x.size(1)):
+			x_slice = x[:, n, :]  # Get the nth time step for all elements in the batch
+			self.rnncell(x_slice, params)
+			outputs.append(self.rnncell.v_t)
+		outputs = torch.stack(outputs, 1)
+
+		if not self.batch_first:
+			outputs = torch.transpose(outputs, 0, 1)
+
+		return outputs, self.rnncell.v_t
 	
 	@classmethod
 	def _get_device(cls, verbose=False):
@@ -309,6 +333,7 @@ class FlipFlop(nn.Module):
 			plot_every=10, 
 			max_norm=1.,
 			regenerate_data_every_n_epochs=1,
+			n_data_workers=None,  # if not None, stream fresh training batches from this many worker processes
 			relative_error_threshold=1e-5):  # new argument for relative error threshold
 
 		epoch = 0
@@ -336,19 +361,22 @@ class FlipFlop(nn.Module):
 		grad_norms = []
 		fig = None
 		
+		# With n_data_workers, fresh training batches are generated in the background
+		training_batches = TrainingBatches(train_data_gen, batch_size,
+			lambda data: FlipFlopDataset(data, device=self.device),
+			regenerate_every_n_epochs=regenerate_data_every_n_epochs,
+			n_workers=n_data_workers, device=self.device)
+
 		while True:
 			t_start = time.time()
 
 
-			# Regenerate data at the beginning or at specified epochs
+			dataloader = training_batches.epoch(epoch)
+
+			# Regenerate validation data at the beginning or at specified epochs
 			if epoch % regenerate_data_every_n_epochs == 0:
-				train_data = train_data_gen.generate_data(n_trials=4*batch_size)
 				valid_data = valid_data_gen.generate_data(n_trials=batch_size)
-				train_dataset = FlipFlopDataset(train_data, device=self.device)
 				valid_dataset = FlipFlopDataset(valid_data, device=self.device)
-			dataloader = DataLoader(train_dataset, 
-									shuffle=True,
-									batch_size=batch_size)
 
 			if epoch % plot_every == 0:
 				valid_pred = self._forward_np(valid_dataset[0:1])
@@ -23,6 +23,7 @@ from FixedPointFinderTorch import FixedPointFinderTorch as FixedPointFinder
 from FixedPoints import FixedPoints
 
 from FlipFlopData import FlipFlopData
+from torch_utils import TrainingBatches
 
 class FlipFlopDataset(Dataset):
 
@@ -131,21 +132,27 @@ class multiscale_RNN_batch(nn.Module):
 		self.hidden_size = hidden_size
 
 	def forward(self, x, hidden):
-		# Initialize the output tensor to store the outputs for each time step
 		# x is expected to be of shape (batch_size, seq_len, input_size) if batch_first is True
-		outputs = torch.zeros(x.size(0), x.size(1), self.hidden_size)
-
+		# hidden is of shape (1, batch_size, hidden_size) or (batch_size, hidden_size)
+		if not self.batch_first:
+			x = torch.transpose(x, 0, 1)
+		if hidden.dim() == 3:
+			hidden = hidden[0]
 		self.rnncell.v_t = hidden
-		if self.batch_first:
-			# Process each time step across all batch elements
-			for n in range(x.size(1)):
-				x_slice = x[:, n, :]  # Get the nth time step for all elements in the batch
-				self.rnncell(x_slice)
-				#print('outputs', outputs.shape)
-				outputs[:, n, :] = self.rnncell.v_t
-		# collect all sequences
-			
-		return outputs.to(self.device), self.rnncell.v_t.to(self.device)
+
+		# Collect the state at each time step and stack them on x's device, rather
+		# than writing into a CPU buffer that then has to be copied across
+		outputs = []
+		for n in range(x.size(1)):
+			x_slice = x[:, n, :]  # Get the nth time step for all elements in the batch
+			self.rnncell(x_slice)
+			outputs.append(self.rnncell.v_t)
+		outputs = torch.stack(outputs, 1)
+
+		if not self.batch_first:
+			outputs = torch.transpose(outputs, 0, 1)
+
+		return outputs, self.rnncell.v_t
 	
 	@classmethod
 	def _get_device(cls, verbose=False):
@@ -255,6 +262,7 @@ class FlipFlop(nn.Module):
 			plot_every=10, 
 			max_norm=1.,
 			regenerate_data_every_n_epochs=1,
+			n_data_workers=None,  # if not None, stream fresh training batches from this many worker processes
 			relative_error_threshold=1e-5):  # new argument for relative error threshold
 
 		epoch = 0
@@ -282,19 +290,22 @@ class FlipFlop(nn.Module):
 		grad_norms = []
 		fig = None
 		
+		# With n_data_workers, fresh training batches are generated in the background
+		training_batches = TrainingBatches(train_data_gen, batch_size,
+			lambda data: FlipFlopDataset(data, device=self.device),
+			regenerate_every_n_epochs=regenerate_data_every_n_epochs,
+			n_workers=n_data_workers, device=self.device)
+
 		while True:
 			t_start = time.time()
 
 
-			# Regenerate data at the beginning or at specified epochs
+			dataloader = training_batches.epoch(epoch)
+
+			# Regenerate validation data at the beginning or at specified epochs
 			if epoch % regenerate_data_every_n_epochs == 0:
-				train_data = train_data_gen.generate_data(n_trials=4*batch_size)
 				valid_data = valid_data_gen.generate_data(n_trials=batch_size)
-				train_dataset = FlipFlopDataset(train_data, device=self.device)
 				valid_dataset = FlipFlopDataset(valid_data, device=self.device)
-			dataloader = DataLoader(train_dataset, 
-									shuffle=True,
-									batch_size=batch_size)
 
 			if epoch % plot_every == 0:
 				valid_pred = self._forward_np(valid_dataset[0:1])
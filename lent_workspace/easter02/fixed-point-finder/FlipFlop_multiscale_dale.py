@@ -23,6 +23,8 @@ from FixedPointFinderTorch import FixedPointFinderTorch as FixedPointFinder
 from FixedPoints import FixedPoints
 
 from FlipFlopData import FlipFlopData
+from torch_utils import TrainingBatches
+from multiscale_engine import multiscale_step, multiscale_scan, cached_params
 
 class FlipFlopDataset(Dataset):
 
@@ -100,26 +102,24 @@ class multiscale_RNN_cell(nn.Module):
         # init b_z to be log 1/99
         nn.init.constant_(self.b_z, torch.log(torch.tensor(1/99)))
 
-    def forward(self, x):        
-        if self.r_t.dim() == 3:           
-            self.r_t = self.r_t[0]
-        self.r_t = torch.transpose(self.r_t, 0, 1)
-        x = torch.transpose(x, 0, 1)
-        self.z_t = self.z_low + (self.z_high - self.z_low)*self.Sigmoid(self.b_z)
-
+    def get_params(self):
+        ''' Returns the effective parameters used by multiscale_step/multiscale_scan. '''
         # input mask
         # we want this to be orthogonal to the E/I split, so zero out half of excitatory neurons and half of inhibitory neurons
         input_mask = torch.ones_like(self.P)
         #input_mask[self.hidden_size//4:self.hidden_size//2,:] = 0
         #input_mask[3*self.hidden_size//4:,:] = 0
-        P = self.P * input_mask
         # constraint W to satisfy Dale's law: first half of rows are positive, second half are negative
         W = torch.zeros_like(self.W)
         W[:self.hidden_size//2,:] = self.relu(self.W[:self.hidden_size//2,:])
         W[self.hidden_size//2:,:] = -self.relu(self.W[self.hidden_size//2:,:])
+        return {'W': W, 'P': self.P * input_mask, 'b_v': self.b_v,
+            'b_z': self.b_z, 'z_low': self.z_low, 'z_high': self.z_high}
 
-        self.r_t = (1 - self.z_t) * self.r_t + self.z_t * self.Sigmoid(torch.matmul(W, self.r_t) + torch.matmul(P, x) + self.b_v)
-        self.r_t = torch.transpose(self.r_t, 0, 1)                                 
+    def forward(self, x):
+        if self.r_t.dim() == 3:
+            self.r_t = self.r_t[0]
+        self.r_t = multiscale_step(self.get_params(), self.r_t, x)
 
 class multiscale_RNN_batch(nn.Module):
 	def __init__(self, input_size, hidden_size, batch_first=True):
@@ -130,25 +130,30 @@ class multiscale_RNN_batch(nn.Module):
 		self.hidden_size = hidden_size
 
 	def forward(self, x, hidden):
-		# Initialize the output tensor to store the outputs for each time step
 		# x is expected to be of shape (batch_size, seq_len, input_size) if batch_first is True
-		outputs = torch.zeros(x.size(0), x.size(1), self.hidden_size)
-		
-		self.rnncell.r_t = hidden
+		# hidden is of shape (1, batch_size, hidden_size) or (batch_size, hidden_size)
+		cell = self.rnncell
+		if not self.batch_first:
+			x = torch.transpose(x, 0, 1)
+		if hidden.dim() == 3:
+			hidden = hidden[0]
 		output_mask = torch.ones_like(hidden)
 		#output_mask = torch.zeros_like(hidden)
 		#output_mask[self.hidden_size//4:self.hidden_size//2,:] = 1
 
-		if self.batch_first:
-			# Process each time step across all batch elements
-			for n in range(x.size(1)):
-				x_slice = x[:, n, :]  # Get the nth time step for all elements in the batch
-				self.rnncell(x_slice)
-				#print('outputs', outputs.shape)
-				outputs[:, n, :] = self.rnncell.r_t * output_mask
-		# collect all sequences
-			
-		return outputs.to(self.device), self.rnncell.r_t.to(self.device)
+		# Run the recurrence over the whole sequence as a single scan
+		outputs, cell.r_t = multiscale_scan(cached_params(cell), hidden, x)
+		outputs = outputs * output_mask.unsqueeze(1)
+
+		if not self.batch_first:
+			outputs = torch.transpose(outputs, 0, 1)
+
+		return outputs, cell.r_t
+
+	def functional_step(self):
+		''' Returns (step, params), with step(params, r_bxd, x_bxd) the stateless
+		form of rnncell.forward, as used by the fixed point finder. '''
+		return multiscale_step, cached_params(self.rnncell)
 	
 	@classmethod
 	def _get_device(cls, verbose=False):
@@ -258,6 +263,7 @@ class FlipFlop(nn.Module):
 			plot_every=10, 
 			max_norm=1.,
 			regenerate_data_every_n_epochs=1,
+			n_data_workers=None,  # if not None, stream fresh training batches from this many worker processes
 			relative_error_threshold=1e-5):  # new argument for relative error threshold
 
 		epoch = 0
@@ -285,19 +291,22 @@ class FlipFlop(nn.Module):
 		grad_norms = []
 		fig = None
 		
+		# With n_data_workers, fresh training batches are generated in the background
+		training_batches = TrainingBatches(train_data_gen, batch_size,
+			lambda data: FlipFlopDataset(data, device=self.device),
+			regenerate_every_n_epochs=regenerate_data_every_n_epochs,
+			n_workers=n_data_workers, device=self.device)
+
 		while True:
 			t_start = time.time()
 
 
-			# Regenerate data at the beginning or at specified epochs
+			dataloader = training_batches.epoch(epoch)
+
+			# Regenerate validation data at the beginning or at specified epochs
 			if epoch % regenerate_data_every_n_epochs == 0:
-				train_data = train_data_gen.generate_data(n_trials=4*batch_size)
 				valid_data = valid_data_gen.generate_data(n_trials=batch_size)
-				train_dataset = FlipFlopDataset(train_data, device=self.device)
 				valid_dataset = FlipFlopDataset(valid_data, device=self.device)
-			dataloader = DataLoader(train_dataset, 
-									shuffle=True,
-									batch_size=batch_size)
 
 			if epoch % plot_every == 0:
 				valid_pred = self._forward_np(valid_dataset[0:1])
@@ -86,55 +86,89 @@ class FlipFlopData(object):
         # Apply random signs to input pulses
         inputs = np.multiply(unsigned_inputs, random_signs)
 
-        # Allocate targets
-        targets = np.zeros([n_trials, n_time, n_bits])
-
-        ### Compute targets ###
-        # Target: if two input pulses happen within interval t_window,
-        # output a pulse with the same sign as the second input pulse.
-        # Update inputs (zero-out random start holds) & compute targets
-        for trial_idx in range(n_trials):
-            for bit_idx in range(n_bits):
-
-                input_ = np.squeeze(inputs[trial_idx, :, bit_idx])
-                no_spikes = 0
-            
-                for t in range(n_time):
-                    if targets[trial_idx, t, bit_idx] != 0:
-                        no_spikes +=1
-                    if input_[t] > 0:
-                        # Check the next 10 steps for another signal
-                        window_end = min(t + int(self.t_window), n_time)
-                        if np.any(input_[t+1:window_end] > 0):
-                            # find the next non-zero pulse
-                            for t_next in range(t+1, window_end):
-                                if input_[t_next] > 0:
-                                    targets[trial_idx, t_next:, bit_idx] = input_[t_next]
-                                    no_spikes = 0
-                        
-                    if input_[t] < 0:
-                        # Check the next 10 steps for another signal
-                        window_end = min(t + int(self.t_window), n_time)
-                        if np.any(input_[t+1:window_end] < 0):
-                            # find the next non-zero pulse
-                            for t_next in range(t+1, window_end):
-                                if input_[t_next] < 0:
-                                    targets[trial_idx, t_next:, bit_idx] = input_[t_next]
-                                    no_spikes = 0
-                        
-                        # If no signal is found within the next 10 steps, set output to zero
-                        #if no_signal_after_window:
-                            #targets[trial_idx, t:, bit_idx] = 0
-
-                    # we don't want to count no_spike if target is not active
-                    if no_spikes >= self.t_relax+1:
-                        targets[trial_idx, t:, bit_idx] = 0
-                        no_spikes = 0
+        targets = self._compute_targets(inputs)
+
         return {
             'inputs': inputs.astype(np.float32),
             'targets': targets.astype(np.float32)
         }
 
+    def _compute_targets(self, inputs):
+        ''' Computes the targets for all trials and bits at once.
+
+        Target: if two input pulses of the same sign happen within interval
+        t_window, output the sign of the second pulse from that pulse
+        onward, until a later pair does the same. The output is reset to
+        zero once it has been active for t_relax+1 timesteps without a new
+        pair being detected. Pairs are counted from the time of their first
+        pulse.
+
+        The pairs and the held outputs are found with cumulative max/min
+        operations over time. Only the t_relax counter, whose resets depend
+        on its own earlier resets, is advanced with a loop over time, which
+        is vectorized across trials and bits.
+
+        Args:
+            inputs: A (n_trials, n_time, n_bits) Numpy array of input pulses.
+
+        Returns:
+            A (n_trials, n_time, n_bits) Numpy array of targets.
+        '''
+
+        n_trials, n_time, n_bits = inputs.shape
+        t_idx = np.broadcast_to(
+            np.arange(n_time)[np.newaxis, :, np.newaxis], inputs.shape)
+
+        # Time of the previous and next pulse of the same sign, excluding the
+        # current timestep (-1 and n_time where there is none).
+        prev_same = np.full(inputs.shape, -1)
+        next_same = np.full(inputs.shape, n_time)
+        for sign in [1, -1]:
+            is_pulse = inputs == sign
+            t_pulse = np.where(is_pulse, t_idx, -1)
+            t_prev = np.maximum.accumulate(t_pulse, axis=1)
+            prev_same[:, 1:][is_pulse[:, 1:]] = t_prev[:, :-1][is_pulse[:, 1:]]
+
+            t_pulse = np.where(is_pulse, t_idx, n_time)
+            t_next = np.minimum.accumulate(t_pulse[:, ::-1], axis=1)[:, ::-1]
+            next_same[:, :-1][is_pulse[:, :-1]] = \
+                t_next[:, 1:][is_pulse[:, :-1]]
+
+        # A pulse at t is paired with the next pulse of the same sign if that
+        # falls within the window, i.e., before min(t + t_window, n_time). The
+        # pair takes effect from its second pulse, t_second, and is detected
+        # (resetting the relaxation counter) at its first, t_first.
+        window = int(self.t_window)
+        is_second = (prev_same >= 0) & (t_idx - prev_same < window)
+        t_first = np.where(is_second, prev_same, -1)
+        is_detected = (next_same < n_time) & (next_same - t_idx < window)
+
+        # The most recently detected pair among those in effect at each time.
+        t_pair = np.maximum.accumulate(t_first, axis=1)
+
+        # Times at which the output relaxes to zero. A relaxation overrides
+        # all pairs detected at or before it.
+        t_zero = np.full((n_trials, n_bits), -1)
+        is_zeroed = np.zeros(inputs.shape, dtype=bool)
+        no_spikes = np.zeros((n_trials, n_bits), dtype=int)
+        for t in range(n_time):
+            is_active = t_pair[:, t] > t_zero
+            no_spikes += is_active
+            no_spikes[is_detected[:, t]] = 0
+
+            is_zeroed[:, t] = no_spikes >= self.t_relax + 1
+            t_zero[is_zeroed[:, t]] = t
+            no_spikes[is_zeroed[:, t]] = 0
+
+        t_zero = np.maximum.accumulate(
+            np.where(is_zeroed, t_idx, -1), axis=1)
+        is_active = t_pair > t_zero
+
+        targets = np.take_along_axis(inputs, np.maximum(t_pair, 0), axis=1)
+        targets[~is_active] = 0
+
+        return targets
+
     @classmethod
     def plot_trials(cls, data, pred, start_time=0, stop_time=None,
                     n_trials_plot=1,
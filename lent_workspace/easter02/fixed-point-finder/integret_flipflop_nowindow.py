@@ -86,35 +86,41 @@ class FlipFlopData(object):
         # Apply random signs to input pulses
         inputs = np.multiply(unsigned_inputs, random_signs)
 
-        # Allocate targets
-        targets = np.zeros([n_trials, n_time, n_bits])
-
-        ### Compute targets ###
-        # Target: if two input pulses happen within interval t_window,
-        # output a pulse with the same sign as the second input pulse.
-        # Update inputs (zero-out random start holds) & compute targets
-        for trial_idx in range(n_trials):
-            for bit_idx in range(n_bits):
-
-                input_ = np.squeeze(inputs[trial_idx, :, bit_idx])
-                no_spikes = 0
-            
-                for t in range(n_time):
-                    if targets[trial_idx, t, bit_idx] != 0:
-                        no_spikes +=1
-                    if input_[t] != 0:
-                        targets[trial_idx, t:, bit_idx] = input_[t]
-                        no_spikes = 0
-
-                    # we don't want to count no_spike if target is not active
-                    if no_spikes >= self.t_relax+1:
-                        targets[trial_idx, t:, bit_idx] = 0
-                        no_spikes = 0
+        targets = self._compute_targets(inputs)
+
         return {
             'inputs': inputs.astype(np.float32),
             'targets': targets.astype(np.float32)
         }
 
+    def _compute_targets(self, inputs):
+        ''' Computes the targets for all trials and bits at once.
+
+        Target: the sign of the most recent input pulse, reset to zero once
+        t_relax+1 timesteps have passed since that pulse. Every pulse resets
+        the relaxation counter, so the output at each timestep depends only
+        on the time since the last pulse, which is found with a cumulative
+        max over time.
+
+        Args:
+            inputs: A (n_trials, n_time, n_bits) Numpy array of input pulses,
+            with a pulse at time 0 in every trial and bit.
+
+        Returns:
+            A (n_trials, n_time, n_bits) Numpy array of targets.
+        '''
+
+        n_time = inputs.shape[1]
+        t_idx = np.arange(n_time)[np.newaxis, :, np.newaxis]
+
+        t_last = np.maximum.accumulate(
+            np.where(inputs != 0, t_idx, 0), axis=1)
+
+        targets = np.take_along_axis(inputs, t_last, axis=1)
+        targets[t_idx - t_last > self.t_relax] = 0
+
+        return targets
+
     @classmethod
     def plot_trials(cls, data, pred, start_time=0, stop_time=None,
                     n_trials_plot=1,
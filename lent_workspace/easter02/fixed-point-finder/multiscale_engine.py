@@ -0,0 +1,518 @@
+'''
+multiscale_engine.py
+Written for Python 3.8.17 and Pytorch 2.0.1
+
+Functional forms of the multiscale_RNN_cell family used by the FlipFlop_*.py
+models. Each cell family exposes a pair of pure functions,
+
+	<family>_step(params, state, x) -> new_state
+	<family>_scan(params, state0, xs) -> (states, final_state)
+
+which read nothing from and write nothing to a module. params is the dict
+returned by multiscale_RNN_cell.get_params(), i.e. the effective (masked,
+sign-constrained) parameters, so the same model can be run on several
+sequences at once, differentiated with torch.func.jacrev/vmap, or traced,
+without copying the cell. The nn.Modules in FlipFlop_*.py are thin wrappers
+around these functions.
+
+The steps are the reference definition of each cell. The scans hand the
+whole [B, T, D] input to a sequence-level kernel instead of dispatching the
+step once per timestep from Python:
+
+	1. The input projections of all T timesteps, biases included, are one
+	matmul. For the cbgru, P and P_z (and W and K) are stacked, so that both
+	gates share a single matmul per timestep.
+
+	2. The gate math is fused into a few ops per timestep (addmm, addcmul,
+	lerp), written into preallocated time-major [T, B, H] buffers, so that
+	every timestep is contiguous and no per-step outputs are stacked.
+
+	3. The recurrence runs as a TorchScript loop.
+
+	4. Backpropagation through time is written out by hand, as a
+	torch.autograd.Function per family. The backward loop keeps only the
+	ops that depend on the previous timestep (one matmul and ~5 elementwise
+	ops); the weight, bias and update-gate gradients are one matmul or
+	reduction over the whole sequence instead of one per timestep.
+
+Where the time goes (FlipFlop models, B=128, T=64, H=100, one CPU core): a
+[B x H] @ [H x H] matmul costs ~14us, an elementwise op on a [B x H] state
+~2-5us including dispatch, and one on a whole [B, T, H] sequence ~300us,
+since it no longer fits in cache. Stepping the cell under autograd ran ~25
+ops per timestep and spent ~80% of a training step in the backward pass.
+With the kernels above a forward + backward pass takes ~13.7ms instead of
+~44.6ms for the cbgru (3.3x), ~11ms instead of ~33.5ms for the multiscale
+and multiscale_var cells (3.0-3.1x) and ~12.7ms instead of ~55.6ms for the
+Dale multiscale cell (4.4x); a forward pass alone is 1.5-2.5x faster. Of
+the ~13.7ms cbgru step, ~5ms are the matmuls themselves (one per timestep
+in each direction, plus the weight gradients), ~4ms the ~12 small ops per
+timestep left in the two loops, and the rest the input projections, the
+readout and the loss. A 5-10x speedup would need the per-timestep ops
+fused into a single native (C++/CUDA) kernel, so that only the matmuls
+remain; from PyTorch ops alone, ~3-4x is what this machine allows.
+
+The scans agree with stepping the cell to float32 rounding, but are not
+bit-identical to it, since the fused ops round differently. Under
+torch.func transforms (vmap, jacrev), where the kernels' in-place buffers
+cannot be used, the scans step the cell instead.
+'''
+
+import torch
+
+def input_projections(x_bxtxd, P, b):
+	''' Computes P x + b for every timestep of an input sequence, as a
+	single matmul.
+
+	Args:
+		x_bxtxd: [B x T x D] tensor of inputs.
+
+		P: [H x D] input weight matrix.
+
+		b: [H x 1] bias.
+
+	Returns:
+		[T x B x H] tensor, time-major so that each timestep is contiguous.
+	'''
+
+	n_batch, n_time, n_inputs = x_bxtxd.shape
+	x_nxd = x_bxtxd.transpose(0, 1).reshape(n_time * n_batch, n_inputs)
+
+	return torch.addmm(b.squeeze(-1), x_nxd, P.t()).view(n_time, n_batch, -1)
+
+def cached_params(cell):
+	''' Returns cell.get_params(), reusing the previous result while the
+	cell is in eval mode and none of its parameters have changed.
+
+	The constrained weights (softplus, Dale's-law clipping, masking) only
+	depend on the parameters, so they are computed once per forward pass in
+	training. In eval mode, e.g. when the fixed point finder runs the model
+	many times with the weights fixed, they are computed once per set of
+	parameter values instead. Changes are detected through the parameters'
+	version counters, which optimizer steps and load_state_dict bump. The
+	cached tensors are detached, so gradients w.r.t. the states (as used by
+	the fixed point finder) are unaffected, but no gradients reach the
+	parameters through them.
+
+	Args:
+		cell: an nn.Module with a get_params() method.
+
+	Returns:
+		dict of effective parameters.
+	'''
+	if cell.training:
+		return cell.get_params()
+
+	key = tuple((p.data_ptr(), p._version) for p in cell.parameters())
+	if getattr(cell, '_params_key', None) != key:
+		with torch.no_grad():
+			cell._params_cache = cell.get_params()
+		cell._params_key = key
+
+	return cell._params_cache
+
+def step_scan(step, params, state_bxd, x_bxtxd):
+	''' Runs a cell over a whole input sequence by calling its step once per
+	timestep. The scans fall back to this under torch.func transforms.
+
+	Args:
+		step: one of the <family>_step functions.
+
+		params: dict of effective parameters.
+
+		state_bxd: [B x H] initial state.
+
+		x_bxtxd: [B x T x D] inputs.
+
+	Returns:
+		outputs_bxtxd: [B x T x H] state at every timestep.
+
+		state_bxd: [B x H] state after the final timestep.
+	'''
+	outputs = []
+	for x_bxd in x_bxtxd.unbind(1):
+		state_bxd = step(params, state_bxd, x_bxd)
+		outputs.append(state_bxd)
+
+	return torch.stack(outputs, 1), state_bxd
+
+def _is_transformed(*tensors):
+	''' True if any of the tensors is being transformed by torch.func. '''
+	return any(torch._C._functorch.is_functorch_wrapped_tensor(t)
+		for t in tensors)
+
+# Conductance-based GRU (FlipFlop_cbgru*.py)
+#
+#     r = sigmoid(v)
+#     z = z_low + (z_high - z_low)*sigmoid(K r + P_z x + b_z)
+#     v = (1 - z) v + (W r + P x + b_v)
+#
+# params: W, K: [H x H]; P, P_z: [H x D]; b_v, b_z: [H x 1]; z_low, z_high:
+# scalar tensors bounding the update gate. The state is the voltage v.
+
+def cbgru_step(params, v_bxd, x_bxd):
+	''' Advances the conductance-based GRU by one timestep.
+
+	Args:
+		params: dict of effective parameters, as returned by
+		multiscale_RNN_cell.get_params().
+
+		v_bxd: [B x H] (or [H]) voltage.
+
+		x_bxd: [B x D] (or [D]) input.
+
+	Returns:
+		[B x H] (or [H]) voltage after the step.
+	'''
+	r_bxd = torch.sigmoid(v_bxd)
+	z_bxd = params['z_low'] + (params['z_high'] - params['z_low'])*torch.sigmoid(
+		torch.matmul(r_bxd, params['K'].t()) +
+		torch.matmul(x_bxd, params['P_z'].t()) + params['b_z'].squeeze(-1))
+
+	return (1 - z_bxd) * v_bxd + (torch.matmul(r_bxd, params['W'].t()) +
+		torch.matmul(x_bxd, params['P'].t()) + params['b_v'].squeeze(-1))
+
+def cbgru_scan(params, v_bxd, x_bxtxd):
+	''' Runs the conductance-based GRU over a whole input sequence.
+
+	Args:
+		params: dict of effective parameters, as in cbgru_step.
+
+		v_bxd: [B x H] initial voltage.
+
+		x_bxtxd: [B x T x D] inputs.
+
+	Returns:
+		outputs_bxtxd: [B x T x H] voltage at every timestep.
+
+		v_bxd: [B x H] voltage after the final timestep.
+	'''
+	if _is_transformed(v_bxd, x_bxtxd, *params.values()):
+		return step_scan(cbgru_step, params, v_bxd, x_bxtxd)
+
+	# u = W r + P x + b_v and the gate's K r + P_z x + b_z, side by side
+	a_txbx2d = input_projections(x_bxtxd,
+		torch.cat((params['P'], params['P_z'])),
+		torch.cat((params['b_v'], params['b_z'])))
+	WK_t = torch.cat((params['W'], params['K'])).t()
+
+	if not torch.is_grad_enabled():
+		v_all, _, _, _ = _cbgru_loop(v_bxd, a_txbx2d, WK_t,
+			float(params['z_low']), float(params['z_high']), False)
+		return v_all[1:].transpose(0, 1), v_all[-1]
+
+	return _CBGRUScan.apply(v_bxd, a_txbx2d, WK_t,
+		params['z_low'], params['z_high'])
+
+@torch.jit.script
+def _cbgru_loop(v_bxd, a_txbx2d, WK_t, z_low: float, z_high: float,
+	keep: bool):
+	''' Returns the voltage before and after every timestep, [T+1 x B x H],
+	and, if keep, r, s = sigmoid(K r + P_z x + b_z) and 1 - z at every
+	timestep, [T x B x H] each, for the backward pass. '''
+	n_time = a_txbx2d.size(0)
+	n_batch, n_hidden = v_bxd.size(0), v_bxd.size(1)
+	n_kept = n_time if keep else 1
+
+	v_all = v_bxd.new_empty((n_time + 1, n_batch, n_hidden))
+	r_all = v_bxd.new_empty((n_kept, n_batch, n_hidden))
+	s_all = v_bxd.new_empty((n_kept, n_batch, n_hidden))
+	retain_all = v_bxd.new_empty((n_kept, n_batch, n_hidden))
+	v_all[0] = v_bxd
+
+	for t in range(n_time):
+		k = t if keep else 0
+		r_bxd = torch.sigmoid(v_all[t], out=r_all[k])
+		a_bx2d = torch.addmm(a_txbx2d[t], r_bxd, WK_t)
+		s_bxd = torch.sigmoid(a_bx2d[:, n_hidden:], out=s_all[k])
+		retain_bxd = torch.mul(s_bxd, z_low - z_high, out=retain_all[k])
+		retain_bxd.add_(1 - z_low)
+		torch.addcmul(a_bx2d[:, :n_hidden], retain_bxd, v_all[t],
+			out=v_all[t + 1])
+
+	return v_all, r_all, s_all, retain_all
+
+@torch.jit.script
+def _cbgru_backward_loop(grad_txbxd, grad_v_bxd, v_all, r_all, s_all,
+	retain_all, WK_scaled):
+	''' Backpropagates through _cbgru_loop. Returns dL/du and
+	dL/ds * ds/da / (z_low - z_high) side by side at every timestep,
+	[T x B x 2H], where a = K r + P_z x + b_z, and dL/dv of the initial
+	voltage. WK_scaled is W and (z_low - z_high) K, stacked. '''
+	n_time, n_batch, n_hidden = grad_txbxd.shape
+	da_all = grad_txbxd.new_empty((n_time, n_batch, 2 * n_hidden))
+
+	dv_bxd = grad_v_bxd
+	for t in range(n_time - 1, -1, -1):
+		s_bxd = s_all[t]
+		r_bxd = r_all[t]
+		du_bxd = torch.add(grad_txbxd[t], dv_bxd,
+			out=da_all[t, :, :n_hidden])
+		torch.mul(du_bxd, v_all[t], out=da_all[t, :, n_hidden:]).mul_(
+			torch.addcmul(s_bxd, s_bxd, s_bxd, value=-1))
+		dr_bxd = torch.mm(da_all[t], WK_scaled)
+		dv_bxd = torch.addcmul(du_bxd * retain_all[t], dr_bxd,
+			torch.addcmul(r_bxd, r_bxd, r_bxd, value=-1))
+
+	return da_all, dv_bxd
+
+class _CBGRUScan(torch.autograd.Function):
+	''' _cbgru_loop with a hand-written backward pass. '''
+
+	@staticmethod
+	def forward(ctx, v_bxd, a_txbx2d, WK_t, z_low, z_high):
+		ctx.z_bounds = (float(z_low), float(z_high))
+		v_all, r_all, s_all, retain_all = _cbgru_loop(v_bxd, a_txbx2d, WK_t,
+			ctx.z_bounds[0], ctx.z_bounds[1], True)
+		ctx.save_for_backward(v_all, r_all, s_all, retain_all, WK_t)
+
+		return v_all[1:].transpose(0, 1), v_all[-1].clone()
+
+	@staticmethod
+	def backward(ctx, grad_bxtxd, grad_v_bxd):
+		v_all, r_all, s_all, retain_all, WK_t = ctx.saved_tensors
+		z_low, z_high = ctx.z_bounds
+		n_hidden = v_all.size(-1)
+
+		WK_scaled = WK_t.t().clone()
+		WK_scaled[n_hidden:] *= z_low - z_high
+		da_all, dv_bxd = _cbgru_backward_loop(grad_bxtxd.transpose(0, 1),
+			grad_v_bxd, v_all, r_all, s_all, retain_all, WK_scaled)
+		da_all[:, :, n_hidden:] *= z_low - z_high
+
+		needs = ctx.needs_input_grad
+		dWK_t = r_all.flatten(0, 1).t().mm(da_all.flatten(0, 1)) \
+			if needs[2] else None
+		dz_low = dz_high = None
+		if needs[3] or needs[4]:
+			# z = z_low + (z_high - z_low) s and dL/dz = -dL/du v
+			dz_txbxd = -da_all[:, :, :n_hidden] * v_all[:-1]
+			dz_high = (dz_txbxd * s_all).sum()
+			dz_low = dz_txbxd.sum() - dz_high
+
+		return dv_bxd, da_all, dWK_t, dz_low, dz_high
+
+# Multiscale RNN with a constant, per-neuron update gate
+# (FlipFlop_multiscale*.py)
+#
+#     z = z_low + (z_high - z_low)*sigmoid(b_z)
+#     r = (1 - z) r + z sigmoid(W r + P x + b_v)
+#
+# and the variant in which the nonlinearity is applied before the recurrent
+# weights (FlipFlop_multiscale_var*.py)
+#
+#     r = (1 - z) r + z W (sigmoid(r) + P x + b_v)
+#
+# params: W: [H x H]; P: [H x D]; b_v, b_z: [H x 1]; z_low, z_high: scalar
+# tensors. The state is the rate r.
+
+def update_gate(params):
+	''' Returns the [H] update gate of a multiscale cell. '''
+	return params['z_low'] + (params['z_high'] - params['z_low']) * \
+		torch.sigmoid(params['b_z'].squeeze(-1))
+
+def multiscale_step(params, r_bxd, x_bxd):
+	''' Advances the multiscale RNN by one timestep.
+
+	Args:
+		params: dict of effective parameters, as returned by
+		multiscale_RNN_cell.get_params().
+
+		r_bxd: [B x H] (or [H]) rate.
+
+		x_bxd: [B x D] (or [D]) input.
+
+	Returns:
+		[B x H] (or [H]) rate after the step.
+	'''
+	z_d = update_gate(params)
+
+	return (1 - z_d) * r_bxd + z_d * torch.sigmoid(
+		torch.matmul(r_bxd, params['W'].t()) +
+		torch.matmul(x_bxd, params['P'].t()) + params['b_v'].squeeze(-1))
+
+def multiscale_scan(params, r_bxd, x_bxtxd):
+	''' Runs the multiscale RNN over a whole input sequence.
+
+	Args:
+		params: dict of effective parameters, as in multiscale_step.
+
+		r_bxd: [B x H] initial rate.
+
+		x_bxtxd: [B x T x D] inputs.
+
+	Returns:
+		outputs_bxtxd: [B x T x H] rate at every timestep.
+
+		r_bxd: [B x H] rate after the final timestep.
+	'''
+	if _is_transformed(r_bxd, x_bxtxd, *params.values()):
+		return step_scan(multiscale_step, params, r_bxd, x_bxtxd)
+
+	a_txbxd = input_projections(x_bxtxd, params['P'], params['b_v'])
+	W_t = params['W'].t()
+	z_d = update_gate(params)
+
+	if not torch.is_grad_enabled():
+		r_all, _ = _multiscale_loop(r_bxd, a_txbxd, W_t, z_d, False)
+		return r_all[1:].transpose(0, 1), r_all[-1]
+
+	return _MultiscaleScan.apply(r_bxd, a_txbxd, W_t, z_d)
+
+def multiscale_var_step(params, r_bxd, x_bxd):
+	''' As multiscale_step, for the FlipFlop_multiscale_var*.py variant. '''
+	z_d = update_gate(params)
+
+	return (1 - z_d) * r_bxd + z_d * torch.matmul(
+		torch.sigmoid(r_bxd) + torch.matmul(x_bxd, params['P'].t()) +
+		params['b_v'].squeeze(-1), params['W'].t())
+
+def multiscale_var_scan(params, r_bxd, x_bxtxd):
+	''' As multiscale_scan, for the FlipFlop_multiscale_var*.py variant. '''
+	if _is_transformed(r_bxd, x_bxtxd, *params.values()):
+		return step_scan(multiscale_var_step, params, r_bxd, x_bxtxd)
+
+	a_txbxd = input_projections(x_bxtxd, params['P'], params['b_v'])
+	W_t = params['W'].t()
+	z_d = update_gate(params)
+
+	if not torch.is_grad_enabled():
+		r_all, _, _, _ = _multiscale_var_loop(r_bxd, a_txbxd, W_t, z_d, False)
+		return r_all[1:].transpose(0, 1), r_all[-1]
+
+	return _MultiscaleVarScan.apply(r_bxd, a_txbxd, W_t, z_d)
+
+@torch.jit.script
+def _multiscale_loop(r_bxd, a_txbxd, W_t, z_d, keep: bool):
+	''' Returns the rate before and after every timestep, [T+1 x B x H],
+	and, if keep, s = sigmoid(W r + P x + b_v) at every timestep,
+	[T x B x H], for the backward pass. '''
+	n_time = a_txbxd.size(0)
+	n_batch, n_hidden = r_bxd.size(0), r_bxd.size(1)
+
+	r_all = r_bxd.new_empty((n_time + 1, n_batch, n_hidden))
+	s_all = r_bxd.new_empty((n_time if keep else 1, n_batch, n_hidden))
+	r_all[0] = r_bxd
+
+	for t in range(n_time):
+		s_bxd = torch.sigmoid(torch.addmm(a_txbxd[t], r_all[t], W_t),
+			out=s_all[t if keep else 0])
+		torch.lerp(r_all[t], s_bxd, z_d, out=r_all[t + 1])
+
+	return r_all, s_all
+
+@torch.jit.script
+def _multiscale_backward_loop(grad_txbxd, grad_r_bxd, s_all, W, z_d):
+	''' Backpropagates through _multiscale_loop. Returns dL/dr' and
+	dL/ds * ds/da / z at every timestep, [T x B x H] each, where
+	r' = (1 - z) r + z s and a = W r + P x + b_v, and dL/dr of the initial
+	rate. '''
+	n_time = grad_txbxd.size(0)
+	dr_all = torch.empty_like(grad_txbxd)
+	da_all = torch.empty_like(grad_txbxd)
+	retain_d = 1 - z_d
+	W_scaled = z_d.unsqueeze(-1) * W
+
+	dr_bxd = grad_r_bxd
+	for t in range(n_time - 1, -1, -1):
+		s_bxd = s_all[t]
+		g_bxd = torch.add(grad_txbxd[t], dr_bxd, out=dr_all[t])
+		da_bxd = torch.mul(g_bxd, torch.addcmul(s_bxd, s_bxd, s_bxd, value=-1),
+			out=da_all[t])
+		dr_bxd = torch.addmm(g_bxd * retain_d, da_bxd, W_scaled)
+
+	return dr_all, da_all, dr_bxd
+
+class _MultiscaleScan(torch.autograd.Function):
+	''' _multiscale_loop with a hand-written backward pass. '''
+
+	@staticmethod
+	def forward(ctx, r_bxd, a_txbxd, W_t, z_d):
+		r_all, s_all = _multiscale_loop(r_bxd, a_txbxd, W_t, z_d, True)
+		ctx.save_for_backward(r_all, s_all, W_t, z_d)
+
+		return r_all[1:].transpose(0, 1), r_all[-1].clone()
+
+	@staticmethod
+	def backward(ctx, grad_bxtxd, grad_r_bxd):
+		r_all, s_all, W_t, z_d = ctx.saved_tensors
+		dr_all, da_all, dr_bxd = _multiscale_backward_loop(
+			grad_bxtxd.transpose(0, 1), grad_r_bxd, s_all, W_t.t(), z_d)
+		da_all *= z_d
+
+		needs = ctx.needs_input_grad
+		dW_t = r_all[:-1].flatten(0, 1).t().mm(da_all.flatten(0, 1)) \
+			if needs[2] else None
+		dz_d = (dr_all * (s_all - r_all[:-1])).sum((0, 1)) \
+			if needs[3] else None
+
+		return dr_bxd, da_all, dW_t, dz_d
+
+@torch.jit.script
+def _multiscale_var_loop(r_bxd, a_txbxd, W_t, z_d, keep: bool):
+	''' Returns the rate before and after every timestep, [T+1 x B x H],
+	and, if keep, sigmoid(r), q = sigmoid(r) + P x + b_v and m = W q at
+	every timestep, [T x B x H] each, for the backward pass. '''
+	n_time = a_txbxd.size(0)
+	n_batch, n_hidden = r_bxd.size(0), r_bxd.size(1)
+	n_kept = n_time if keep else 1
+
+	r_all = r_bxd.new_empty((n_time + 1, n_batch, n_hidden))
+	sigma_all = r_bxd.new_empty((n_kept, n_batch, n_hidden))
+	q_all = r_bxd.new_empty((n_kept, n_batch, n_hidden))
+	m_all = r_bxd.new_empty((n_kept, n_batch, n_hidden))
+	r_all[0] = r_bxd
+
+	for t in range(n_time):
+		k = t if keep else 0
+		sigma_bxd = torch.sigmoid(r_all[t], out=sigma_all[k])
+		q_bxd = torch.add(a_txbxd[t], sigma_bxd, out=q_all[k])
+		m_bxd = torch.mm(q_bxd, W_t, out=m_all[k])
+		torch.lerp(r_all[t], m_bxd, z_d, out=r_all[t + 1])
+
+	return r_all, sigma_all, q_all, m_all
+
+@torch.jit.script
+def _multiscale_var_backward_loop(grad_txbxd, grad_r_bxd, sigma_all, W, z_d):
+	''' Backpropagates through _multiscale_var_loop. Returns dL/dr' and
+	dL/dq at every timestep, [T x B x H] each, where r' = (1 - z) r + z m,
+	m = W q and q = sigmoid(r) + P x + b_v, and dL/dr of the initial rate. '''
+	n_time = grad_txbxd.size(0)
+	dr_all = torch.empty_like(grad_txbxd)
+	dq_all = torch.empty_like(grad_txbxd)
+	retain_d = 1 - z_d
+	W_scaled = z_d.unsqueeze(-1) * W
+
+	dr_bxd = grad_r_bxd
+	for t in range(n_time - 1, -1, -1):
+		sigma_bxd = sigma_all[t]
+		g_bxd = torch.add(grad_txbxd[t], dr_bxd, out=dr_all[t])
+		dq_bxd = torch.mm(g_bxd, W_scaled, out=dq_all[t])
+		dr_bxd = torch.addcmul(g_bxd * retain_d, dq_bxd,
+			torch.addcmul(sigma_bxd, sigma_bxd, sigma_bxd, value=-1))
+
+	return dr_all, dq_all, dr_bxd
+
+class _MultiscaleVarScan(torch.autograd.Function):
+	''' _multiscale_var_loop with a hand-written backward pass. '''
+
+	@staticmethod
+	def forward(ctx, r_bxd, a_txbxd, W_t, z_d):
+		r_all, sigma_all, q_all, m_all = _multiscale_var_loop(
+			r_bxd, a_txbxd, W_t, z_d, True)
+		ctx.save_for_backward(r_all, sigma_all, q_all, m_all, W_t, z_d)
+
+		return r_all[1:].transpose(0, 1), r_all[-1].clone()
+
+	@staticmethod
+	def backward(ctx, grad_bxtxd, grad_r_bxd):
+		r_all, sigma_all, q_all, m_all, W_t, z_d = ctx.saved_tensors
+		dr_all, dq_all, dr_bxd = _multiscale_var_backward_loop(
+			grad_bxtxd.transpose(0, 1), grad_r_bxd, sigma_all, W_t.t(), z_d)
+
+		needs = ctx.needs_input_grad
+		dW_t = q_all.flatten(0, 1).t().mm(dr_all.flatten(0, 1)) * z_d \
+			if needs[2] else None
+		dz_d = (dr_all * (m_all - r_all[:-1])).sum((0, 1)) \
+			if needs[3] else None
+
+		return dr_bxd, dq_all, dW_t, dz_d
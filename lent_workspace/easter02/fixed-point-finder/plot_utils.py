@@ -201,15 +201,17 @@ def plot_fixed_point(ax, fp, pca,
 			''' Ideally, never wind up here. Eigen decomposition is much faster in batch mode.'''
 			print('Decomposing Jacobians, one fixed point at time.')
 			print('\t warning: THIS CAN BE VERY SLOW.')
-			fp.decompose_Jacobians()
+			fp.decompose_jacobians(do_batch=False)
 
 		e_vals = fp.eigval_J_xstar[0]
-		e_vecs = fp.eigvec_J_xstar[0]
+		e_vecs = fp.eigvec_J_xstar[0] if fp.eigvec_J_xstar is not None \
+			else np.zeros((n_states, 0))
 
-		sorted_e_val_idx = np.argsort(np.abs(e_vals))
-
-		if max_n_modes > n_states:
-			max_n_modes = n_states
+		# Eigenpairs are sorted by decreasing eigenvalue magnitude. Only the
+		# leading few eigenvectors are available if the decomposition was
+		# run with k or mode='eigvals'.
+		if max_n_modes > e_vecs.shape[1]:
+			max_n_modes = e_vecs.shape[1]
 
 		# Determine stability of fixed points
 		is_stable = np.all(np.abs(e_vals) < 1.0)
@@ -228,9 +230,7 @@ def plot_fixed_point(ax, fp, pca,
 
 	if do_plot:
 		if has_J:
-			for mode_idx in range(max_n_modes):
-				# -[1, 2, ..., max_n_modes]
-				idx = sorted_e_val_idx[-(mode_idx+1)]
+			for idx in range(max_n_modes):
 
 				# Magnitude of complex eigenvalue
 				e_val_mag = np.abs(e_vals[idx])
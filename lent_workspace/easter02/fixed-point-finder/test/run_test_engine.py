@@ -0,0 +1,74 @@
+'''
+run_test_engine.py
+Tests the sequence kernels of multiscale_engine.py
+Written for Python 3.8.17 and Pytorch 2.0.1
+
+The scans run fused TorchScript loops with hand-written backward passes, so
+they are checked against stepping the cell, and their gradients (w.r.t. the
+initial state, the inputs and every parameter, including the update gate
+bounds) with torch.autograd.gradcheck, in double precision.
+'''
+
+import os
+import sys
+import torch
+
+FIXED_POINT_FINDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, FIXED_POINT_FINDER_PATH)
+import multiscale_engine as engine
+
+N_BATCH = 3
+N_TIME = 5
+N_HIDDEN = 4
+N_INPUTS = 2
+
+def random_params(names):
+    params = {name: 0.5 * torch.randn(*shape, dtype=torch.float64)
+        for name, shape in names.items()}
+    params['z_low'] = torch.tensor(0.1, dtype=torch.float64)
+    params['z_high'] = torch.tensor(0.9, dtype=torch.float64)
+
+    return {name: value.requires_grad_() for name, value in params.items()}
+
+def check_scan(scan, step, names):
+    torch.manual_seed(0)
+    params = random_params(names)
+    state_bxd = torch.randn(N_BATCH, N_HIDDEN, dtype=torch.float64, requires_grad=True)
+    x_bxtxd = torch.randn(N_BATCH, N_TIME, N_INPUTS, dtype=torch.float64, requires_grad=True)
+
+    outputs, final_state = scan(params, state_bxd, x_bxtxd)
+    ref_outputs, ref_final_state = engine.step_scan(step, params, state_bxd, x_bxtxd)
+    assert torch.allclose(outputs, ref_outputs)
+    assert torch.allclose(final_state, ref_final_state)
+
+    with torch.no_grad():
+        outputs, _ = scan(params, state_bxd, x_bxtxd)
+    assert torch.allclose(outputs, ref_outputs)
+
+    names = list(params)
+    def run(state_bxd, x_bxtxd, *values):
+        return scan(dict(zip(names, values)), state_bxd, x_bxtxd)
+
+    assert torch.autograd.gradcheck(run, (state_bxd, x_bxtxd, *params.values()))
+
+def test_cbgru_scan():
+    check_scan(engine.cbgru_scan, engine.cbgru_step,
+        {'W': (N_HIDDEN, N_HIDDEN), 'K': (N_HIDDEN, N_HIDDEN),
+         'P': (N_HIDDEN, N_INPUTS), 'P_z': (N_HIDDEN, N_INPUTS),
+         'b_v': (N_HIDDEN, 1), 'b_z': (N_HIDDEN, 1)})
+
+def test_multiscale_scan():
+    check_scan(engine.multiscale_scan, engine.multiscale_step,
+        {'W': (N_HIDDEN, N_HIDDEN), 'P': (N_HIDDEN, N_INPUTS),
+         'b_v': (N_HIDDEN, 1), 'b_z': (N_HIDDEN, 1)})
+
+def test_multiscale_var_scan():
+    check_scan(engine.multiscale_var_scan, engine.multiscale_var_step,
+        {'W': (N_HIDDEN, N_HIDDEN), 'P': (N_HIDDEN, N_INPUTS),
+         'b_v': (N_HIDDEN, 1), 'b_z': (N_HIDDEN, 1)})
+
+if __name__ == '__main__':
+    test_cbgru_scan()
+    test_multiscale_scan()
+    test_multiscale_var_scan()
+    print('Passed.')
@@ -0,0 +1,67 @@
+'''
+run_test_sequential.py
+Tests sequential fixed point optimizations over a process pool
+Written for Python 3.8.17 and Pytorch 2.0.1
+
+Regression test: the Jacobian pass (vmap/jacrev over the RNN wrappers) must
+not leave the model in a state that breaks the worker copies used by a second
+call to find_fixed_points, and sequential optimizations must return fixed
+points whose Jacobians are then computed and decomposed as in the joint path.
+'''
+
+import os
+import sys
+import numpy as np
+import torch
+
+FIXED_POINT_FINDER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, FIXED_POINT_FINDER_PATH)
+from FixedPointFinderTorch import FixedPointFinderTorch
+import FlipFlop_cbgru
+import FlipFlop_dale
+
+N_BITS = 2
+N_HIDDEN = 8
+N_INITS = 6
+
+def run_sequential_twice(FlipFlop):
+    torch.manual_seed(0)
+    rng = np.random.RandomState(0)
+
+    model = FlipFlop(input_size=N_BITS, hidden_size=N_HIDDEN, num_classes=N_BITS)
+    fpf = FixedPointFinderTorch(model.rnn,
+                                method='sequential',
+                                n_workers=2,
+                                max_iters=50,
+                                do_exclude_distance_outliers=False,
+                                verbose=False,
+                                super_verbose=False)
+
+    initial_states = 0.5 * rng.randn(N_INITS, N_HIDDEN).astype(np.float32)
+    inputs = np.zeros([1, N_BITS], dtype=np.float32)
+
+    results = []
+    for _ in range(2):
+        unique_fps, all_fps = fpf.find_fixed_points(initial_states, inputs)
+
+        assert all_fps.n == N_INITS
+        assert np.issubdtype(all_fps.n_iters.dtype, np.integer)
+        assert unique_fps.n > 0
+        assert not np.any(np.isnan(unique_fps.eigval_J_xstar))
+        assert unique_fps.is_stable.dtype == bool
+
+        results.append(unique_fps)
+
+    # Both calls optimize from the same initial states
+    assert np.allclose(results[0].xstar, results[1].xstar, atol=1e-5)
+
+def test_sequential_cbgru():
+    run_sequential_twice(FlipFlop_cbgru.FlipFlop)
+
+def test_sequential_dale():
+    run_sequential_twice(FlipFlop_dale.FlipFlop)
+
+if __name__ == '__main__':
+    test_sequential_cbgru()
+    test_sequential_dale()
+    print('Passed.')
@@ -7,8 +7,10 @@ Please direct correspondence to mgolub@cs.washington.edu
 
 import pdb
 import sys
+from copy import copy
 import numpy as np
 import torch
+from torch.utils.data import IterableDataset, DataLoader, get_worker_info
 
 def get_device(verbose=False):
 	"""
@@ -37,4 +39,157 @@ def get_device(verbose=False):
 	# 	if verbose:
 	# 		print("Apple Silicon GPU enabled.")
 
-	return device
\ No newline at end of file
+	return device
+
+class TaskStream(IterableDataset):
+	''' An endless stream of whole batches of task data, e.g. from
+	FlipFlopData.generate_data(), for use in a DataLoader with
+	batch_size=None.
+
+	Each DataLoader worker generates from its own copy of the data
+	generator, seeded from the generator's own random state and the worker
+	id, so workers produce independent (and reproducible) trials.
+	'''
+
+	def __init__(self, data_gen, batch_size):
+		'''
+		Args:
+			data_gen: object with a numpy RandomState rng and a
+			generate_data(n_trials) method returning a dict of numpy arrays,
+			such as FlipFlopData.
+
+			batch_size: number of trials per batch.
+
+		Returns:
+			None.
+		'''
+		super().__init__()
+		self.data_gen = data_gen
+		self.batch_size = batch_size
+		self.seed = data_gen.rng.randint(2**31)
+
+	def __iter__(self):
+		worker_info = get_worker_info()
+		worker_id = 0 if worker_info is None else worker_info.id
+
+		data_gen = copy(self.data_gen)
+		data_gen.rng = np.random.RandomState([self.seed, worker_id])
+
+		while True:
+			data = data_gen.generate_data(n_trials=self.batch_size)
+			yield {key: torch.from_numpy(val) for key, val in data.items()}
+
+class BatchStream(object):
+	''' Training batches from a TaskStream, generated in background worker
+	processes while the model trains on the current batch.
+
+	Iterating over a BatchStream yields n_batches batches (one epoch), as
+	dicts of tensors on device. Successive epochs continue the same stream,
+	so each worker keeps generating ahead across epoch boundaries. Batches
+	are generated whole, rather than collated from individual trials, and
+	are pinned by the DataLoader when device is a GPU, so that the copy to
+	device can be asynchronous.
+	'''
+
+	def __init__(self, data_gen, batch_size, n_batches,
+		n_workers=1, prefetch_factor=2, device='cpu'):
+		'''
+		Args:
+			data_gen, batch_size: See TaskStream.
+
+			n_batches: number of batches per epoch.
+
+			n_workers (optional): number of worker processes generating
+			batches. 0 generates each batch in this process, when it is
+			needed. Default: 1.
+
+			prefetch_factor (optional): number of batches each worker
+			generates ahead. Default: 2.
+
+			device (optional): device to which batches are moved.
+			Default: 'cpu'.
+
+		Returns:
+			None.
+		'''
+		self.n_batches = n_batches
+		self.device = device
+		self.loader = DataLoader(TaskStream(data_gen, batch_size),
+			batch_size=None,
+			num_workers=n_workers,
+			prefetch_factor=prefetch_factor if n_workers > 0 else None,
+			pin_memory=torch.device(device).type == 'cuda')
+		self._batches = None
+
+	def __len__(self):
+		return self.n_batches
+
+	def __iter__(self):
+		if self._batches is None:
+			self._batches = iter(self.loader)
+
+		for _ in range(self.n_batches):
+			batch = next(self._batches)
+			yield {key: val.to(self.device, non_blocking=True)
+				for key, val in batch.items()}
+
+class TrainingBatches(object):
+	''' The training batches of each epoch of a FlipFlop model's train().
+
+	By default, 4*batch_size trials are generated every
+	regenerate_every_n_epochs epochs and shuffled into 4 batches in every
+	epoch. With n_workers, every batch is instead freshly generated by a
+	BatchStream, so there is no data to regenerate and
+	regenerate_every_n_epochs must be left at 1.
+	'''
+
+	def __init__(self, data_gen, batch_size, make_dataset,
+		regenerate_every_n_epochs=1, n_workers=None, device='cpu'):
+		'''
+		Args:
+			data_gen, batch_size: See TaskStream.
+
+			make_dataset: function mapping the dict returned by
+			data_gen.generate_data() to a torch Dataset.
+
+			regenerate_every_n_epochs (optional): number of epochs between
+			regenerating the training trials. Default: 1.
+
+			n_workers (optional): if not None, the number of worker
+			processes streaming fresh training batches. See BatchStream.
+			Default: None.
+
+			device (optional): device to which streamed batches are moved.
+			Default: 'cpu'.
+
+		Returns:
+			None.
+		'''
+		if n_workers is not None and regenerate_every_n_epochs != 1:
+			raise ValueError('Streamed training batches (n_workers=%d) are '
+				'all freshly generated, so regenerate_every_n_epochs=%d would '
+				'have no effect.' % (n_workers, regenerate_every_n_epochs))
+
+		self.data_gen = data_gen
+		self.batch_size = batch_size
+		self.make_dataset = make_dataset
+		self.regenerate_every_n_epochs = regenerate_every_n_epochs
+		self.n_workers = n_workers
+		self.device = device
+		self._dataset = None
+		self._stream = None
+
+	def epoch(self, epoch):
+		''' Returns an iterable over the training batches of epoch, which
+		starts from 0. '''
+		if self.n_workers is not None:
+			if self._stream is None:
+				self._stream = BatchStream(self.data_gen, self.batch_size,
+					n_batches=4, n_workers=self.n_workers, device=self.device)
+			return self._stream
+
+		if epoch % self.regenerate_every_n_epochs == 0:
+			data = self.data_gen.generate_data(n_trials=4*self.batch_size)
+			self._dataset = self.make_dataset(data)
+
+		return DataLoader(self._dataset, shuffle=True, batch_size=self.batch_size)
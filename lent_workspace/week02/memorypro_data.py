@@ -8,62 +8,89 @@
 import numpy as np
 import torch
 
-def memorypro_dataset(number):
-    # return an input vector with dimension (6, timesteps) and its target output with dimension (3, timestep)
-    # determine time intervals
-    gamma = 0.2
-    t_context = int(np.ceil(np.random.uniform(300, 700)))
-    t_stim = int(np.ceil(np.random.uniform(200, 1600)))
-    t_memory = int(np.ceil(np.random.uniform(200, 1600)))
-    t_response = int(np.ceil(np.random.uniform(300, 700)))
-    total = t_context + t_stim + t_memory + t_response
-    total = int(total)
-    print(total)
-    input_set = []
-    target_set = []
-    u0 = 0.1* np.sqrt(2/gamma)
-    for i in range(number):
-        # generate theta randomly from 0 to 2pi
-        theta = np.random.uniform(0, 2*np.pi)
-        print(theta)
-        u_fix = np.concatenate((np.repeat(1.0, total-t_response), np.repeat(0.0, t_response)), axis = None).reshape(total, 1)
-        u_mod1_sin = np.concatenate((np.repeat(0.0, t_context), np.repeat(np.sin(theta), t_stim), np.repeat(0.0, t_memory+t_response)))
-        u_mod1_sin = u_mod1_sin.reshape(total, 1)
-        u_mod1_cos = np.concatenate((np.repeat(0.0, t_context), np.repeat(np.cos(theta), t_stim), np.repeat(0.0, t_memory+t_response)))
-        u_mod1_cos = u_mod1_cos.reshape(total, 1)
-        u_mod1 = np.concatenate((u_mod1_sin, u_mod1_cos), axis = 1).reshape(total, 2)
-        u_mod2 = np.zeros((total, 2))
-        u_rule = np.zeros((total, 1))
-        u_noise = u0 * np.random.randn(6, total)   
-        u = np.concatenate((u_fix, u_mod1, u_mod2, u_rule), axis = 1).T 
-        input_set.append(u)
-
-        # then determine the target output
-        z_fix = u_fix
-        z_sin = np.concatenate((np.repeat(0.0, t_context+t_stim+t_memory), np.repeat(np.sin(theta),t_response)))
-        z_sin = z_sin.reshape(total, 1)
-        z_cos = np.concatenate((np.repeat(0.0, t_context+t_stim+t_memory), np.repeat(np.cos(theta),t_response)))
-        z_cos = z_cos.reshape(total, 1)
-        z = np.concatenate((z_fix, z_sin, z_cos), axis = 1).T
-        target_set.append(z)
-    input_set = np.array(input_set)
-    target_set = np.array(target_set)
-    return input_set, target_set
-
-
-import matplotlib.pyplot as plt
-
-x, y = memorypro_dataset(10000)
-plt.plot(x[0][0])
-plt.plot(x[0][1])
-plt.plot(x[0][2])
-plt.plot(x[0][5])
-plt.legend(['fix', 'sin', 'cos', '0', '0', '0'])
-plt.show()
-
-plt.plot(y[0][0])
-plt.plot(y[0][1])
-plt.plot(y[0][2])
-
-plt.legend(['fix', 'sin', 'cos'])
-plt.show()
\ No newline at end of file
+# range of each epoch duration, in timesteps
+T_CONTEXT = (300, 700)
+T_STIM = (200, 1600)
+T_MEMORY = (200, 1600)
+T_RESPONSE = (300, 700)
+
+def memorypro_dataset(number, T_max=None, noise=True, gamma=0.2, rng=None, dtype=np.float32):
+    # return inputs with dimension (number, 6, T_max), target outputs with dimension (number, 3, T_max)
+    # and a mask with dimension (number, T_max) that is True for the timesteps of each trial.
+    # every trial draws its own epoch durations, so trials have different lengths and are
+    # zero-padded to T_max (default: the longest trial in this batch)
+    # rng: numpy Generator (default: np.random.default_rng())
+    if rng is None:
+        rng = np.random.default_rng()
+
+    # determine time intervals, one set per trial
+    t_context = np.ceil(rng.uniform(*T_CONTEXT, size=number)).astype(int)
+    t_stim = np.ceil(rng.uniform(*T_STIM, size=number)).astype(int)
+    t_memory = np.ceil(rng.uniform(*T_MEMORY, size=number)).astype(int)
+    t_response = np.ceil(rng.uniform(*T_RESPONSE, size=number)).astype(int)
+
+    # end of each epoch, as (number, 1) columns to compare against the time index
+    end_context = t_context[:, None]
+    end_stim = end_context + t_stim[:, None]
+    end_memory = end_stim + t_memory[:, None]
+    total = end_memory + t_response[:, None]
+
+    if T_max is None:
+        T_max = int(total.max()) if number > 0 else 0
+    elif number > 0 and total.max() > T_max:
+        raise ValueError('T_max = %d is shorter than the longest trial (%d)' % (T_max, total.max()))
+
+    # generate theta randomly from 0 to 2pi
+    theta = rng.uniform(0, 2*np.pi, size=number)[:, None]
+
+    t = np.arange(T_max)[None, :]
+    mask = t < total
+    is_fix = t < end_memory
+    is_stim = (t >= end_context) & (t < end_stim)
+    is_response = (t >= end_memory) & mask
+
+    # inputs: fixation, modality 1 (sin, cos), modality 2 (sin, cos), rule
+    u = np.zeros((number, 6, T_max), dtype=dtype)
+    u[:, 0] = is_fix
+    u[:, 1] = is_stim * np.sin(theta)
+    u[:, 2] = is_stim * np.cos(theta)
+
+    if noise:
+        u0 = 0.1 * np.sqrt(2/gamma)
+        u_noise = rng.standard_normal((number, 6, T_max), dtype=dtype)
+        u_noise *= u0 * mask[:, None, :]
+        u += u_noise
+
+    # then determine the target output: fixation, then respond with (sin, cos) of the stimulus
+    z = np.zeros((number, 3, T_max), dtype=dtype)
+    z[:, 0] = is_fix
+    z[:, 1] = is_response * np.sin(theta)
+    z[:, 2] = is_response * np.cos(theta)
+
+    return u, z, mask
+
+def memorypro_chunks(number, chunk_size=1000, **kwargs):
+    # lazily generate number trials, chunk_size at a time, yielding (u, z, mask) as returned
+    # by memorypro_dataset(chunk_size, **kwargs). pass T_max for the same shape in every chunk
+    for start in range(0, number, chunk_size):
+        yield memorypro_dataset(min(chunk_size, number - start), **kwargs)
+
+
+if __name__ == '__main__':
+    import matplotlib.pyplot as plt
+
+    x, y, mask = memorypro_dataset(10000)
+    n = mask[0].sum()
+    plt.plot(x[0][0][:n])
+    plt.plot(x[0][1][:n])
+    plt.plot(x[0][2][:n])
+    plt.plot(x[0][5][:n])
+    plt.legend(['fix', 'sin', 'cos', '0', '0', '0'])
+    plt.show()
+
+    plt.plot(y[0][0][:n])
+    plt.plot(y[0][1][:n])
+    plt.plot(y[0][2][:n])
+
+    plt.legend(['fix', 'sin', 'cos'])
+    plt.show()
@@ -1,29 +1,14 @@
-import numpy as np
 import torch
 from torchvision import datasets
-from torchvision import transforms
 from torchvision.transforms import ToTensor
-from torchvision.transforms import Lambda
+
+from packages.sequence_encoding import SequenceEncoder, cache_dataset
 
 class DatasetPreprocessor:
-    def __init__(self):
-        self.transform = transforms.Compose([
-            ToTensor(),
-            Lambda(lambda x: torch.tensor(self.snake_scan(x.numpy())))
-        ])
-
-    def snake_scan(self, img):
-        if len(img.shape) != 3:
-            raise ValueError('Input image must be a 3D array')
-
-        channels, rows, cols = img.shape
-        snake = np.zeros((rows, cols * channels), dtype=img.dtype)
-        for r in range(rows):
-            row_data = img[:, r, :].flatten()
-            if r % 2 == 1:
-                row_data = row_data[::-1]
-            snake[r] = row_data
-        return snake
+    def __init__(self, scan='snake', input_size=96, stride=None, seed=0):
+        # CIFAR10 images are [3, 32, 32]; the default gives the old [32, 96] snake-scanned layout
+        self.transform = ToTensor()
+        self.encoder = SequenceEncoder((3, 32, 32), input_size, scan=scan, stride=stride, seed=seed)
 
     def load_data(self):
         train_data = datasets.CIFAR10(
@@ -32,6 +17,7 @@ class DatasetPreprocessor:
             download=False,
             transform=self.transform
         )
+        train_data = cache_dataset(train_data, self.encoder)
 
         test_data = datasets.CIFAR10(
             root='data',
@@ -39,6 +25,7 @@ class DatasetPreprocessor:
             download=False,
             transform=self.transform
         )
+        test_data = cache_dataset(test_data, self.encoder)
 
         loaders = {
             'train': torch.utils.data.DataLoader(train_data,
@@ -54,6 +41,7 @@ class DatasetPreprocessor:
 
         return loaders
 
-# Usage:
-preprocessor = DatasetPreprocessor()
-loaders = preprocessor.load_data()
+if __name__ == '__main__':
+    # Usage:
+    preprocessor = DatasetPreprocessor()
+    loaders = preprocessor.load_data()
@@ -0,0 +1,98 @@
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.utils.data import DataLoader, TensorDataset
+
+SCANS = ('row', 'snake', 'permuted', 'spiral')
+
+def spiral_order(rows, cols):
+    'Pixel positions of a [rows, cols] grid in clockwise spiral order, starting at the top-left corner'
+    order = []
+    top, bottom, left, right = 0, rows - 1, 0, cols - 1
+    while top <= bottom and left <= right:
+        order += [(top, c) for c in range(left, right + 1)]
+        order += [(r, right) for r in range(top + 1, bottom + 1)]
+        if top < bottom:
+            order += [(bottom, c) for c in range(right - 1, left - 1, -1)]
+        if left < right:
+            order += [(r, left) for r in range(bottom - 1, top, -1)]
+        top, bottom, left, right = top + 1, bottom - 1, left + 1, right - 1
+    return order
+
+def scan_index(image_shape, scan='snake', seed=0):
+    '''Gather index that reorders a flattened [channels, rows, cols] image into a pixel sequence.
+
+    row:      plain flatten, as images.reshape(batch_size, -1)
+    snake:    row by row (all channels of a row, then the next row), reversing every other row
+    permuted: a fixed random permutation of all pixels, drawn from seed
+    spiral:   clockwise spiral from the top-left corner, all channels of a pixel together
+    '''
+    channels, rows, cols = image_shape
+    pixels = np.arange(channels * rows * cols).reshape(channels, rows, cols)
+
+    if scan == 'row':
+        index = pixels.reshape(-1)
+    elif scan == 'snake':
+        index = pixels.transpose(1, 0, 2).reshape(rows, channels * cols)
+        index[1::2] = index[1::2, ::-1].copy()
+        index = index.reshape(-1)
+    elif scan == 'permuted':
+        index = np.random.RandomState(seed).permutation(pixels.size)
+    elif scan == 'spiral':
+        index = np.concatenate([pixels[:, r, c] for r, c in spiral_order(rows, cols)])
+    else:
+        raise ValueError('scan must be one of {}, got {}'.format(SCANS, scan))
+
+    return torch.as_tensor(index, dtype=torch.long)
+
+class SequenceEncoder(nn.Module):
+    '''Turns a batch of images [batch_size, channels, rows, cols] into sequences [batch_size, sequence_length, input_size].
+
+    The scan order is precomputed once as a gather index (see scan_index), so a whole batch is encoded
+    with a single index_select followed by an unfold into windows of input_size pixels taken every
+    stride pixels. stride=None gives non-overlapping windows. The last windows are padded with zeros,
+    matching the old per-batch stride() helper. Move the encoder to the device the batches are on.
+    '''
+    def __init__(self, image_shape, input_size, scan='snake', stride=None, seed=0):
+        super(SequenceEncoder, self).__init__()
+        self.image_shape = tuple(image_shape)
+        self.input_size = input_size
+        self.stride = input_size if stride is None else stride
+        self.scan_type = scan
+
+        n_pixels = int(np.prod(self.image_shape))
+        self.sequence_length = n_pixels // self.stride
+        self.register_buffer('index', scan_index(self.image_shape, scan, seed))
+
+    def scan(self, images):
+        'Reorders [batch_size, ...] images into [batch_size, n_pixels] in scan order'
+        return images.reshape(images.shape[0], -1).index_select(1, self.index)
+
+    def window(self, sequence):
+        'Cuts [batch_size, n_pixels] (or [batch_size, sequence_length, input_size]) into strided windows'
+        sequence = sequence.reshape(sequence.shape[0], -1)
+        if self.stride == self.input_size and sequence.shape[1] % self.input_size == 0:
+            return sequence.reshape(sequence.shape[0], -1, self.input_size)
+        sequence = F.pad(sequence, (0, self.input_size))
+        windows = sequence.unfold(1, self.input_size, self.stride)[:, :self.sequence_length]
+        return windows.contiguous()
+
+    def forward(self, images):
+        return self.window(self.scan(images))
+
+def cache_dataset(dataset, transform=None, batch_size=1000, device='cpu'):
+    '''Runs dataset (and transform, applied to whole batches) once and stores the result as a TensorDataset.
+
+    Per-sample transforms such as ToTensor are then paid once instead of every epoch. Overlapping
+    windows multiply the memory needed, so for strided encodings cache encoder.scan and apply
+    encoder.window to each batch instead. device is where transform runs; the cache is kept on the cpu.
+    '''
+    images, labels = [], []
+    with torch.no_grad():
+        for x, y in DataLoader(dataset, batch_size=batch_size, shuffle=False):
+            if transform is not None:
+                x = transform(x.to(device)).cpu()
+            images.append(x)
+            labels.append(y)
+    return TensorDataset(torch.cat(images), torch.cat(labels))
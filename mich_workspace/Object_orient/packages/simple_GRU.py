@@ -1,3 +1,4 @@
+import math
 import torch
 import torch.nn as nn
 
@@ -39,7 +40,7 @@ class customGRUCell(nn.Module):
 class customGRU(nn.Module):
     def __init__(self, input_size, hidden_size, num_layers, batch_first=True):
         super(customGRU, self).__init__()
-        self.rnncell = customGRUCell(input_size, hidden_size, num_layers).to(device)
+        self.rnncell = customGRUCell(input_size, hidden_size, num_layers)
         self.batch_first = batch_first
 
     def forward(self, x):
@@ -60,14 +61,19 @@ class RNN(nn.Module):
         self.fc = nn.Linear(hidden_size, 10)
         pass
 
-    def forward(self, x):
-        # Set initial hidden and cell states 
-        self.lstm.rnncell.r_t = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device) 
+    def forward(self, x, state=None, return_state=False):
+        # Set initial hidden and cell states, unless continuing from the state of a previous chunk
+        if state is None:
+            state = torch.zeros(self.num_layers, x.size(0), self.hidden_size, device=x.device)
+        self.lstm.rnncell.r_t = state
         #c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device)
         # Passing in the input and hidden state into the model and  obtaining outputs
         out = self.lstm(x)  # out: tensor of shape (batch_size, seq_length, hidden_size)
+        state = self.lstm.rnncell.r_t
         #Reshaping the outputs such that it can be fit into the fully connected layer
         out = self.fc(out)
+        if return_state:
+            return out.squeeze(-1), state
         return out.squeeze(-1)
         
         pass                                    
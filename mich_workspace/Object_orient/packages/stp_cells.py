@@ -0,0 +1,469 @@
+import math
+import torch
+import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+
+# Short-term plasticity cells
+# Each cell family is written as a pair of pure functions
+#     <family>_step(params, state, x) -> new_state
+#     <family>_scan(params, state0, xs) -> (outputs, final_state)
+# that do not read or write module attributes. params is the dict returned by
+# the cell's get_params(), i.e. the effective (constrained) parameters, and state
+# is a tuple of tensors in [batch, ...] layout. The nn.Modules below are thin
+# wrappers, so a model can be run on several sequences at once, wrapped in
+# torch.func.vmap/jacrev, or traced, without copying it.
+
+'Scan'
+def scan(step, params, state, xs, checkpointed=False):
+    'Runs step over the time axis of xs [B, T, D]; returns the stacked first state variable and the final state'
+    if not checkpointed or not torch.is_grad_enabled():
+        return scan_segment(step, params, state, xs)
+    # Gradient checkpointing: only the state at the start of each segment of ~sqrt(T) steps is kept
+    # for backward, and the steps inside a segment are recomputed, so memory is O(sqrt T) not O(T)
+    segment_length = max(1, int(math.sqrt(xs.size(1))))
+    outputs = []
+    for start in range(0, xs.size(1), segment_length):
+        segment, state = checkpoint(scan_segment, step, params, state, xs[:, start:start + segment_length], use_reentrant=False)
+        outputs.append(segment)
+    return torch.cat(outputs, 1), state
+
+def scan_segment(step, params, state, xs):
+    outputs = []
+    for x in xs.unbind(1):
+        state = step(params, state, x)
+        outputs.append(state[0])
+    return torch.stack(outputs, 1), state
+
+'Dale CB STP'
+# state = (v_t, X, U), each [B, H]
+# X is the depression variable, U the facilitation variable of each neuron
+
+def dale_cb_stp_params(cell):
+    ### Constraints###
+    K = cell.softplus(cell.K)
+    C = cell.softplus(cell.C)
+    # W is constructed using e*(K+C)
+    W_E = cell.e_e * (K[:, :cell.hidden_size//2] + C[:, :cell.hidden_size//2])
+    W_I = cell.e_i * (K[:, cell.hidden_size//2:] + C[:, cell.hidden_size//2:])
+    # If sign of W do not obey Dale's law, then these terms to be 0
+    W_E = cell.relu(W_E)
+    W_I = -cell.relu(-W_I)
+    W = torch.cat((W_E, W_I), 1)
+
+    ### STP model ###
+    z_x = cell.z_min + (cell.z_max - cell.z_min) * cell.sigmoid(cell.c_x)
+    z_u = cell.z_min + (cell.z_max - cell.z_min) * cell.sigmoid(cell.c_u)
+    Ucap = 0.9 * cell.sigmoid(cell.c_U)
+
+    return {'K': K, 'W': W, 'P': cell.P, 'P_z': cell.P_z, 'b_v': cell.b_v, 'b_z': cell.b_z,
+            'dt': cell.dt, 'delta_t': cell.delta_t, 'z_x': z_x, 'z_u': z_u, 'Ucap': Ucap}
+
+def dale_cb_stp_step(params, state, x):
+    v_t, X, U = state
+    r_t = torch.relu(v_t)
+    z_x = params['z_x'].squeeze(-1)
+    z_u = params['z_u'].squeeze(-1)
+    Ucap = params['Ucap'].squeeze(-1)
+    delta_t = params['delta_t']
+
+    # Short term Depression
+    X = z_x + torch.mul((1 - z_x), X) - delta_t * U * X * r_t
+
+    # Short term Facilitation
+    U = Ucap * z_u + torch.mul((1 - z_u), U) + delta_t * Ucap * (1 - U) * r_t
+    Ucapclone = Ucap.detach()
+    U = torch.clamp(U, min=Ucapclone, max=torch.ones_like(Ucapclone))
+
+    ### Update Equations ###
+    z_t = params['dt'] * torch.sigmoid(torch.matmul(r_t, params['K'].t()) + torch.matmul(x, params['P_z'].t()) + params['b_z'].squeeze(-1))
+    v_t = (1 - z_t) * v_t + params['dt'] * (torch.matmul(U*X*r_t, params['W'].t()) + torch.matmul(x, params['P'].t()) + params['b_v'].squeeze(-1))
+    return v_t, X, U
+
+def dale_cb_stp_scan(params, state, xs, checkpointed=False):
+    'xs is [B, T, D]; returns the [B, T, H] voltage trajectory and the final state'
+    return scan(dale_cb_stp_step, params, state, xs, checkpointed)
+
+'STP'
+# state = (h_t, X, U)
+# poor: X and U are [B, H], one synaptic state per presynaptic neuron
+# rich: X and U are [B, H, H], one synaptic state per synapse. With grad disabled the rich state is
+# updated in place (see stp_rich_step_), so a state passed to stp_step/stp_scan is consumed
+
+def stp_params(cell):
+    sigmoid = nn.Sigmoid()
+    z_x = cell.z_min + (cell.z_max - cell.z_min) * sigmoid(cell.c_x)
+    z_u = cell.z_min + (cell.z_max - cell.z_min) * sigmoid(cell.c_u)
+    Ucap = 0.9 * sigmoid(cell.c_U)
+    if cell.complexity == "rich":
+        z_h = cell.e_h * sigmoid(cell.c_h)
+    if cell.complexity == "poor":
+        z_h = cell.c_h
+    return {'w': cell.w, 'p': cell.p, 'b': cell.b, 'z_h': z_h,
+            'delta_t': cell.delta_t, 'z_x': z_x, 'z_u': z_u, 'Ucap': Ucap}
+
+def stp_step(params, state, x):
+    h_t, X, U = state
+    if X.dim() == 3 and not torch.is_grad_enabled():
+        # inference only: nothing is kept for backward, so the rich state can be overwritten
+        return stp_rich_step_(params, state, x)
+    delta_t = params['delta_t']
+    z_h = params['z_h'].squeeze(-1)
+    if X.dim() == 3:
+        # rich: z_x, z_u and Ucap are [H, H] and broadcast over the batch
+        z_x, z_u, Ucap = params['z_x'], params['z_u'], params['Ucap']
+        h_pre = h_t.unsqueeze(-1)
+    else:
+        z_x, z_u, Ucap = params['z_x'].squeeze(-1), params['z_u'].squeeze(-1), params['Ucap'].squeeze(-1)
+        h_pre = h_t
+    # Both updates are written as s = b + s * a with fused addcmuls, so that the rich cell allocates
+    # (and autograd keeps) a and the new state per variable rather than a [B, H, H] tensor per operation
+
+    # Short term Depression
+    # X = z_x + (1 - z_x) X - delta_t U X h
+    X = torch.addcmul(z_x, X, torch.addcmul(1 - z_x, U, h_pre, value=-delta_t))
+
+    # Short term Facilitation
+    # U = Ucap z_u + (1 - z_u) U + delta_t Ucap (1 - U) h
+    a_u = torch.addcmul(1 - z_u, Ucap, h_pre, value=-delta_t)
+    U = torch.addcmul(torch.addcmul(Ucap * z_u, Ucap, h_pre, value=delta_t), U, a_u)
+    Ucapclone = Ucap.detach()
+    U = torch.clamp(U, min=Ucapclone, max=torch.ones_like(Ucapclone))
+
+    # System Equations
+    if X.dim() == 3:
+        # w is contracted against U X and h_t rather than multiplied into another [B, H, H] product
+        recurrent = torch.einsum("bjk, jk, bk -> bj", U * X, params['w'], h_t)
+    else:
+        recurrent = torch.matmul(U * X * h_t, params['w'].t())
+    h_t = torch.mul((1 - z_h), h_t) + z_h * torch.sigmoid(recurrent + torch.matmul(x, params['p'].t()) + params['b'].squeeze(-1))
+    # keep the synaptic state in its storage dtype (e.g. float16/bfloat16 for the rich cell)
+    return h_t, X.to(state[1].dtype), U.to(state[2].dtype)
+
+def stp_rich_step_(params, state, x):
+    '''
+    Rich step for inference only: X and U are updated in place, in their own dtype, using one [B, H, H] scratch buffer.
+    The input state is consumed, so it must not be needed afterwards (stp_step only calls this with autograd disabled)
+    '''
+    h_t, X, U = state
+    delta_t = params['delta_t']
+    z_h = params['z_h'].squeeze(-1)
+    z_x, z_u, Ucap = (params[k].to(X.dtype) for k in ('z_x', 'z_u', 'Ucap'))
+    h_pre = h_t.to(X.dtype).unsqueeze(-1)
+    buffer = torch.empty_like(X)
+
+    # Short term Depression
+    torch.mul(X, h_pre, out=buffer).mul_(U)
+    X.mul_(1 - z_x).add_(z_x).sub_(buffer, alpha=delta_t)
+
+    # Short term Facilitation
+    torch.neg(U, out=buffer).add_(1).mul_(h_pre).mul_(Ucap)
+    U.mul_(1 - z_u).add_(Ucap * z_u).add_(buffer, alpha=delta_t)
+    # clamp to [Ucap, 1] against the broadcast [H, H] Ucap rather than a per-batch copy
+    torch.maximum(U, Ucap, out=U).clamp_(max=1)
+
+    # System Equations
+    torch.mul(params['w'].to(X.dtype), U, out=buffer).mul_(X)
+    recurrent = torch.einsum("bjk, bk -> bj", buffer, h_t.to(X.dtype)).to(h_t.dtype)
+    h_t = torch.mul((1 - z_h), h_t) + z_h * torch.sigmoid(recurrent + torch.matmul(x, params['p'].t()) + params['b'].squeeze(-1))
+    return h_t, X, U
+
+def stp_scan(params, state, xs, checkpointed=False):
+    'xs is [B, T, D]; returns the [B, T, H] hidden trajectory and the final state'
+    return scan(stp_step, params, state, xs, checkpointed)
+
+'Synaptic history'
+# Once the rates are known, X and U follow per-synapse affine recurrences
+#     U_t = (1 - z_u - dt Ucap r_t) U_{t-1} + Ucap (z_u + dt r_t)
+#     X_t = (1 - z_x - dt U_{t-1} r_t) X_{t-1} + z_x
+# so their whole trajectories can be recomputed from a recorded v_t/h_t trajectory with an
+# associative scan of depth O(log T), instead of re-running the network step by step.
+
+def affine_scan(a, b):
+    'Returns A, B with s_t = A_t s_0 + B_t for s_t = a_t s_{t-1} + b_t along dim 1, in ceil(log2 T) steps'
+    A, B = a, b
+    offset = 1
+    while offset < a.size(1):
+        B = torch.cat((B[:, :offset], A[:, offset:] * B[:, :-offset] + B[:, offset:]), 1)
+        A = torch.cat((A[:, :offset], A[:, offset:] * A[:, :-offset]), 1)
+        offset *= 2
+    return A, B
+
+def synaptic_history(params, v_history, state, rate=torch.relu):
+    '''X and U after every step, [B, T, H] (or [B, T, H, H] for the rich STP cell), from the
+    recorded v_t (or h_t) after every step, v_history [B, T, H], and the initial state (v_t, X, U).
+    rate maps v_t to r_t: torch.relu for Dale_CB_STP, the identity for STP.'''
+    v_t, X, U = state
+    delta_t = params['delta_t']
+    # step t uses the rate before the update, i.e. of v_{t-1}
+    r = rate(torch.cat((v_t.unsqueeze(1), v_history[:, :-1]), 1))
+    if X.dim() == 3:
+        z_x, z_u, Ucap = params['z_x'], params['z_u'], params['Ucap']
+        r = r.unsqueeze(-1)
+    else:
+        z_x, z_u, Ucap = params['z_x'].squeeze(-1), params['z_u'].squeeze(-1), params['Ucap'].squeeze(-1)
+
+    a_u = 1 - z_u - delta_t * Ucap * r
+    # U stays within [Ucap, 1] without the clamp as long as r_t >= 0 and the update is monotone
+    # in U; otherwise the clamp may bind and the recurrence is not affine, so step through it
+    Ucapclone = Ucap.detach()
+    if (r < 0).any() or (a_u < 0).any() or (U < Ucapclone).any() or (U > 1).any():
+        return synaptic_history_sequential(params, r, X, U)
+
+    A, B = affine_scan(a_u, Ucap * (z_u + delta_t * r))
+    U_history = A * U.unsqueeze(1) + B
+    U_before = torch.cat((U.unsqueeze(1), U_history[:, :-1]), 1)
+    A, B = affine_scan(1 - z_x - delta_t * U_before * r, z_x.expand_as(U_before))
+    X_history = A * X.unsqueeze(1) + B
+    return X_history, U_history
+
+def synaptic_history_sequential(params, r, X, U):
+    'Step-by-step fallback of synaptic_history, given the rates used at every step'
+    delta_t = params['delta_t']
+    if X.dim() == 3:
+        z_x, z_u, Ucap = params['z_x'], params['z_u'], params['Ucap']
+    else:
+        z_x, z_u, Ucap = params['z_x'].squeeze(-1), params['z_u'].squeeze(-1), params['Ucap'].squeeze(-1)
+    Ucapclone = Ucap.detach()
+    X_history = []
+    U_history = []
+    for r_t in r.unbind(1):
+        X = z_x + torch.mul((1 - z_x), X) - delta_t * U * X * r_t
+        U = Ucap * z_u + torch.mul((1 - z_u), U) + delta_t * Ucap * (1 - U) * r_t
+        U = torch.clamp(U, min=Ucapclone, max=torch.ones_like(Ucapclone))
+        X_history.append(X)
+        U_history.append(U)
+    return torch.stack(X_history, 1), torch.stack(U_history, 1)
+
+def dale_cb_stp_history(params, state, xs, v_history):
+    '''X, U and z_t after every step of a Dale CB STP sequence, each [B, T, H], from its inputs xs [B, T, D],
+    the recorded v_t after every step v_history [B, T, H] and the initial state (v_t, X, U)'''
+    X_history, U_history = synaptic_history(params, v_history, state)
+    r = torch.relu(torch.cat((state[0].unsqueeze(1), v_history[:, :-1]), 1))
+    z_history = params['dt'] * torch.sigmoid(torch.matmul(r, params['K'].t()) + torch.matmul(xs, params['P_z'].t()) + params['b_z'].squeeze(-1))
+    return X_history, U_history, z_history
+
+'Model Definition'
+class Dale_CB_STPcell(nn.Module):
+    def __init__(self, input_size, hidden_size, num_layers):
+        super(Dale_CB_STPcell, self).__init__()
+        self.hidden_size = hidden_size
+
+        ### Parameters ###
+        # voltage gate v_t
+        self.P = torch.nn.Parameter(torch.empty(self.hidden_size, input_size))
+        self.b_v = torch.nn.Parameter(torch.zeros(self.hidden_size, 1))
+
+        # Update gate z_t
+        # K and W are unbounded free parameters
+        # C represents  current based portion of connectivity
+        while True:
+            self.K = torch.nn.Parameter(self.init_dale(self.hidden_size, self.hidden_size))
+            self.C = torch.nn.Parameter(self.init_dale(self.hidden_size, self.hidden_size))
+            nse_K = self.NSE(self.K)
+            nse_C = self.NSE(self.C)
+            if nse_K > 0.90 and nse_C > 0.90:
+                break
+        self.P_z = torch.nn.Parameter(torch.empty(self.hidden_size, input_size))
+        self.b_z = torch.nn.Parameter(torch.empty(self.hidden_size, 1))
+        # Potentials are initialised with right signs
+        self.e_e = torch.nn.Parameter(torch.rand(1))
+        self.e_i = torch.nn.Parameter(-torch.rand(1))
+
+        # dt is a constant
+        self.dt = nn.Parameter(torch.tensor(0.1), requires_grad = False)
+
+        ### Nonlinear functions ###
+        self.sigmoid = nn.Sigmoid()
+        self.softplus = nn.Softplus()
+        self.relu = nn.ReLU()
+
+        ### Initialisation ###
+        glorot_init = lambda w: nn.init.uniform_(w, a=-(1/math.sqrt(hidden_size)), b=(1/math.sqrt(hidden_size)))
+        positive_glorot_init = lambda w: nn.init.uniform_(w, a=0, b=(1/math.sqrt(hidden_size)))
+
+        # initialise matrices
+        # P and P_z are unconstrained
+        for w in self.P_z, self.P:
+            glorot_init(w)
+        for w in self.K, self.C:
+            positive_glorot_init(w)
+        # init b_z to be log 1/99
+        nn.init.constant_(self.b_z, torch.log(torch.tensor(1/99)))
+
+        ### STP Model ###
+        self.delta_t = 1
+        self.z_min = 0.001
+        self.z_max = 0.1
+
+        # Short term Depression parameters
+        self.c_x = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
+
+        # Short term Facilitation parameters
+        self.c_u = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
+        self.c_U = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
+
+        # State initialisations
+        self.state = self.init_state(1)
+
+    def init_dale(self, rows, cols):
+        # Dale's law with equal excitatory and inhibitory neurons
+        exci = torch.empty((rows, cols//2)).exponential_(1.0)
+        inhi = -torch.empty((rows, cols//2)).exponential_(1.0)
+        weights = torch.cat((exci, inhi), dim=1)
+        weights = self.adjust_spectral(weights)
+        return weights
+
+    def adjust_spectral(self, weights, desired_radius=1.5):
+        values= torch.linalg.svdvals(weights)
+        radius = values.abs().max()
+        return weights * (desired_radius / radius)
+
+    def NSE(self, weights):
+        values = torch.linalg.svdvals(weights)
+        normalised_v = values/sum(values)
+        H = -1/torch.log(torch.tensor(self.hidden_size)) * torch.sum(normalised_v * torch.log(normalised_v))
+        return H
+
+    def init_state(self, batch_size):
+        'v_t = 0, X = 1 and U = Ucap for every neuron, each of shape [batch_size, hidden_size]'
+        device = self.P.device
+        v_t = torch.zeros(batch_size, self.hidden_size, device=device)
+        X = torch.ones(batch_size, self.hidden_size, device=device)
+        Ucap = (0.9 * self.sigmoid(self.c_U)).detach()
+        U = Ucap.t().repeat(batch_size, 1)
+        return v_t, X, U
+
+    def get_params(self):
+        return dale_cb_stp_params(self)
+
+    @property
+    def v_t(self):
+        return self.state[0]
+
+    @property
+    def r_t(self):
+        return self.relu(self.v_t)
+
+    @property
+    def excitatory(self):
+        excitatory = self.v_t[:, :self.hidden_size//2]
+        return torch.cat((excitatory, torch.zeros_like(excitatory)), 1)
+
+    def forward(self, x):
+        'x is [B, D]'
+        self.state = dale_cb_stp_step(self.get_params(), self.state, x)
+        return self.v_t
+
+class Dale_CB_STP_batch(nn.Module):
+    def __init__(self, input_size, hidden_size, num_layers, batch_first=True, checkpointed=False):
+        super(Dale_CB_STP_batch, self).__init__()
+        self.rnncell = Dale_CB_STPcell(input_size, hidden_size, num_layers)
+        self.batch_first = batch_first
+        # recompute the recurrence in sqrt(T) segments during backward instead of storing every step
+        self.checkpointed = checkpointed
+
+    def forward(self, x, state=None):
+        if self.batch_first == False:
+            x = torch.transpose(x, 0, 1)
+        if state is None:
+            state = self.rnncell.init_state(x.size(0))
+        outputs, self.rnncell.state = dale_cb_stp_scan(self.rnncell.get_params(), state, x, self.checkpointed)
+        return self.rnncell.excitatory
+
+class Dale_CB_STP(nn.Module):
+
+    def __init__(self, input_size, hidden_size, num_layers, num_classes, checkpointed=False):
+        super(Dale_CB_STP, self).__init__()
+        self.hidden_size = hidden_size
+        self.num_layers = num_layers
+        self.lstm = Dale_CB_STP_batch(input_size, hidden_size, num_layers, checkpointed=checkpointed)
+        self.fc = nn.Linear(hidden_size, num_classes)
+
+    def forward(self, x, state=None, return_state=False):
+        # Passing in the input and initial state (fresh unless given) into the model and obtaining outputs
+        out = self.lstm(x, state)
+        out = self.fc(out)
+        if return_state:
+            return out.squeeze(-1), self.lstm.rnncell.state
+        return out.squeeze(-1)
+
+class STPCell(nn.Module):
+    def __init__(self, input_size, hidden_size, complexity, e_h, alpha, state_dtype=torch.float32):
+        super(STPCell, self).__init__()
+        self.input_size = input_size
+        self.hidden_size = hidden_size
+        self.complexity = complexity
+        # storage dtype of the synaptic state X and U; float16/bfloat16 halves the rich [B, H, H] state
+        self.state_dtype = state_dtype
+
+        # System variables
+        self.e_h = e_h
+
+        # Short term Plasticity variables
+        self.delta_t = 1
+        self.alpha = alpha
+        self.e_ux = self.alpha * self.e_h
+        self.z_min = 0.001
+        self.z_max = 0.1
+
+        if self.complexity == "rich":
+            synapse_shape = (self.hidden_size, self.hidden_size)
+        if self.complexity == "poor":
+            synapse_shape = (self.hidden_size, 1)
+
+        # Short term Depression parameters
+        self.c_x = torch.nn.Parameter(torch.rand(*synapse_shape))
+
+        # Short term Facilitation parameters
+        self.c_u = torch.nn.Parameter(torch.rand(*synapse_shape))
+        self.c_U = torch.nn.Parameter(torch.rand(*synapse_shape))
+
+        # System parameters
+        self.c_h = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
+        self.w = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
+        self.p = torch.nn.Parameter(torch.rand(self.hidden_size, self.input_size))
+        self.b = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
+
+        for name, param in self.named_parameters():
+            nn.init.uniform_(param, a=-(1/math.sqrt(hidden_size)), b=(1/math.sqrt(hidden_size)))
+
+        # State initialisations
+        self.state = self.init_state(1)
+
+    def init_state(self, batch_size):
+        'h_t = 0, X = 1 and U = Ucap; X and U are [B, H, H] when rich, [B, H] when poor'
+        device = self.w.device
+        h_t = torch.zeros(batch_size, self.hidden_size, device=device)
+        Ucap = (0.9 * torch.sigmoid(self.c_U)).detach()
+        if self.complexity == "rich":
+            X = torch.ones(batch_size, self.hidden_size, self.hidden_size, device=device, dtype=self.state_dtype)
+            U = Ucap.to(self.state_dtype).repeat(batch_size, 1, 1)
+        if self.complexity == "poor":
+            X = torch.ones(batch_size, self.hidden_size, device=device, dtype=self.state_dtype)
+            U = Ucap.t().to(self.state_dtype).repeat(batch_size, 1)
+        return h_t, X, U
+
+    def get_params(self):
+        return stp_params(self)
+
+    @property
+    def h_t(self):
+        return self.state[0]
+
+    def forward(self, x):
+        'x is [B, D]'
+        self.state = stp_step(self.get_params(), self.state, x)
+        return self.h_t
+
+class STP(nn.Module):
+    def __init__(self, input_size, hidden_size, complexity, e_h, alpha, checkpointed=False, state_dtype=torch.float32):
+        super(STP, self).__init__()
+        self.stpcell = STPCell(input_size, hidden_size, complexity, e_h, alpha, state_dtype)
+        # recompute the recurrence in sqrt(T) segments during backward instead of storing every step
+        self.checkpointed = checkpointed
+
+    def forward(self, x, state=None):
+        if state is None:
+            state = self.stpcell.init_state(x.size(0))
+        outputs, self.stpcell.state = stp_scan(self.stpcell.get_params(), state, x, self.checkpointed)
+        return self.stpcell.h_t
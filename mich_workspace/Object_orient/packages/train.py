@@ -8,6 +8,8 @@ from sklearn.model_selection import StratifiedShuffleSplit
 class Train_and_track:
     def __init__(self, model, learning_rate, batch_size, sequence_length, input_size, subset_ratio=0.1):
         self.model = model
+        # batches are moved to the device the model was put on
+        self.device = next(model.parameters()).device
         self.learning_rate = learning_rate
         self.batch_size = batch_size
         self.subset_ratio = subset_ratio
@@ -42,8 +44,8 @@ class Train_and_track:
         total = 0
         with torch.no_grad():
             for images, labels in loaders['test']:
-                images = images.reshape(-1, self.sequence_length, self.input_size).to(device)
-                labels = labels.to(device)
+                images = images.reshape(-1, self.sequence_length, self.input_size).to(self.device)
+                labels = labels.to(self.device)
                 outputs = self.model(images)
                 _, predicted = torch.max(outputs.data, 1)
                 total += labels.size(0)
@@ -51,7 +53,21 @@ class Train_and_track:
 
         return 100 * correct / total
 
-    def train(self, num_epochs, loaders, patience=5, min_delta=0.01):
+    def forward_truncated(self, images, tbptt_steps):
+        '''Runs the sequence in chunks of tbptt_steps and returns the output of the last chunk.
+
+        The loss only depends on the final output, so backward is truncated to the last chunk: the
+        earlier chunks just advance the state, without a graph, and each batch still gets one backward
+        pass and one optimizer step. Needs a model with forward(x, state, return_state=True).'''
+        starts = list(range(0, images.size(1), tbptt_steps))
+        state = None
+        with torch.no_grad():
+            for start in starts[:-1]:
+                _, state = self.model(images[:, start:start + tbptt_steps], state, return_state=True)
+        outputs, _ = self.model(images[:, starts[-1]:], state, return_state=True)
+        return outputs
+
+    def train(self, num_epochs, loaders, patience=5, min_delta=0.01, tbptt_steps=None):
         self.model.train()
         total_step = len(loaders['train'])
         train_acc = []
@@ -60,10 +76,13 @@ class Train_and_track:
 
         for epoch in range(num_epochs):
             for i, (images, labels) in enumerate(loaders['train']):
-                images = images.reshape(-1, self.sequence_length, self.input_size).to(device)
-                labels = labels.to(device)
+                images = images.reshape(-1, self.sequence_length, self.input_size).to(self.device)
+                labels = labels.to(self.device)
                 self.model.train()
-                outputs = self.model(images)
+                if tbptt_steps is None:
+                    outputs = self.model(images)
+                else:
+                    outputs = self.forward_truncated(images, tbptt_steps)
                 loss = self.loss_func(outputs, labels)
 
                 self.model_optimizer.zero_grad()
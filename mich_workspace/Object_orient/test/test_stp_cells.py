@@ -0,0 +1,116 @@
+'''
+test_stp_cells.py
+Tests synaptic_history against stepping the STP cells through the same sequence
+
+While the rates are non-negative and U starts in [Ucap, 1] the clamp on U never
+binds and the history comes from the associative scan; otherwise it must fall
+back to synaptic_history_sequential and still match the clamped recurrence.
+'''
+
+import os
+import sys
+import torch
+
+OBJECT_ORIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, OBJECT_ORIENT_PATH)
+from packages import stp_cells
+from packages.stp_cells import (Dale_CB_STPcell, STPCell, dale_cb_stp_step, dale_cb_stp_history,
+                                stp_step, synaptic_history, synaptic_history_sequential)
+
+BATCH_SIZE = 5
+SEQUENCE_LENGTH = 50
+INPUT_SIZE = 4
+
+def make_inputs():
+    torch.manual_seed(0)
+    return torch.rand(BATCH_SIZE, SEQUENCE_LENGTH, INPUT_SIZE)
+
+def assert_close(a, b):
+    assert torch.allclose(a, b, atol=1e-5), (a - b).abs().max().item()
+
+def count_fallbacks(function, *args, **kwargs):
+    'Calls function and returns its result and how often it fell back to synaptic_history_sequential'
+    n_calls = [0]
+    def counted(*args, **kwargs):
+        n_calls[0] += 1
+        return synaptic_history_sequential(*args, **kwargs)
+    stp_cells.synaptic_history_sequential = counted
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        stp_cells.synaptic_history_sequential = synaptic_history_sequential
+    return result, n_calls[0]
+
+def run_steps(step, params, state, xs):
+    'States after every step, stacked along dim 1, and the initial state'
+    steps = [state]
+    for x in xs.unbind(1):
+        # the rich STP step updates X and U in place without grad, so step on a copy
+        steps.append(step(params, tuple(s.clone() for s in steps[-1]), x))
+    return tuple(torch.stack(s, 1) for s in zip(*steps[1:])), steps[0]
+
+def clamped_history(params, r, X, U):
+    'Reference X and U histories of the STP recurrence, clamping U to [Ucap, 1] after every step'
+    delta_t = params['delta_t']
+    z_x, z_u, Ucap = (params[k].squeeze(-1) for k in ('z_x', 'z_u', 'Ucap'))
+    X_history, U_history = [], []
+    for r_t in r.unbind(1):
+        X = z_x + (1 - z_x) * X - delta_t * U * X * r_t
+        U = torch.minimum(torch.maximum(Ucap * z_u + (1 - z_u) * U + delta_t * Ucap * (1 - U) * r_t, Ucap), torch.ones_like(Ucap))
+        X_history.append(X)
+        U_history.append(U)
+    return torch.stack(X_history, 1), torch.stack(U_history, 1)
+
+@torch.no_grad()
+def test_dale_cb_stp_history_matches_steps():
+    xs = make_inputs()
+    # the weight initialisation retries until the normalised SVD entropy is high enough, which needs a few dozen units
+    cell = Dale_CB_STPcell(INPUT_SIZE, 48, 1)
+    params = cell.get_params()
+    (v_t, X, U), state = run_steps(dale_cb_stp_step, params, cell.init_state(BATCH_SIZE), xs)
+    r = torch.relu(torch.cat((state[0].unsqueeze(1), v_t[:, :-1]), 1))
+    z_t = params['dt'] * torch.sigmoid(torch.matmul(r, params['K'].t()) + torch.matmul(xs, params['P_z'].t()) + params['b_z'].squeeze(-1))
+    history, n_fallbacks = count_fallbacks(dale_cb_stp_history, params, state, xs, v_t)
+    assert n_fallbacks == 0
+    for a, b in zip((X, U, z_t), history):
+        assert_close(a, b)
+    for a, b in zip((X, U), synaptic_history_sequential(params, r, state[1], state[2])):
+        assert_close(a, b)
+
+@torch.no_grad()
+def test_stp_history_matches_steps():
+    xs = make_inputs()
+    for complexity in ('poor', 'rich'):
+        cell = STPCell(INPUT_SIZE, 16, complexity, 0.9, 0.1)
+        # the poor cell uses c_h as its leak, keep it in (0, 1) so the untrained cell does not diverge
+        cell.c_h.uniform_(0, 1)
+        params = cell.get_params()
+        (h_t, X, U), state = run_steps(stp_step, params, cell.init_state(BATCH_SIZE), xs)
+        history, n_fallbacks = count_fallbacks(synaptic_history, params, h_t, state, rate=lambda h: h)
+        assert n_fallbacks == 0
+        for a, b in zip((X, U), history):
+            assert_close(a, b)
+
+@torch.no_grad()
+def test_binding_clamp_falls_back_to_steps():
+    torch.manual_seed(0)
+    cell = STPCell(INPUT_SIZE, 16, 'poor', 0.9, 0.1)
+    params = cell.get_params()
+    h_0, X, U = cell.init_state(BATCH_SIZE)
+    Ucap = params['Ucap'].squeeze(-1)
+    # negative rates push U below Ucap, and a U outside [Ucap, 1] is clamped on the first step
+    h_history = 4 * torch.rand(BATCH_SIZE, SEQUENCE_LENGTH, 16) - 2
+    for state in ((h_0, X, U), (h_0, X, U - 0.5)):
+        r = torch.cat((state[0].unsqueeze(1), h_history[:, :-1]), 1)
+        X_ref, U_ref = clamped_history(params, r, state[1], state[2])
+        assert (U_ref == Ucap).any()
+        history, n_fallbacks = count_fallbacks(synaptic_history, params, h_history, state, rate=lambda h: h)
+        assert n_fallbacks == 1
+        for a, b in zip((X_ref, U_ref), history):
+            assert_close(a, b)
+
+if __name__ == '__main__':
+    test_dale_cb_stp_history_matches_steps()
+    test_stp_history_matches_steps()
+    test_binding_clamp_falls_back_to_steps()
+    print('Passed.')
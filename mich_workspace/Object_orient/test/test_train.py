@@ -0,0 +1,66 @@
+'''
+test_train.py
+Tests the truncated-BPTT option of Train_and_track.train
+
+With tbptt_steps covering the whole sequence, truncation must reproduce the
+plain update exactly; with shorter chunks every batch still takes a single
+optimizer step, on the loss of the final output.
+'''
+
+import copy
+import os
+import sys
+import torch
+from torch.utils.data import DataLoader, TensorDataset
+
+OBJECT_ORIENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, OBJECT_ORIENT_PATH)
+from packages.simple_GRU import RNN
+from packages.train import Train_and_track
+
+SEQUENCE_LENGTH = 12
+INPUT_SIZE = 3
+HIDDEN_SIZE = 16
+BATCH_SIZE = 10
+
+def make_loaders():
+    torch.manual_seed(0)
+    images = torch.randn(40, SEQUENCE_LENGTH, INPUT_SIZE)
+    labels = torch.randint(0, 10, (40,))
+    dataset = TensorDataset(images, labels)
+    return {'train': DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=False),
+            'test': DataLoader(dataset, batch_size=BATCH_SIZE, shuffle=False)}
+
+def train_copy(model, tbptt_steps):
+    model = copy.deepcopy(model)
+    trainer = Train_and_track(model, 0.01, BATCH_SIZE, SEQUENCE_LENGTH, INPUT_SIZE)
+    n_steps = [0]
+    step = trainer.model_optimizer.step
+    def counted_step(*args, **kwargs):
+        n_steps[0] += 1
+        return step(*args, **kwargs)
+    trainer.model_optimizer.step = counted_step
+    trainer.train(2, make_loaders(), tbptt_steps=tbptt_steps)
+    return model, n_steps[0]
+
+def test_full_window_matches_plain_update():
+    torch.manual_seed(0)
+    model = RNN(INPUT_SIZE, HIDDEN_SIZE, 1, 10)
+    plain, _ = train_copy(model, None)
+    for tbptt_steps in (SEQUENCE_LENGTH, 2 * SEQUENCE_LENGTH):
+        truncated, _ = train_copy(model, tbptt_steps)
+        for a, b in zip(plain.parameters(), truncated.parameters()):
+            assert torch.equal(a, b)
+
+def test_one_step_per_batch():
+    torch.manual_seed(0)
+    model = RNN(INPUT_SIZE, HIDDEN_SIZE, 1, 10)
+    _, n_plain = train_copy(model, None)
+    truncated, n_truncated = train_copy(model, 4)
+    assert n_plain == n_truncated == 2 * 40 // BATCH_SIZE
+    assert any(not torch.equal(a, b) for a, b in zip(model.parameters(), truncated.parameters()))
+
+if __name__ == '__main__':
+    test_full_window_matches_plain_update()
+    test_one_step_per_batch()
+    print('Passed.')
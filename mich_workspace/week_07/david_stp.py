@@ -2,6 +2,12 @@ import torch
 import math
 import matplotlib.pyplot as plt
 import numpy as np 
+import os
+import sys
+
+# shared helpers live in Object_orient/packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Object_orient'))
+from packages.stp_cells import STP
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -56,198 +62,24 @@ num_classes = 10
 batch_size = 100
 num_epochs = 2
 learning_rate = 0.01
+# recompute the STP recurrence in sqrt(T) segments during backward instead of storing every step
+checkpointed = False
+# storage dtype of the synaptic state X, U; torch.float16/bfloat16 halves the rich [batch, hidden, hidden] state
+state_dtype = torch.float32
 
 
-class STPCell(nn.Module):
-    def __init__(self, input_size, hidden_size, complexity, e_h, alpha):
-        super(STPCell, self).__init__()
-        self.input_size = input_size        
-        self.hidden_size = hidden_size
-        self.complexity = complexity 
-        sigmoid = nn.Sigmoid() 
-        self.ones = torch.ones(self.hidden_size, self.hidden_size)
-        self.batch_size = batch_size 
-        self.forprintingX = []
-        self.forprintingU = []
-        self.forprintingh = []
-
-        if self.complexity == "rich":
-            # System variables 
-            self.e_h = e_h
-
-            # Short term Plasticity variables 
-            self.delta_t = 1
-            self.alpha = alpha
-            self.e_ux = self.alpha * self.e_h
-            self.z_min = 0.001
-            self.z_max = 0.1
-
-            # Short term Depression parameters  
-            self.c_x = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
-
-            # Short term Facilitation parameters
-            self.c_u = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
-            self.c_U = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
-            
-            # System parameters            
-            self.c_h = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            self.w = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
-            self.p = torch.nn.Parameter(torch.rand(self.hidden_size, self.input_size))  
-            self.b = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            
-            # State initialisations
-            self.h_t = torch.zeros(1, self.hidden_size, dtype=torch.float32)
-            self.X = torch.ones(self.hidden_size, self.hidden_size, dtype=torch.float32)     
-            self.U = torch.full((self.hidden_size, self.hidden_size), 0.9, dtype=torch.float32)         
-            self.Ucap = 0.9 * sigmoid(self.c_U)
-            self.Ucapclone = self.Ucap.clone().detach()
-        if self.complexity == "poor":
-            # System variables 
-            self.e_h = e_h
-
-            # Short term Plasticity variables 
-            self.delta_t = 1
-            self.alpha = alpha
-            self.e_ux = self.alpha * self.e_h
-            self.z_min = 0.001
-            self.z_max = 0.1
-
-            # Short term Depression parameters  
-            self.c_x = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-
-            # Short term Facilitation parameters
-            self.c_u = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            self.c_U = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            
-            # System parameters
-            self.c_h = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            self.w = torch.nn.Parameter(torch.rand(self.hidden_size, self.hidden_size))
-            self.p = torch.nn.Parameter(torch.rand(self.hidden_size, self.input_size))
-            self.b = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
-            
-            # State initialisations
-            self.h_t = torch.zeros(1, self.hidden_size, dtype=torch.float32)
-            self.X = torch.ones(self.hidden_size, 1, dtype=torch.float32)
-            self.U = torch.full((self.hidden_size, 1), 0.9, dtype=torch.float32)   
-            self.Ucap = 0.9 * sigmoid(self.c_U)
-            self.Ucapclone = self.Ucap.clone().detach()
-        for name, param in self.named_parameters():
-            #print(name, param.size(), param)
-            nn.init.uniform_(param, a=-(1/math.sqrt(hidden_size)), b=(1/math.sqrt(hidden_size))) 
-
-    def forward(self, x):                 
-        if self.complexity == "rich":
-            if self.h_t.dim() == 3:
-                self.h_t = self.h_t[0]
-            self.h_t = torch.transpose(self.h_t, 0, 1)
-            x = torch.transpose(x, 0, 1)
-            sigmoid = nn.Sigmoid()
-            
-            # graph plotting 
-            '''self.forprintingX.append(self.X[20,11,24].item())
-            self.forprintingU.append(self.U[20,11,24].item())
-            self.forprintingh.append(self.h_t[11, 20].item())
-            if len(self.forprintingX) % (196*5) == 0:
-                self.forprintingX = []
-                self.forprintingU = []
-                self.forprintingh = []'''   
-
-            # Short term Depression 
-            self.z_x = self.z_min + (self.z_max - self.z_min) * sigmoid(self.c_x)
-            self.X = self.z_x + torch.mul((1 - self.z_x), self.X) - self.delta_t * self.U * torch.einsum("ijk, ji  -> ijk", self.X, self.h_t)
-
-            # Short term Facilitation 
-            self.z_u = self.z_min + (self.z_max - self.z_min) * sigmoid(self.c_u)    
-            self.Ucap = 0.9 * sigmoid(self.c_U)
-            self.U = self.Ucap * self.z_u + torch.mul((1 - self.z_u), self.U) + self.delta_t * self.Ucap * torch.einsum("ijk, ji  -> ijk", (1 - self.U), self.h_t)
-            self.Ucapclone = self.Ucap.clone().detach() 
-            self.U = torch.clamp(self.U, min=self.Ucapclone.repeat(self.U.size(0), 1, 1).to(device), max=torch.ones_like(self.Ucapclone.repeat(self.U.size(0), 1, 1).to(device)))
-
-            # System Equations 
-            self.z_h = self.e_h * sigmoid(self.c_h) 
-
-            x = torch.transpose(x, 0, 1)
-            self.h_t = torch.mul((1 - self.z_h), self.h_t) + self.z_h * sigmoid(torch.einsum("ijk, ki  -> ji", (self.w * self.U * self.X), self.h_t) + torch.matmul(self.p, x) + self.b)
-            #self.h_t = torch.matmul(self.w, self.h_t) + torch.matmul(self.p, x) + self.b
-            self.h_t = torch.transpose(self.h_t, 0, 1)
-            return self.h_t   
-
-        if self.complexity == "poor":
-            if self.h_t.dim() == 3:
-                self.h_t = self.h_t[0]
-            self.h_t = torch.transpose(self.h_t, 0, 1)
-            x = torch.transpose(x, 0, 1)
-            sigmoid = nn.Sigmoid()
-            
-            # Short term Depression 
-            self.z_x = self.z_min + (self.z_max - self.z_min) * sigmoid(self.c_x)
-
-            a = self.delta_t * self.U * self.X * self.h_t
-
-        
-            self.X = self.z_x + torch.mul((1 - self.z_x), self.X) - self.delta_t * self.U * self.X * self.h_t
-
-            # Short term Facilitation 
-            self.z_u = self.z_min + (self.z_max - self.z_min) * sigmoid(self.c_u)    
-            self.Ucap = 0.9 * sigmoid(self.c_U)
-            self.U = self.Ucap * self.z_u + torch.mul((1 - self.z_u), self.U) + self.delta_t * self.Ucap * (1 - self.U) * self.h_t
-            self.Ucapclone = self.Ucap.clone().detach()
-            self.U = torch.clamp(self.U, min=self.Ucapclone.repeat(1, x.size(0)).to(device), max=torch.ones_like(self.Ucapclone.repeat(1, x.size(0)).to(device)))
-            # graph plotting 
-            '''self.forprintingX.append(self.X[20,5].item())
-            self.forprintingU.append(self.U[20,5].item())
-            if len(self.forprintingX) % 140 == 0:
-                self.forprintingX = []
-                self.forprintingU = []'''
-
-            # System Equations 
-            # self.z_h = self.e_h * sigmoid(self.c_h) 
-            #a = self.w * self.U * self.X
-            #print("size of a", a.size())
-            #print("size of h_t", self.h_t.size())
-            #print("size of a * h_t", torch.matmul(a, self.h_t).size())
-            #print("size of x", x.size())
-            x = torch.transpose(x, 0, 1)
-            self.h_t = torch.mul((1 - self.c_h), self.h_t) + self.c_h * sigmoid(torch.matmul(self.w, (self.U * self.X * self.h_t)) + torch.matmul(self.p, x) + self.b)
-            #self.h_t = torch.matmul(self.w, self.h_t) + torch.matmul(self.p, x) + self.b
-            self.h_t = torch.transpose(self.h_t, 0, 1)
-            return self.h_t
-
-class STP(nn.Module):
-    def __init__(self, input_size, hidden_size, complexity, e_h, alpha): 
-        super(STP, self).__init__()
-        self.stpcell = STPCell(input_size, hidden_size, complexity, e_h, alpha).to(device)
-
-    def forward(self, x):
-        for n in range(x.size(1)):
-            x_slice = torch.transpose(x[:,n,:], 0, 1)
-            self.stpcell(x_slice)
-        return self.stpcell.h_t                                   
-            
 class RNN(nn.Module):
     
     def __init__(self, input_size, hidden_size, num_layers, num_classes):
         super(RNN, self).__init__()
         self.hidden_size = hidden_size
         self.num_layers = num_layers
-        self.lstm = STP(input_size, hidden_size, "rich", 0.9, 0.1).to(device)
+        self.lstm = STP(input_size, hidden_size, "rich", 0.9, 0.1, checkpointed, state_dtype).to(device)
         self.fc = nn.Linear(hidden_size, num_classes).to(device)
         self.update_number = 0
         pass
 
     def forward(self, x):
-        # Set initial hidden and cell states 
-        if self.lstm.stpcell.complexity == "rich":
-            self.lstm.stpcell.h_t = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device)
-            self.lstm.stpcell.X = torch.ones(x.size(0), self.hidden_size, self.hidden_size, dtype=torch.float32).to(device)
-            #self.lstm.stpcell.U = torch.full((x.size(0), self.hidden_size, self.hidden_size), 0.9, dtype=torch.float32).to(device)
-            self.lstm.stpcell.U = (self.lstm.stpcell.Ucapclone.repeat(x.size(0), 1, 1)).to(device)
-        if self.lstm.stpcell.complexity == "poor":
-            self.lstm.stpcell.h_t = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device) 
-            self.lstm.stpcell.X = torch.ones(self.hidden_size, x.size(0), dtype=torch.float32).to(device)
-            #self.lstm.stpcell.U = torch.full((self.hidden_size, x.size(0)), 0.9, dtype=torch.float32).to(device)
-            self.lstm.stpcell.U = (self.lstm.stpcell.Ucapclone.repeat(1, x.size(0))).to(device)
-            #torch.full((2, 3), 3.141592)
         '''self.update_number += 1 
         if self.update_number % 50 == 0: 
             plt.plot(self.lstm.stpcell.forprintingX)
@@ -256,8 +88,8 @@ class RNN(nn.Module):
             plt.legend(["X","U","h_t"])
             plt.show()'''
         #c0 = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device)
-        # Passing in the input and hidden state into the model and  obtaining outputs
-        out = self.lstm(x)  # out: tensor of shape (batch_size, seq_length, hidden_size)
+        # Passing in the input and a fresh initial state into the model and obtaining outputs
+        out = self.lstm(x)  # out: tensor of shape (batch_size, hidden_size)
         #Reshaping the outputs such that it can be fit into the fully connected layer
         out = self.fc(out)
         return out
@@ -6,6 +6,12 @@
 import torch
 import math
 import numpy as np
+import os
+import sys
+
+# shared helpers live in Object_orient/packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Object_orient'))
+from packages.sequence_encoding import SequenceEncoder, cache_dataset
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -20,29 +26,10 @@ print(torch.cuda.device_count()) # returns 1 in my case
 # get the name of the device
 print(torch.cuda.get_device_name(0)) # good old Tesla K80
 
-def snake_scan(img):
-    'Converts a 32x32 image to a 32x96 array with snake-like row ordering'
-    if len(img.shape) != 3:
-        raise ValueError('Input image must be a 3D array')
-    
-    channels, rows, cols = img.shape
-    snake = np.zeros((rows, cols * channels), dtype=img.dtype)
-    for r in range(rows):
-        row_data = img[:, r, :].flatten()  # Flattening each row into a 1D array of 96 elements
-        if r % 2 == 1:
-            row_data = row_data[::-1]  # Reversing the order for alternate rows
-        snake[r] = row_data
-    return snake
-
 from torchvision import datasets
-from torchvision import transforms
 from torchvision.transforms import ToTensor
-from torchvision.transforms import Lambda
 
-transform = transforms.Compose([
-    ToTensor(),
-    Lambda(lambda x: torch.tensor(snake_scan(x.numpy())))
-])
+transform = ToTensor()
 
 train_data = datasets.CIFAR10(
     root = 'data',
@@ -57,6 +44,10 @@ test_data = datasets.CIFAR10(
     download = False,
     transform = transform
 )
+# snake scan the whole dataset once, in batches, instead of per image every epoch
+snake = SequenceEncoder((3, 32, 32), 3*32, scan='snake')
+train_data = cache_dataset(train_data, snake.scan)
+test_data = cache_dataset(test_data, snake.scan)
 
 
 from torch.utils.data import DataLoader
@@ -6,6 +6,12 @@
 import torch
 import math
 import numpy as np
+import os
+import sys
+
+# shared helpers live in Object_orient/packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Object_orient'))
+from packages.stp_cells import dale_cb_stp_params, dale_cb_stp_step, dale_cb_stp_scan, dale_cb_stp_history
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -96,6 +102,8 @@ batch_size = 40
 num_epochs = 3
 learning_rate = 0.01
 stride_number = 4
+# recompute the STP recurrence in sqrt(T) segments during backward instead of storing every step
+checkpointed = False
 
 from torch.utils.data import DataLoader
 loaders = {
@@ -143,9 +151,6 @@ class Dale_CB_STPcell(nn.Module):
         self.e_e = torch.nn.Parameter(torch.rand(1))
         self.e_i = torch.nn.Parameter(-torch.rand(1))
 
-        # Firing rate, Scaling factor and time step initialization
-        self.v_t = torch.zeros(1, self.hidden_size, dtype=torch.float32)
-
         # dt is a constant
         self.dt = nn.Parameter(torch.tensor(0.1), requires_grad = False)
 
@@ -180,10 +185,9 @@ class Dale_CB_STPcell(nn.Module):
         self.c_U = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
         
         # State initialisations
-        self.X = torch.ones(self.hidden_size, 1, dtype=torch.float32).to(device)
-        self.U = torch.full((self.hidden_size, 1), 0.9, dtype=torch.float32).to(device)
         self.Ucap = 0.9 * self.sigmoid(self.c_U)
         self.Ucapclone = self.Ucap.clone().detach() 
+        self.state = self.init_state(1)
 
     def init_dale(self, rows, cols):
         # Dale's law with equal excitatory and inhibitory neurons
@@ -199,95 +203,76 @@ class Dale_CB_STPcell(nn.Module):
         return weights * (desired_radius / radius)
         
 
+    def init_state(self, batch_size):
+        'v_t = 0, X = 1 and U = Ucap of the last step for every neuron, each of shape [batch_size, hidden_size]'
+        device = self.P.device
+        v_t = torch.zeros(batch_size, self.hidden_size, device=device)
+        X = torch.ones(batch_size, self.hidden_size, device=device)
+        U = self.Ucapclone.t().repeat(batch_size, 1).to(device)
+        return v_t, X, U
+
+    def get_params(self):
+        'Effective parameters for the packages.stp_cells functions; W, z_x, z_u and Ucap are kept for the weight analysis'
+        params = dale_cb_stp_params(self)
+        self.W, self.z_x, self.z_u, self.Ucap = params['W'], params['z_x'], params['z_u'], params['Ucap']
+        self.Ucapclone = self.Ucap.clone().detach()
+        return params
+
+    @property
+    def v_t(self):
+        return self.state[0]
+
     @property
     def r_t(self):
         return self.relu(self.v_t)
 
-    def forward(self, x):        
-        if self.v_t.dim() == 3:           
-            self.v_t = self.v_t[0]
-        self.v_t = torch.transpose(self.v_t, 0, 1)
-
-        self.X_history = []
-        self.U_history = []
-        self.v_t_history = []
-        self.z_t_history = []
-
-        ### Constraints###
-        K = self.softplus(self.K)
-        C = self.softplus(self.C)
-        # W is constructed using e*(K+C)
-        W_E = self.e_e * (K[:, :self.hidden_size//2] + C[:, :self.hidden_size//2])
-        W_I = self.e_i * (K[:, self.hidden_size//2:] + C[:, self.hidden_size//2:])
-        # print to see which device the tensor is on
-        # If sign of W do not obey Dale's law, then these terms to be 0
-        W_E = self.relu(W_E)
-        W_I = -self.relu(-W_I)
-        W = torch.cat((W_E, W_I), 1)
-        self.W = W
-
-        ### STP model ###
-        x = torch.transpose(x, 0, 1)
-        
-        # Short term Depression 
-        self.z_x = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_x)
-        self.X = self.z_x + torch.mul((1 - self.z_x), self.X) - self.delta_t * self.U * self.X * self.r_t
-
-        # Short term Facilitation 
-        self.z_u = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_u)    
-        self.Ucap = 0.9 * self.sigmoid(self.c_U)
-        self.U = self.Ucap * self.z_u + torch.mul((1 - self.z_u), self.U) + self.delta_t * self.Ucap * (1 - self.U) * self.r_t
-        self.Ucapclone = self.Ucap.clone().detach()
-        self.U = torch.clamp(self.U, min=self.Ucapclone.repeat(1, x.size(0)).to(device), max=torch.ones_like(self.Ucapclone.repeat(1, x.size(0)).to(device)))
-        x = torch.transpose(x, 0, 1)
-
-
-        ### Update Equations ###
-        self.z_t = torch.zeros(self.hidden_size, 1)
-        self.z_t = self.dt * self.sigmoid(torch.matmul(K , self.r_t) + torch.matmul(self.P_z, x) + self.b_z)
-        self.v_t = (1 - self.z_t) * self.v_t + self.dt * (torch.matmul(W, self.U*self.X*self.r_t) + torch.matmul(self.P, x) + self.b_v)
-        self.v_t = torch.transpose(self.v_t, 0, 1)      
+    @property
+    def excitatory(self):
         excitatory = self.v_t[:, :self.hidden_size//2]
+        return torch.cat((excitatory, torch.zeros_like(excitatory)), 1)
 
-        self.X_history.append(self.X.clone().detach())
-        self.U_history.append(self.U.clone().detach())
-        self.v_t_history.append(self.v_t.clone().detach())
-        self.z_t_history.append(self.z_t.clone().detach())  
-
-        self.excitatory = torch.cat((excitatory, torch.zeros_like(excitatory)), 1)    
-
+    def forward(self, x):
+        'x is [B, D]'
+        self.state = dale_cb_stp_step(self.get_params(), self.state, x)
+        return self.v_t
 
 class Dale_CB_STP_batch(nn.Module):
-    def __init__(self, input_size, hidden_size, num_layers, batch_first=True):
+    def __init__(self, input_size, hidden_size, num_layers, batch_first=True, checkpointed=False):
         super(Dale_CB_STP_batch, self).__init__()
         self.rnncell = Dale_CB_STPcell(input_size, hidden_size, num_layers).to(device)
         self.batch_first = batch_first
-
-    def forward(self, x):
-        if self.batch_first == True:
-            for n in range(x.size(1)):
-                #print(x.shape)
-                x_slice = torch.transpose(x[:,n,:], 0, 1)
-                self.rnncell(x_slice)
-        return self.rnncell.excitatory            
+        self.checkpointed = checkpointed
+
+    def forward(self, x, state=None):
+        if self.batch_first == False:
+            x = torch.transpose(x, 0, 1)
+        if state is None:
+            state = self.rnncell.init_state(x.size(0))
+        outputs, self.rnncell.state = dale_cb_stp_scan(self.rnncell.get_params(), state, x, self.checkpointed)
+        # the v_t trajectory is all that is kept; X, U and z_t are recomputed from it by history()
+        self.initial_state = state
+        self.v_t_history = outputs.detach()
+        return self.rnncell.excitatory
+
+    def history(self, x):
+        'X, U, v_t and z_t after every step of the last sequence x [B, T, D], each [B, T, H]'
+        with torch.no_grad():
+            X_history, U_history, z_t_history = dale_cb_stp_history(self.rnncell.get_params(), self.initial_state, x, self.v_t_history)
+        return X_history, U_history, self.v_t_history, z_t_history
             
 class Dale_CB_STP(nn.Module):
     
-    def __init__(self, input_size, hidden_size, num_layers, num_classes):
+    def __init__(self, input_size, hidden_size, num_layers, num_classes, checkpointed=False):
         super(Dale_CB_STP, self).__init__()
         self.hidden_size = hidden_size
         self.num_layers = num_layers
-        self.lstm = Dale_CB_STP_batch(input_size, hidden_size, num_layers)
+        self.lstm = Dale_CB_STP_batch(input_size, hidden_size, num_layers, checkpointed=checkpointed)
         self.fc = nn.Linear(hidden_size, 10)
         pass
 
     def forward(self, x):
-        # Set initial hidden and cell states 
-        self.lstm.rnncell.X = torch.ones(self.hidden_size, x.size(0), dtype=torch.float32).to(device)
-        self.lstm.rnncell.U = (self.lstm.rnncell.Ucapclone.repeat(1, x.size(0))).to(device)
-        self.lstm.rnncell.v_t = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device) 
-        # Passing in the input and hidden state into the model and  obtaining outputs
-        out = self.lstm(x)  # out: tensor of shape (batch_size, seq_length, hidden_size)
+        # Passing in the input and a fresh initial state into the model and obtaining outputs
+        out = self.lstm(x)  # out: tensor of shape (batch_size, hidden_size)
         #Reshaping the outputs such that it can be fit into the fully connected layer
         out = self.fc(out)
         return out.squeeze(-1)
@@ -295,7 +280,7 @@ class Dale_CB_STP(nn.Module):
         pass                                    
 pass
 
-model = Dale_CB_STP(input_size, hidden_size, num_layers, num_classes).to(device)
+model = Dale_CB_STP(input_size, hidden_size, num_layers, num_classes, checkpointed).to(device)
 print(model)
 loss_func = nn.CrossEntropyLoss()
 
@@ -410,10 +395,12 @@ with torch.no_grad():
         _, predicted = torch.max(outputs.data, 1)
         total += labels.size(0)
         correct += (predicted ==labels).sum().item()
-        X_history.append(model.lstm.rnncell.X_history)
-        U_history.append(model.lstm.rnncell.U_history)
-        v_t_history.append(model.lstm.rnncell.v_t_history)
-        z_t_history.append(model.lstm.rnncell.z_t_history)
+        # every step of every test sequence, each [batch_size, sequence_length, hidden_size]
+        X, U, v_t, z_t = model.lstm.history(images)
+        X_history.append(X.cpu())
+        U_history.append(U.cpu())
+        v_t_history.append(v_t.cpu())
+        z_t_history.append(z_t.cpu())
 test_acc = 100 * correct / total
 print('Accuracy of the model:{}%'.format(test_acc))
 
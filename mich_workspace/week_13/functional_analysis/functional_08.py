@@ -62,34 +62,24 @@ output_strength = output_strength / np.max(output_strength)
 print(type(X_history))
 print(len(X_history))
 print(type(X_history[0]))
-print(type(X_history[0][0]))
+print(X_history[0].shape)
 
-# Convert a list of lists of tensors to a single numpy array
+# Convert a list of [batch_size, sequence_length, hidden_size] tensors to a single numpy array
 def convert_history(history_list):
-    concatenated_history = []
-    for batch in history_list:
-        # Convert each tensor in the batch to numpy and append to a new list
-        batch_history = [tensor.cpu().numpy() for tensor in batch]
-        # Stack along a new dimension to keep batch data separate
-        concatenated_history.append(np.stack(batch_history))
     # Concatenate all the batch data along the first dimension
-    return np.concatenate(concatenated_history, axis=0)
+    return np.concatenate([batch.cpu().numpy() for batch in history_list], axis=0)
 
 # Apply this function to each history list
 X  = convert_history(X_history)
 U  = convert_history(U_history)
 v_t  = convert_history(v_t_history)
-v_t  = np.transpose(v_t , (0, 2, 1))
 z_t  = convert_history(z_t_history)
 
-X  = np.mean(X , axis=0)
-X  = np.mean(X , axis=1)
-U  = np.mean(U , axis=0)
-U  = np.mean(U , axis=1)
-v_t  = np.mean(v_t , axis=0)
-v_t  = np.mean(v_t , axis=1)
-z_t  = np.mean(z_t , axis=0)
-z_t  = np.mean(z_t , axis=1)
+# average every neuron over the test sequences and their steps
+X  = np.mean(X , axis=(0, 1))
+U  = np.mean(U , axis=(0, 1))
+v_t  = np.mean(v_t , axis=(0, 1))
+z_t  = np.mean(z_t , axis=(0, 1))
 print(X.shape, U.shape, v_t.shape, z_t.shape)
 import pandas as pd
 import seaborn as sns
@@ -6,6 +6,13 @@
 import torch
 import math
 import numpy as np
+import os
+import sys
+
+# shared helpers live in Object_orient/packages
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'Object_orient'))
+from packages.sequence_encoding import SequenceEncoder, cache_dataset
+from packages.stp_cells import dale_cb_stp_params, dale_cb_stp_step, dale_cb_stp_scan
 
 # Device configuration
 device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
@@ -20,52 +27,10 @@ print(torch.cuda.device_count()) # returns 1 in my case
 # get the name of the device
 print(torch.cuda.get_device_name(0)) # good old Tesla K80
 
-def snake_scan(img):
-    'Converts a 32x32 image to a 32x96 array with snake-like row ordering'
-    if len(img.shape) != 3:
-        raise ValueError('Input image must be a 3D array')
-    
-    channels, rows, cols = img.shape
-    snake = np.zeros((rows, cols * channels), dtype=img.dtype)
-    for r in range(rows):
-        row_data = img[:, r, :].flatten()  # Flattening each row into a 1D array of 96 elements
-        if r % 2 == 1:
-            row_data = row_data[::-1]  # Reversing the order for alternate rows
-        snake[r] = row_data
-    return snake
-
-def stride(input_data, stride):
-    'turn [batch_size, sequence_length, input_size] into [batch_size, sequence_length*input_size/stride, input_size]'
-    batch_size, sequence_length, input_size = input_data.shape
-    # flatten the input data to put sequence and input size together
-    input_data = input_data.reshape(batch_size, -1)
-    # append zeros to make sure the last pixel can be fed as the first pixel of the next sequence
-    n = input_size - (sequence_length*input_size)%stride
-
-    input_data = input_data.cpu()
-    input_data = input_data.numpy()
-    input_data = np.append(input_data, np.zeros((batch_size, n)), axis=1)
-    input_data = torch.tensor(input_data)
-    #print(input_data.shape)
-    output_data = torch.zeros(batch_size, sequence_length*input_size//stride, input_size)
-    for i in range(sequence_length*input_size//stride):
-        # if stride = input size, then the output data is the same as input data
-        #print(i)
-
-        output_data[:,i,:] = input_data[:,i*stride:i*stride+input_size]
-        #print(output_data[batch,i,:])
-
-    return output_data
-
 from torchvision import datasets
-from torchvision import transforms
 from torchvision.transforms import ToTensor
-from torchvision.transforms import Lambda
 
-transform = transforms.Compose([
-    ToTensor(),
-    Lambda(lambda x: torch.tensor(snake_scan(x.numpy())))
-])
+transform = ToTensor()
 
 train_data = datasets.MNIST(
     root = 'data',
@@ -96,6 +61,15 @@ batch_size = 40
 num_epochs = 3
 learning_rate = 0.01
 stride_number = 4
+# recompute the STP recurrence in sqrt(T) segments during backward instead of storing every step
+checkpointed = False
+
+# snake scan over the pixels, cut into windows of input_size pixels every stride_number pixels
+encoder = SequenceEncoder((1, 28, 28), input_size, scan='snake', stride=stride_number).to(device)
+# the scan is applied to the whole dataset once, in batches, instead of per image every epoch;
+# the overlapping windows are cut from each batch on the device
+train_data = cache_dataset(train_data, encoder.scan, device=device)
+test_data = cache_dataset(test_data, encoder.scan, device=device)
 
 from torch.utils.data import DataLoader
 loaders = {
@@ -112,8 +86,7 @@ loaders = {
 loaders
 '''
 for i, (images, labels) in enumerate(loaders['train']):
-    images = images.reshape(-1, sequence_length, input_size).to(device)
-    images = stride(images, stride_number).to(device)
+    images = encoder.window(images.to(device))
     print(images.shape)
     print(labels.shape)
     print(len(loaders['train']))
@@ -143,9 +116,6 @@ class Dale_CB_STPcell(nn.Module):
         self.e_e = torch.nn.Parameter(torch.rand(1))
         self.e_i = torch.nn.Parameter(-torch.rand(1))
 
-        # Firing rate, Scaling factor and time step initialization
-        self.v_t = torch.zeros(1, self.hidden_size, dtype=torch.float32)
-
         # dt is a constant
         self.dt = nn.Parameter(torch.tensor(0.1), requires_grad = False)
 
@@ -180,10 +150,9 @@ class Dale_CB_STPcell(nn.Module):
         self.c_U = torch.nn.Parameter(torch.rand(self.hidden_size, 1))
         
         # State initialisations
-        self.X = torch.ones(self.hidden_size, 1, dtype=torch.float32).to(device)
-        self.U = torch.full((self.hidden_size, 1), 0.9, dtype=torch.float32).to(device)
         self.Ucap = 0.9 * self.sigmoid(self.c_U)
         self.Ucapclone = self.Ucap.clone().detach() 
+        self.state = self.init_state(1)
 
     def init_dale(self, rows, cols):
         # Dale's law with equal excitatory and inhibitory neurons
@@ -199,83 +168,67 @@ class Dale_CB_STPcell(nn.Module):
         return weights * (desired_radius / radius)
         
 
+    def init_state(self, batch_size):
+        'v_t = 0, X = 1 and U = Ucap of the last step for every neuron, each of shape [batch_size, hidden_size]'
+        device = self.P.device
+        v_t = torch.zeros(batch_size, self.hidden_size, device=device)
+        X = torch.ones(batch_size, self.hidden_size, device=device)
+        U = self.Ucapclone.t().repeat(batch_size, 1).to(device)
+        return v_t, X, U
+
+    def get_params(self):
+        'Effective parameters for the packages.stp_cells functions; W, z_x, z_u and Ucap are kept for the weight analysis'
+        params = dale_cb_stp_params(self)
+        self.W, self.z_x, self.z_u, self.Ucap = params['W'], params['z_x'], params['z_u'], params['Ucap']
+        self.Ucapclone = self.Ucap.clone().detach()
+        return params
+
+    @property
+    def v_t(self):
+        return self.state[0]
+
     @property
     def r_t(self):
         return self.relu(self.v_t)
 
-    def forward(self, x):        
-        if self.v_t.dim() == 3:           
-            self.v_t = self.v_t[0]
-        self.v_t = torch.transpose(self.v_t, 0, 1)
-
-        ### Constraints###
-        K = self.softplus(self.K)
-        C = self.softplus(self.C)
-        # W is constructed using e*(K+C)
-        W_E = self.e_e * (K[:, :self.hidden_size//2] + C[:, :self.hidden_size//2])
-        W_I = self.e_i * (K[:, self.hidden_size//2:] + C[:, self.hidden_size//2:])
-        # print to see which device the tensor is on
-        # If sign of W do not obey Dale's law, then these terms to be 0
-        W_E = self.relu(W_E)
-        W_I = -self.relu(-W_I)
-        W = torch.cat((W_E, W_I), 1)
-        self.W = W
-
-        ### STP model ###
-        x = torch.transpose(x, 0, 1)
-        
-        # Short term Depression 
-        self.z_x = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_x)
-        self.X = self.z_x + torch.mul((1 - self.z_x), self.X) - self.delta_t * self.U * self.X * self.r_t
-
-        # Short term Facilitation 
-        self.z_u = self.z_min + (self.z_max - self.z_min) * self.sigmoid(self.c_u)    
-        self.Ucap = 0.9 * self.sigmoid(self.c_U)
-        self.U = self.Ucap * self.z_u + torch.mul((1 - self.z_u), self.U) + self.delta_t * self.Ucap * (1 - self.U) * self.r_t
-        self.Ucapclone = self.Ucap.clone().detach()
-        self.U = torch.clamp(self.U, min=self.Ucapclone.repeat(1, x.size(0)).to(device), max=torch.ones_like(self.Ucapclone.repeat(1, x.size(0)).to(device)))
-        x = torch.transpose(x, 0, 1)
-
-
-        ### Update Equations ###
-        self.z_t = torch.zeros(self.hidden_size, 1)
-        self.z_t = self.dt * self.sigmoid(torch.matmul(K , self.r_t) + torch.matmul(self.P_z, x) + self.b_z)
-        self.v_t = (1 - self.z_t) * self.v_t + self.dt * (torch.matmul(W, self.U*self.X*self.r_t) + torch.matmul(self.P, x) + self.b_v)
-        self.v_t = torch.transpose(self.v_t, 0, 1)      
+    @property
+    def excitatory(self):
         excitatory = self.v_t[:, :self.hidden_size//2]
-        self.excitatory = torch.cat((excitatory, torch.zeros_like(excitatory)), 1)    
+        return torch.cat((excitatory, torch.zeros_like(excitatory)), 1)
+
+    def forward(self, x):
+        'x is [B, D]'
+        self.state = dale_cb_stp_step(self.get_params(), self.state, x)
+        return self.v_t
 
 class Dale_CB_STP_batch(nn.Module):
-    def __init__(self, input_size, hidden_size, num_layers, batch_first=True):
+    def __init__(self, input_size, hidden_size, num_layers, batch_first=True, checkpointed=False):
         super(Dale_CB_STP_batch, self).__init__()
         self.rnncell = Dale_CB_STPcell(input_size, hidden_size, num_layers).to(device)
         self.batch_first = batch_first
-
-    def forward(self, x):
-        if self.batch_first == True:
-            for n in range(x.size(1)):
-                #print(x.shape)
-                x_slice = torch.transpose(x[:,n,:], 0, 1)
-                self.rnncell(x_slice)
-        return self.rnncell.excitatory            
+        self.checkpointed = checkpointed
+
+    def forward(self, x, state=None):
+        if self.batch_first == False:
+            x = torch.transpose(x, 0, 1)
+        if state is None:
+            state = self.rnncell.init_state(x.size(0))
+        outputs, self.rnncell.state = dale_cb_stp_scan(self.rnncell.get_params(), state, x, self.checkpointed)
+        return self.rnncell.excitatory
             
 class Dale_CB_STP(nn.Module):
     
-    def __init__(self, input_size, hidden_size, num_layers, num_classes):
+    def __init__(self, input_size, hidden_size, num_layers, num_classes, checkpointed=False):
         super(Dale_CB_STP, self).__init__()
         self.hidden_size = hidden_size
         self.num_layers = num_layers
-        self.lstm = Dale_CB_STP_batch(input_size, hidden_size, num_layers)
+        self.lstm = Dale_CB_STP_batch(input_size, hidden_size, num_layers, checkpointed=checkpointed)
         self.fc = nn.Linear(hidden_size, 10)
         pass
 
     def forward(self, x):
-        # Set initial hidden and cell states 
-        self.lstm.rnncell.X = torch.ones(self.hidden_size, x.size(0), dtype=torch.float32).to(device)
-        self.lstm.rnncell.U = (self.lstm.rnncell.Ucapclone.repeat(1, x.size(0))).to(device)
-        self.lstm.rnncell.v_t = torch.zeros(self.num_layers, x.size(0), self.hidden_size).to(device) 
-        # Passing in the input and hidden state into the model and  obtaining outputs
-        out = self.lstm(x)  # out: tensor of shape (batch_size, seq_length, hidden_size)
+        # Passing in the input and a fresh initial state into the model and obtaining outputs
+        out = self.lstm(x)  # out: tensor of shape (batch_size, hidden_size)
         #Reshaping the outputs such that it can be fit into the fully connected layer
         out = self.fc(out)
         return out.squeeze(-1)
@@ -283,7 +236,7 @@ class Dale_CB_STP(nn.Module):
         pass                                    
 pass
 
-model = Dale_CB_STP(input_size, hidden_size, num_layers, num_classes).to(device)
+model = Dale_CB_STP(input_size, hidden_size, num_layers, num_classes, checkpointed).to(device)
 print(model)
 loss_func = nn.CrossEntropyLoss()
 
@@ -325,8 +278,7 @@ def evaluate_while_training(model, loaders):
     total = 0
     with torch.no_grad():
         for images, labels in subtest:
-            images = images.reshape(-1, sequence_length, input_size).to(device)
-            images = stride(images, stride_number).to(device)
+            images = encoder.window(images.to(device))
             labels = labels.to(device)
             outputs = model(images)
             _, predicted = torch.max(outputs.data, 1)
@@ -344,8 +296,7 @@ def train(num_epochs, model, loaders, patience=2, min_delta=0.01):
 
     for epoch in range(num_epochs):
         for i, (images, labels) in enumerate(loaders['train']):
-            images = images.reshape(-1, sequence_length, input_size).to(device)
-            images = stride(images, stride_number).to(device)
+            images = encoder.window(images.to(device))
             labels = labels.to(device)
             model.train()
             # Forward pass
@@ -386,8 +337,7 @@ with torch.no_grad():
     correct = 0
     total = 0
     for images, labels in loaders['test']:
-        images = images.reshape(-1, sequence_length, input_size).to(device)
-        images = stride(images, stride_number).to(device)
+        images = encoder.window(images.to(device))
         labels = labels.to(device)
         outputs = model(images)
         _, predicted = torch.max(outputs.data, 1)